@@ -10,6 +10,8 @@ https://docs.djangoproject.com/en/1.8/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -80,6 +82,47 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# The judge workers update cached data (solved sets, page and scoreboard
+# versions, judger health) that the web processes read, and every web
+# process counts submissions in the same token buckets, so the default
+# cache must be shared by every process of every dyno. Without
+# CACHE_BACKEND it is the database (create the table with `manage.py
+# createcachetable`, run on release); memcached or Redis take the load off
+# the database and are preferred. A cache local to a process is refused at
+# startup outside of tests and DEBUG, see
+# onlinejudge.cache.check_shared_caches.
+TESTING = sys.argv[1:2] == ['test']
+LOCAL_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+SHARED_CACHE = 'django.core.cache.backends.db.DatabaseCache'
+FILE_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+
+CACHES = {
+    'default': {
+        'BACKEND':
+        os.getenv("CACHE_BACKEND", LOCAL_CACHE if TESTING else SHARED_CACHE),
+        'LOCATION': os.getenv("CACHE_LOCATION", 'onlinejudge_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv("CACHE_MAX_ENTRIES", 100000)),
+        },
+    },
+    # Rendered pages, see onlinejudge/pagecache.py. Their versions live in
+    # the default cache, so the pages themselves only need to be shared by
+    # the web processes of a host: files in PAGE_CACHE_LOCATION by default.
+    'pages': {
+        'BACKEND':
+        os.getenv("PAGE_CACHE_BACKEND",
+                  LOCAL_CACHE if TESTING else FILE_CACHE),
+        'LOCATION': os.getenv(
+            "PAGE_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), 'onlinejudge_pages')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 10000)),
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
@@ -145,7 +188,94 @@ CAS_RESPONSE_CALLBACKS = ('myjudge.callbackfunction.callbackfunction', )
 # My settings
 LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = "/login"
-JUDGER_URL = os.getenv("JUDGER_URL")
+# Judge backend: 'http' for the judger service at JUDGER_URLS, 'local' for a
+# pool of LOCAL_JUDGER_WORKERS processes on the judge workers' machine (see
+# onlinejudge/sandbox.py for its limits). JUDGE_FALLBACK names a backend
+# used while JUDGE_BACKEND is unavailable.
+JUDGE_BACKEND = os.getenv("JUDGE_BACKEND", "http")
+JUDGE_FALLBACK = os.getenv("JUDGE_FALLBACK", "")
+LOCAL_JUDGER_WORKERS = int(os.getenv("LOCAL_JUDGER_WORKERS",
+                                     os.cpu_count() or 1))
+LOCAL_JUDGER_MEMORY_LIMIT = int(os.getenv("LOCAL_JUDGER_MEMORY_LIMIT",
+                                          256 * 1024 * 1024))
+LOCAL_JUDGER_OUTPUT_LIMIT = int(os.getenv("LOCAL_JUDGER_OUTPUT_LIMIT",
+                                          1024 * 1024))
+# Space separated judger backends. JUDGER_URL is the single backend of
+# older deployments.
+JUDGER_URLS = os.getenv("JUDGER_URLS", os.getenv("JUDGER_URL", "")).split()
+# Time limit of every case, in milliseconds.
+JUDGER_TIMEOUT = int(os.getenv("JUDGER_TIMEOUT", 2000))
+# Threads running the shards of questions with a shard size.
+JUDGER_SHARD_WORKERS = int(os.getenv("JUDGER_SHARD_WORKERS", 8))
+# Connection pool, timeouts (seconds) and retries of the judger client.
+JUDGER_POOL_SIZE = int(os.getenv("JUDGER_POOL_SIZE", 10))
+JUDGER_CONNECT_TIMEOUT = float(os.getenv("JUDGER_CONNECT_TIMEOUT", 3.05))
+JUDGER_READ_TIMEOUT = float(os.getenv("JUDGER_READ_TIMEOUT", 60))
+JUDGER_RETRIES = int(os.getenv("JUDGER_RETRIES", 2))
+JUDGER_BACKOFF = float(os.getenv("JUDGER_BACKOFF", 0.25))
+# Judge workers probe every backend this often (seconds).
+JUDGER_PROBE_INTERVAL = float(os.getenv("JUDGER_PROBE_INTERVAL", 5))
+JUDGER_PROBE_TIMEOUT = float(os.getenv("JUDGER_PROBE_TIMEOUT", 2))
+# A backend failing this many requests in a row gets none for
+# JUDGER_BREAKER_RESET seconds.
+JUDGER_BREAKER_THRESHOLD = int(os.getenv("JUDGER_BREAKER_THRESHOLD", 3))
+JUDGER_BREAKER_RESET = float(os.getenv("JUDGER_BREAKER_RESET", 30))
+# Admission control of submissions, 0 disables a limit. Attempts waiting
+# for a verdict per user and site-wide, and the per-user rate: SUBMIT_RATE
+# submissions a minute with bursts of SUBMIT_BURST.
+SUBMIT_USER_IN_FLIGHT = int(os.getenv("SUBMIT_USER_IN_FLIGHT", 2))
+SUBMIT_GLOBAL_IN_FLIGHT = int(os.getenv("SUBMIT_GLOBAL_IN_FLIGHT", 500))
+SUBMIT_RATE = float(os.getenv("SUBMIT_RATE", 6))
+SUBMIT_BURST = int(os.getenv("SUBMIT_BURST", 3))
+# Only enable if the judger accepts gzip encoded request bodies.
+JUDGER_GZIP = os.getenv("JUDGER_GZIP") == "true"
+# Judge workers send up to JUDGER_BATCH_SIZE attempts in one request,
+# waiting at most JUDGER_BATCH_WINDOW seconds for the batch to fill up.
+JUDGER_BATCH_SIZE = int(os.getenv("JUDGER_BATCH_SIZE", 1))
+JUDGER_BATCH_WINDOW = float(os.getenv("JUDGER_BATCH_WINDOW", 0.05))
+# Number of verdicts each judge worker keeps for identical resubmissions.
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", 10000))
+# Test cases longer than this many characters are stored compressed.
+CASE_INLINE_LIMIT = 64 * 1024
+LEADERBOARD_PAGE_SIZE = 50
+ACTIVITY_PAGE_SIZE = 50
+SUBMISSIONS_PAGE_SIZE = 20
+# Cache holding every user's solved questions.
+SOLVED_CACHE = 'default'
+PAGE_CACHE = 'pages'
+# Longest a cached page is served, in seconds.
+PAGE_CACHE_TIMEOUT = int(os.getenv("PAGE_CACHE_TIMEOUT", 300))
+# Browsers on a contest scoreboard check for changes every
+# SCOREBOARD_POLL_INTERVAL seconds.
+SCOREBOARD_POLL_INTERVAL = float(os.getenv("SCOREBOARD_POLL_INTERVAL", 3))
+# Every process writes its metrics to a file in METRICS_DIR, at most every
+# METRICS_FLUSH_INTERVAL seconds, for /metrics to add them up. Empty it on
+# deploy. It must be shared by every process: Heroku dynos each have their
+# own filesystem, so there /metrics only sees the dyno that serves it.
+# /metrics is served to staff and to requests bearing METRICS_TOKEN.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Log the statements of every request, see onlinejudge/instrumentation.py.
+QUERY_INSTRUMENTATION = os.getenv("QUERY_INSTRUMENTATION") == "true"
+# Statements slower than this many milliseconds are logged with their plan.
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", 100))
+if QUERY_INSTRUMENTATION:
+    MIDDLEWARE_CLASSES += (
+        'onlinejudge.instrumentation.QueryInstrumentationMiddleware', )
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'console': {'class': 'logging.StreamHandler'},
+        },
+        'loggers': {
+            'onlinejudge.instrumentation': {
+                'handlers': ['console'],
+                'level': os.getenv("QUERY_LOG_LEVEL", "INFO"),
+            },
+        },
+    }
 try:
     ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS").split()
 except AttributeError:
@@ -1,10 +1,53 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.shortcuts import render
 
+from . import caseimport
 from .models import Question, Case, Attempt, Category, Contest
 
 
+class CaseForm(forms.ModelForm):
+    """Edits the full content of cases stored in blobs."""
+
+    class Meta:
+        model = Case
+        fields = ['stdin', 'stdout', 'sample_case']
+
+    def __init__(self, *args, **kwargs):
+        super(CaseForm, self).__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['stdin'] = self.instance.input
+            self.initial['stdout'] = self.instance.output
+
+    def save(self, commit=True):
+        # Emptying a field must not keep the old blob.
+        if not self.cleaned_data['stdin']:
+            self.instance.stdin_blob = None
+        if not self.cleaned_data['stdout']:
+            self.instance.stdout_blob = None
+        return super(CaseForm, self).save(commit)
+
+
+class ImportCasesForm(forms.Form):
+    archive = forms.FileField(help_text="A zip of N.in and N.out files.")
+    samples = forms.CharField(
+        required=False,
+        help_text="Numbers of the sample cases, separated by spaces.")
+    replace = forms.BooleanField(
+        required=False, help_text="Delete the current cases first.")
+
+    def clean_samples(self):
+        try:
+            return [int(number)
+                    for number in self.cleaned_data['samples'].split()]
+        except ValueError:
+            raise forms.ValidationError("Enter case numbers.")
+
+
 class ChoiceInline(admin.StackedInline):
     model = Case
+    form = CaseForm
     extra = 3
 
 
@@ -21,16 +64,50 @@ class QuestionAdmin(admin.ModelAdmin):
             ]
         }),
         ('Details', {
-            'fields': ['author', 'slug', 'published_date']
+            'fields': ['author', 'slug', 'published_date', 'shard_size']
         }),
     ]
     inlines = [ChoiceInline]
+    actions = ['import_cases']
 
     def save_model(self, request, obj, form, change):
         if obj.author is None:
             obj.author = request.user
         super(QuestionAdmin, self).save_model(request, obj, form, change)
 
+    def import_cases(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select a single question.",
+                              messages.ERROR)
+            return None
+        question = queryset.get()
+        form = ImportCasesForm()
+        if 'apply' in request.POST:
+            form = ImportCasesForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    count = caseimport.import_cases(
+                        question, form.cleaned_data['archive'],
+                        samples=form.cleaned_data['samples'],
+                        replace=form.cleaned_data['replace'])
+                except caseimport.InvalidArchive as e:
+                    self.message_user(request, str(e), messages.ERROR)
+                else:
+                    self.message_user(request, "Imported %d cases into %s."
+                                      % (count, question.title))
+                return None
+        context = dict(
+            self.admin_site.each_context(request),
+            title="Import cases",
+            opts=self.model._meta,
+            question=question,
+            form=form,
+            action_checkbox_name=helpers.ACTION_CHECKBOX_NAME,
+        )
+        return render(request, 'admin/onlinejudge/question/import_cases.html',
+                      context)
+    import_cases.short_description = "Import cases from a zip"
+
     def get_readonly_fields(self, request, obj=None):
         """
         Override to make certain fields readonly if this is a change request
@@ -41,6 +118,9 @@ class QuestionAdmin(admin.ModelAdmin):
 
 
 class AttemptAdmin(admin.ModelAdmin):
+    exclude = ['source_blob']
+    readonly_fields = ('source', )
+
     def get_readonly_fields(self, request, obj=None):
         if request.user.is_superuser:
             return self.readonly_fields
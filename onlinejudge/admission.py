@@ -0,0 +1,93 @@
+"""
+Admission control for submissions.
+
+Every submission costs a judger run, so `check` decides whether a new one is
+let in before it is saved:
+
+- a resubmission of the source the user already has waiting for a verdict on
+  the same question is coalesced with it,
+- a user may only have SUBMIT_USER_IN_FLIGHT attempts waiting,
+- the whole site may only have SUBMIT_GLOBAL_IN_FLIGHT attempts waiting,
+- every user has a token bucket refilled with SUBMIT_RATE tokens a minute
+  and holding at most SUBMIT_BURST, each submission takes one.
+
+A limit set to 0 is disabled. The buckets live in the default cache; with a
+cache shared between processes they hold across all of them, give or take
+concurrent submissions of the same user.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Attempt, Blob
+
+
+class Throttled(Exception):
+    """
+    A submission was turned away.
+
+    Attributes
+    ----------
+    message : string
+        Why, for the user.
+    retry_after : int
+        Seconds after which trying again may succeed.
+
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+def check(user, question, source):
+    """
+    Admit a submission of `source` by `user` to `question`.
+
+    Returns
+    -------
+    attempt : Attempt or None
+        The waiting attempt the submission is coalesced with, or None if a
+        new attempt should be saved.
+
+    Raises Throttled when the submission is turned away.
+    """
+    waiting = Attempt.objects.filter(
+        user=user, status__in=Attempt.PENDING_STATUSES)
+    duplicate = waiting \
+        .filter(question=question, source_blob=Blob.digest_of(source)) \
+        .order_by('-id') \
+        .first()
+    if duplicate is not None:
+        return duplicate
+
+    limit = settings.SUBMIT_USER_IN_FLIGHT
+    if limit and waiting.count() >= limit:
+        raise Throttled(
+            "Kamu masih punya %d jawaban yang sedang dicek." % limit, 5)
+    limit = settings.SUBMIT_GLOBAL_IN_FLIGHT
+    if limit and Attempt.objects \
+            .filter(status__in=Attempt.PENDING_STATUSES) \
+            .count() >= limit:
+        raise Throttled("Judge-nya lagi sibuk banget nih.", 10)
+    _take_token(user)
+    return None
+
+
+def _take_token(user):
+    rate = settings.SUBMIT_RATE / 60
+    burst = settings.SUBMIT_BURST
+    if not rate or not burst:
+        return
+    key = 'submit-bucket:%d' % user.id
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        raise Throttled("Kamu submit terlalu cepat.",
+                        math.ceil((1 - tokens) / rate))
+    # Kept until the bucket would be full again.
+    cache.set(key, (tokens - 1, now), math.ceil(burst / rate))
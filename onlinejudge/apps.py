@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class OnlinejudgeConfig(AppConfig):
     name = 'onlinejudge'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .cache import check_shared_caches
+        check_shared_caches()
@@ -0,0 +1,160 @@
+"""
+Judge backends.
+
+A backend runs submissions and replies like the judger service does: a dict
+with the 'stdout' of every case, joined as "1.in\\n<output>2.in\\n...", and
+the 'status' of the run ('OK', 'Runtime Error', 'Timed Out' or 'Server
+Error'). Failures are raised as requests exceptions, which the judge
+workers record as Server Error; a ConnectionError means nothing was judged,
+so another backend may be tried.
+
+JUDGE_BACKEND selects the backend of every process (see
+`router.get_client`):
+
+- 'http': the judger service, see `router.JudgerRouter`,
+- 'local': a pool of processes on the same machine, see
+  `localjudger.LocalJudger`.
+
+JUDGE_FALLBACK names a backend used whenever the first one is unavailable.
+"""
+import abc
+import logging
+import threading
+
+import requests
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+HEALTH_KEY = 'judger-health'
+STATS_KEY = 'judger-stats'
+# Reports older than this (seconds) are dropped, e.g. once the workers stop.
+REPORT_TIMEOUT = 60
+
+
+class JudgeBackend(metaclass=abc.ABCMeta):
+    """
+    Interface of the judge backends.
+
+    Subclasses implement `run`, and `check` and `stats` if they have a
+    health to report.
+    """
+
+    @abc.abstractmethod
+    def run(self, source, stdin, timeout):
+        """
+        Run `source` once for every input in `stdin`.
+
+        Parameters
+        ----------
+        source : string
+            A Python 3 program.
+        stdin : list
+            The input of every case.
+        timeout : int
+            Milliseconds each run may take.
+        Returns
+        -------
+        response : dict
+            The 'stdout' and 'status' of the runs.
+
+        """
+
+    def run_batch(self, runs):
+        """
+        Run several submissions.
+
+        Parameters
+        ----------
+        runs : list
+            Dictionaries with the 'source', 'stdin' and 'timeout' keys.
+
+        Returns
+        -------
+        responses : list
+            The response of every run, in order.
+
+        """
+        return [self.run(**run) for run in runs]
+
+    @property
+    def available(self):
+        """Whether the backend can take a request."""
+        return True
+
+    def check(self):
+        """Update the health of the backend."""
+
+    def probe(self):
+        """Check the backend and publish its health for the web processes."""
+        self.check()
+        cache.set(HEALTH_KEY, self.available, REPORT_TIMEOUT)
+        cache.set(STATS_KEY, self.stats(), REPORT_TIMEOUT)
+
+    def start_probing(self, interval, stop=None):
+        """Probe the backend every `interval` seconds in the background."""
+        stop = stop or threading.Event()
+
+        def loop():
+            while not stop.is_set():
+                try:
+                    self.probe()
+                except Exception:
+                    logger.exception("Probing the judgers failed")
+                stop.wait(interval)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """
+        Health, load, latency and error counts of every endpoint, as
+        printed by the `judgerstatus` command.
+        """
+        return []
+
+    def close(self):
+        pass
+
+
+class FallbackBackend(JudgeBackend):
+    """
+    Sends requests to `primary`, or to `fallback` when `primary` cannot
+    take them, e.g. the local pool while the judger service is down.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def _call(self, method, *args):
+        if self.primary.available:
+            try:
+                return getattr(self.primary, method)(*args)
+            except requests.ConnectionError:
+                # Nothing was judged.
+                pass
+        logger.info("Judging with the fallback backend")
+        return getattr(self.fallback, method)(*args)
+
+    def run(self, source, stdin, timeout):
+        return self._call('run', source, stdin, timeout)
+
+    def run_batch(self, runs):
+        return self._call('run_batch', runs)
+
+    @property
+    def available(self):
+        return self.primary.available or self.fallback.available
+
+    def check(self):
+        self.primary.check()
+        self.fallback.check()
+
+    def stats(self):
+        return self.primary.stats() + self.fallback.stats()
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
@@ -0,0 +1,227 @@
+"""
+Benchmark scenarios for the `benchmark` management command.
+
+Every scenario is a function taking the command's options and returning a
+JSON-serializable dict, so runs can be saved and compared.
+
+The load scenarios (submit_storm, leaderboard, contest) drive the views
+in-process with the test client and run against the dataset created by the
+`generatedata` command, e.g. `generatedata --users 10000 --contests 1
+--questions 200` for the leaderboard at 10k users and a contest page of 200
+questions. Every request is timed and its queries counted.
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import dataset, judger, pagecache, router, worker
+from .models import Contest, Question
+from .stubjudger import StubJudger, echo, fixed_output
+
+KB = 1024
+MB = 1024 * KB
+
+
+def _best_of(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _judger_stdout(size, cases=10, line_length=80):
+    """Fake judger stdout of roughly `size` bytes split over `cases`."""
+    line = "x" * (line_length - 1) + "\n"
+    lines = max(size // cases // line_length, 1)
+    output = line * lines
+    return "".join("%d.in\n%s" % (i, output) for i in range(1, cases + 1))
+
+
+def parse(options):
+    """Time judger.parse_stdout on outputs from 1 KB to 50 MB."""
+    results = []
+    for size in options['sizes']:
+        output = _judger_stdout(size)
+        seconds = _best_of(options['repeat'], judger.parse_stdout, output)
+        results.append({
+            'bytes': len(output),
+            'seconds': seconds,
+            'mb_per_second': len(output) / MB / seconds,
+        })
+    return {'scenario': 'parse', 'results': results}
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def _measure(count, request):
+    """Call request(i) `count` times, timing it and counting its queries."""
+    latencies, queries, statuses = [], [], Counter()
+    for i in range(count):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request(i)
+            latencies.append(time.perf_counter() - start)
+        queries.append(len(captured))
+        statuses[str(response.status_code)] += 1
+    seconds = sum(latencies)
+    latencies.sort()
+    return {
+        'requests': count,
+        'seconds': seconds,
+        'throughput': count / seconds if seconds else 0.0,
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p99': _percentile(latencies, 99),
+        'queries_avg': sum(queries) / count if count else 0.0,
+        'queries_max': max(queries, default=0),
+        'statuses': dict(statuses),
+    }
+
+
+def _users(limit):
+    users = list(User.objects
+                 .filter(username__startswith=dataset.PREFIX)
+                 .order_by('id')[:limit])
+    if not users:
+        raise CommandError("No synthetic data, run generatedata first.")
+    return users
+
+
+def _signed_in(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _page(url, options):
+    """Anonymous requests with a cold and a warm page cache, signed-in ones."""
+    anonymous = Client()
+    signed_in = _signed_in(_users(1)[0])
+
+    def cold(i):
+        pagecache.invalidate('contests', 'questions', 'solves')
+        return anonymous.get(url)
+
+    count = options['requests']
+    with override_settings(ALLOWED_HOSTS=['*']):
+        return {
+            'url': url,
+            'cold': _measure(count, cold),
+            'warm': _measure(count, lambda i: anonymous.get(url)),
+            'signed_in': _measure(count, lambda i: signed_in.get(url)),
+        }
+
+
+def leaderboard(options):
+    """Load the first leaderboard page."""
+    return dict(_page(reverse('leaderboard'), options),
+                scenario='leaderboard', users=User.objects.count())
+
+
+def contest(options):
+    """Load the page of the synthetic contest with the most questions."""
+    largest = Contest.objects \
+        .filter(slug__startswith=dataset.PREFIX) \
+        .annotate(questions=Count('question')) \
+        .order_by('-questions') \
+        .first()
+    if largest is None:
+        raise CommandError("No synthetic data, run generatedata first.")
+    return dict(_page(largest.get_absolute_url(), options),
+                scenario='contest', questions=largest.questions)
+
+
+def _drain(workers):
+    """Judge the queue with `workers` threads, return how many were judged."""
+    if workers <= 1:
+        return worker.drain()
+    judged = []
+
+    def work():
+        try:
+            judged.append(worker.drain())
+        finally:
+            # Every thread has its own database connection.
+            connection.close()
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(judged)
+
+
+def submit_storm(options):
+    """
+    Submit from many users in a row, then judge the queue.
+
+    Admission limits are lifted, every submission has a distinct source so
+    none is coalesced or served from the verdict cache, and the judge
+    workers talk to a stub judger with the given latency.
+    """
+    count = options['requests']
+    clients = [_signed_in(user) for user in _users(count)]
+    slugs = list(Question.objects
+                 .filter(slug__startswith=dataset.PREFIX)
+                 .values_list('slug', flat=True))
+    run_id = uuid.uuid4().hex
+
+    def submit(i):
+        url = reverse('submit', kwargs={'slug': slugs[i % len(slugs)]})
+        source = "print(input())  # %s %d" % (run_id, i)
+        return clients[i % len(clients)].post(url, {'source': source})
+
+    with override_settings(ALLOWED_HOSTS=['*'], SUBMIT_RATE=0,
+                           SUBMIT_USER_IN_FLIGHT=0,
+                           SUBMIT_GLOBAL_IN_FLIGHT=0):
+        submitted = _measure(count, submit)
+
+    size = options['output_size']
+    stub = StubJudger(run=echo if size is None else fixed_output(size),
+                      batch=True, latency=options['latency'])
+    with stub:
+        previous = router.set_client(router.JudgerRouter([stub.url]))
+        try:
+            start = time.perf_counter()
+            judged = _drain(options['workers'])
+            seconds = time.perf_counter() - start
+        finally:
+            router.set_client(previous).close()
+    return {
+        'scenario': 'submit_storm',
+        'submit': submitted,
+        'judge': {
+            'attempts': judged,
+            'judger_requests': len(stub.requests),
+            'seconds': seconds,
+            'throughput': judged / seconds if seconds else 0.0,
+            'workers': options['workers'],
+            'batch_size': settings.JUDGER_BATCH_SIZE,
+        },
+    }
+
+
+SCENARIOS = {
+    'parse': parse,
+    'submit_storm': submit_storm,
+    'leaderboard': leaderboard,
+    'contest': contest,
+}
+DEFAULT_SIZES = [KB, 64 * KB, MB, 10 * MB, 50 * MB]
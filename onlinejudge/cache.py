@@ -0,0 +1,178 @@
+"""
+Caching helpers.
+
+Students often resubmit the same code. Verdicts are cached under the hash of
+the normalized source together with the question's `case_version`, which is
+bumped whenever one of its cases is added, changed or deleted, so a cached
+verdict never outlives the cases it was judged against.
+
+Data shared through the Django cache is invalidated with version counters
+(see `get_version` and `bump_version`) rather than by deleting keys.
+"""
+import collections
+import copy
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import Attempt
+
+# Verdicts that only depend on the source and the cases.
+CACHEABLE = (Attempt.ACCEPTED, Attempt.WRONG_ANSWER, Attempt.RUNTIME_ERROR)
+
+
+def get_version(cache, key):
+    """Current value of the version counter `key` in `cache`."""
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so an evicted counter is never reused.
+        cache.add(key, int(time.time() * 1000))
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_version(cache, key):
+    """
+    Change the version counter `key` and return its new value.
+
+    Backends with an atomic incr() increment it. The others (database, files)
+    read and write the value, so two concurrent increments could write the
+    same one and retire entries only once: they get a random new value
+    instead, which differs from every value read before.
+    """
+    if _backend(cache) not in ATOMIC_INCR:
+        version = _random.getrandbits(62)
+        cache.set(key, version)
+        return version
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(cache, key)
+
+
+def _backend(cache):
+    return "%s.%s" % (type(cache).__module__, type(cache).__name__)
+
+
+_random = random.SystemRandom()
+
+# Backends whose incr() cannot lose a concurrent increment.
+ATOMIC_INCR = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.memcached.MemcachedCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django_redis.cache.RedisCache',
+)
+
+# Backends whose entries are only seen by the process that set them.
+PROCESS_LOCAL = ('django.core.cache.backends.locmem.LocMemCache', )
+
+
+def check_shared_caches():
+    """
+    Refuse caches local to a process outside of tests and DEBUG.
+
+    The judge workers bump versions and publish the judger health that the
+    web processes read; with a cache per process the web processes would
+    not see them until the entries expire. The page cache only holds
+    entries, its versions are in the default cache.
+    """
+    if settings.DEBUG or settings.TESTING:
+        return
+    for alias in {'default', settings.SOLVED_CACHE}:
+        if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL:
+            raise ImproperlyConfigured(
+                "The %r cache must be shared by the web processes and the "
+                "judge workers, %s is local to a process. See CACHES in "
+                "settings.py." % (alias, settings.CACHES[alias]['BACKEND']))
+
+
+def normalize_source(source):
+    """
+    Normalize the whitespace that cannot change what a program does.
+
+    Line endings are unified and the newlines ending the file are dropped.
+    Whitespace within lines is kept: it can be part of a string literal, and
+    spaces after a line continuation make a syntax error.
+    """
+    return source.replace("\r\n", "\n").replace("\r", "\n").rstrip("\n")
+
+
+def source_hash(source):
+    return hashlib.sha256(normalize_source(source).encode()).hexdigest()
+
+
+class VerdictCache:
+    """
+    Least recently used cache of judge() results.
+
+    Parameters
+    ----------
+    max_entries : int
+        The least recently used verdict is evicted past this size.
+
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(source, question):
+        return (question.id, question.case_version, source_hash(source))
+
+    def get(self, source, question):
+        """Returns the cached result for `source`, or None."""
+        key = self.key(source, question)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def set(self, source, question, result):
+        if result['verdict'] not in CACHEABLE:
+            return
+        key = self.key(source, question)
+        with self._lock:
+            self._entries[key] = copy.deepcopy(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, question_id):
+        """Drop every cached verdict of a question."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == question_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+verdict_cache = VerdictCache(settings.VERDICT_CACHE_SIZE)
@@ -0,0 +1,113 @@
+"""
+Import of test cases from a zip archive or a directory.
+
+Case N is made of the files `N.in` and `N.out`, anywhere in the archive.
+Cases are read one at a time, and the large ones go straight to blobs (see
+`Case.prepare`), so an archive of any size is imported with about one case
+in memory. Used by the `importcases` command and the question admin.
+"""
+import os
+import re
+import zipfile
+
+from django.db import transaction
+from django.db.models import F
+
+from .cache import verdict_cache
+from .models import Case, Question
+
+CASE_NAME = re.compile(r'^(\d+)\.(in|out)$')
+
+
+class InvalidArchive(ValueError):
+    """The archive does not hold a valid set of cases."""
+
+
+def import_cases(question, source, samples=(), replace=False):
+    """
+    Add the cases in `source` to `question`.
+
+    Parameters
+    ----------
+    question : Question
+        The question receiving the cases.
+    source : string or file
+        Path of a directory or a zip archive, or a zip archive opened in
+        binary mode (e.g. an uploaded file).
+    samples : iterable
+        Numbers of the cases shown as samples.
+    replace : bool
+        Delete the question's current cases first.
+    Returns
+    -------
+    count : int
+        The number of cases imported.
+
+    Raises InvalidArchive, and nothing is imported, if a case misses a
+    file or the archive cannot be read.
+    """
+    samples = set(samples)
+    with transaction.atomic():
+        if replace:
+            question.case_set.all().delete()
+        cases = []
+        for number, stdin, stdout in _read(source):
+            case = Case(question=question, stdin=stdin, stdout=stdout,
+                        sample_case=number in samples)
+            case.prepare()
+            cases.append(case)
+        Case.objects.bulk_create(cases)
+        # bulk_create() sends no signals, see signals.bump_case_version.
+        Question.objects \
+            .filter(id=question.id) \
+            .update(case_version=F('case_version') + 1)
+    verdict_cache.invalidate(question.id)
+    return len(cases)
+
+
+def _read(source):
+    """Yield (number, stdin, stdout) for every case, in number order."""
+    if isinstance(source, str) and os.path.isdir(source):
+        members = {name: os.path.join(source, name)
+                   for name in os.listdir(source)}
+        yield from _cases(members, lambda path: open(path, 'rb'))
+        return
+    try:
+        archive = zipfile.ZipFile(source)
+    except (OSError, zipfile.BadZipFile) as e:
+        raise InvalidArchive("Cannot read the archive: %s" % e)
+    with archive:
+        members = {}
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if name in members and CASE_NAME.match(name):
+                raise InvalidArchive("%s appears twice." % name)
+            members[name] = info
+        yield from _cases(members, archive.open)
+
+
+def _cases(members, open_member):
+    files = {}
+    for name, member in members.items():
+        match = CASE_NAME.match(name)
+        if match:
+            files.setdefault(int(match.group(1)), {})[match.group(2)] = member
+    if not files:
+        raise InvalidArchive("There are no N.in and N.out files.")
+    for number in sorted(files):
+        for extension in ('in', 'out'):
+            if extension not in files[number]:
+                raise InvalidArchive("%d.%s is missing." % (number, extension))
+    for number in sorted(files):
+        yield (number, _text(open_member, files[number]['in']),
+               _text(open_member, files[number]['out']))
+
+
+def _text(open_member, member):
+    with open_member(member) as f:
+        data = f.read()
+    try:
+        return data.decode()
+    except UnicodeDecodeError:
+        name = os.path.basename(getattr(member, 'filename', member))
+        raise InvalidArchive("%s is not UTF-8 text." % name)
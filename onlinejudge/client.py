@@ -0,0 +1,190 @@
+"""
+HTTP client for the judger service.
+
+Each judger backend gets a JudgerClient (see `router.get_client`). It keeps
+a pool of keep-alive connections to the judger, bounds every request
+with connect and read timeouts, retries connection failures and gateway
+errors with exponential backoff, and can gzip request bodies. Responses are
+gzip-decoded transparently by requests.
+"""
+import collections
+import gzip
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import JUDGER_ERRORS, JUDGER_PAYLOAD_BYTES
+
+
+class JudgerClient:
+    """
+    Pooled client for a single judger endpoint.
+
+    Parameters
+    ----------
+    url : string
+        Base URL of the judger, e.g. "http://judger:8080/".
+    pool_size : int
+        Maximum number of keep-alive connections kept to the judger.
+    connect_timeout, read_timeout : float
+        Seconds to wait for a connection and for the response.
+    retries : int
+        How many times a failed connection or a 502/503/504 is retried.
+    backoff : float
+        Backoff factor between retries (backoff * 2 ** (retry - 1)).
+    compress : bool
+        Gzip request bodies. The judger must accept Content-Encoding: gzip.
+
+    """
+
+    def __init__(self, url, pool_size=10, connect_timeout=3.05,
+                 read_timeout=60, retries=2, backoff=0.25, compress=False):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress = compress
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            # A read timeout means the judger is busy running the source,
+            # so it is reported rather than retried.
+            read=False,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            method_whitelist=frozenset(['GET', 'POST']),
+            raise_on_status=False)
+        self.adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        # Cleared the first time the judger turns a batch down.
+        self.batch_supported = True
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._latencies = collections.deque(maxlen=1000)
+
+    def post(self, path, data):
+        """POST `data` as JSON to the judger and return the decoded reply."""
+        body = json.dumps(data).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        JUDGER_PAYLOAD_BYTES.observe(len(body), direction='request')
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.url + path, data=body, headers=headers,
+                timeout=self.timeout)
+            JUDGER_PAYLOAD_BYTES.observe(len(response.content),
+                                         direction='response')
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                self._errors += 1
+            JUDGER_ERRORS.inc(kind=_error_kind(e))
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            with self._lock:
+                self._requests += 1
+                self._latencies.append(latency)
+
+    def run(self, source, stdin, timeout):
+        """
+        Run `source` once for every input in `stdin`.
+
+        Returns
+        -------
+        response : dict
+            The judger's reply, with the 'stdout' and 'status' keys.
+
+        """
+        data = {'source': source, 'stdin': stdin, 'timeout': timeout}
+        return self.post("python3", data)
+
+    def run_batch(self, runs):
+        """
+        Run several submissions in one request.
+
+        Parameters
+        ----------
+        runs : list
+            Dictionaries with the 'source', 'stdin' and 'timeout' keys.
+
+        Returns
+        -------
+        responses : list
+            The judger's reply for every run, in order.
+
+        Judgers without the batch endpoint get one request per run.
+        """
+        if self.batch_supported:
+            try:
+                return self.post("python3/batch", {'batch': runs})['results']
+            except requests.HTTPError as e:
+                if e.response.status_code not in (404, 405, 501):
+                    raise
+                self.batch_supported = False
+        return [self.run(**run) for run in runs]
+
+    @property
+    def connections(self):
+        """Number of connections opened to the judger so far."""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self):
+        """
+        Request statistics since the client was created.
+
+        `reused` counts requests that went over an already open connection,
+        so `connections` staying flat while `requests` grows means the
+        handshakes are gone. Latencies are in seconds and only cover the
+        most recent 1000 requests.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            requests_, errors = self._requests, self._errors
+        connections = self.connections
+        return {
+            'requests': requests_,
+            'errors': errors,
+            'connections': connections,
+            'reused': max(requests_ - connections, 0),
+            'latency_avg':
+            sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p50': _percentile(latencies, 50),
+            'latency_p99': _percentile(latencies, 99),
+            'latency_max': latencies[-1] if latencies else 0.0,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def _error_kind(error):
+    if isinstance(error, requests.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.ConnectionError):
+        return 'connection'
+    if isinstance(error, requests.HTTPError):
+        return 'http'
+    if isinstance(error, ValueError):
+        return 'invalid'
+    return 'other'
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
@@ -0,0 +1,105 @@
+"""
+Solve and attempt counters of questions.
+
+`Question.solve_count` and `Question.attempt_count` hold the number of
+distinct users who solved and attempted a question. They are incremented
+as attempts are saved, recounted for a single question when attempts are
+deleted, and `recount` rebuilds them from the Attempt table.
+
+Attempt.save takes the question's row lock before writing the attempt and
+updates the counters in the same transaction, so the attempts of a
+question change one at a time, each seeing every earlier change. An
+attempt counts its user as an attempter when no attempt of the user has a
+lower id, and as a solver when no other attempt of the user is accepted.
+Verdicts do not arrive in id order, so the solvers cannot go by id.
+"""
+from django.db.models import Count, F
+
+from .models import Attempt, Question
+
+
+def record_attempt(attempt, created, previous):
+    """
+    Update the counters after `attempt` was saved, with the question's row
+    locked (see Attempt.save).
+
+    `previous` holds the attempt's stored status before the save, or None if
+    it was just created.
+    """
+    accepted = attempt.status == Attempt.ACCEPTED
+    was_accepted = previous is not None and \
+        previous['status'] == Attempt.ACCEPTED
+    others = Attempt.objects \
+        .filter(user=attempt.user_id, question=attempt.question_id) \
+        .exclude(id=attempt.id)
+    changes = {}
+    if created and not others.filter(id__lt=attempt.id).exists():
+        changes['attempt_count'] = F('attempt_count') + 1
+    if accepted != was_accepted \
+            and not others.filter(status=Attempt.ACCEPTED).exists():
+        changes['solve_count'] = F('solve_count') + (1 if accepted else -1)
+    if changes:
+        Question.objects.filter(id=attempt.question_id).update(**changes)
+
+
+def forget_attempt(attempt):
+    """
+    Update the counters after `attempt` was deleted.
+
+    Deleting several attempts at once only sends the signals after all rows
+    are gone, so the question is recounted rather than decremented.
+    """
+    recount_question(attempt.question_id)
+
+
+def recount_question(question_id):
+    """Recount the counters of a single question."""
+    attempts = Attempt.objects.filter(question=question_id)
+    Question.objects.filter(id=question_id).update(
+        attempt_count=_count_users(attempts),
+        solve_count=_count_users(attempts.filter(status=Attempt.ACCEPTED)))
+
+
+def _count_users(attempts):
+    return attempts.values('user').distinct().count()
+
+
+def recount(fix=True):
+    """
+    Recount every question's counters from the Attempt table.
+
+    Parameters
+    ----------
+    fix : bool
+        Save the recounted values. With False, only report the drift.
+
+    Returns
+    -------
+    drift : list
+        (question, field, stored, actual) for every counter that was wrong.
+
+    """
+    attempts = _distinct_users(Attempt.objects.all())
+    solves = _distinct_users(Attempt.objects.filter(status=Attempt.ACCEPTED))
+    drift = []
+    for question in Question.objects.only('title', 'solve_count',
+                                          'attempt_count'):
+        actual = {
+            'solve_count': solves.get(question.id, 0),
+            'attempt_count': attempts.get(question.id, 0),
+        }
+        wrong = {field: value for field, value in actual.items()
+                 if getattr(question, field) != value}
+        for field, value in wrong.items():
+            drift.append((question, field, getattr(question, field), value))
+        if wrong and fix:
+            Question.objects.filter(id=question.id).update(**wrong)
+    return drift
+
+
+def _distinct_users(attempts):
+    rows = attempts \
+        .values('question') \
+        .annotate(users=Count('user', distinct=True)) \
+        .order_by()
+    return {row['question']: row['users'] for row in rows}
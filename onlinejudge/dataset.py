@@ -0,0 +1,170 @@
+"""
+Synthetic data for benchmarks.
+
+`generate` bulk-creates users, contests, questions, cases and attempts, then
+rebuilds what the signals would have maintained (counters, leaderboard,
+caches). Generated names and slugs start with "bench"; running it again adds
+to the existing dataset.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import counters, feed, leaderboard, pagecache, scoreboard, solved
+from .models import Attempt, Blob, Case, Category, Contest, Question
+
+PREFIX = "bench"
+BATCH_SIZE = 1000
+
+
+def generate(users=100, contests=2, questions=20, cases=5, case_size=16,
+             attempts=1000, accept_rate=0.5, seed=0):
+    """
+    Create a synthetic dataset.
+
+    Parameters
+    ----------
+    users, contests, attempts : int
+        How many to create.
+    questions : int
+        Questions per contest.
+    cases : int
+        Cases per question.
+    case_size : int
+        Characters in every case's input and output.
+    accept_rate : float
+        Fraction of attempts that are accepted.
+    seed : int
+        Seed of the random generator, for repeatable datasets.
+
+    Returns
+    -------
+    counts : dict
+        How many rows of every kind were created.
+
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    with transaction.atomic():
+        last_user = _last_id(User)
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        _bulk_create(User, (User(username="%s%d" % (PREFIX, i), password="!")
+                            for i in range(start, start + users)))
+        user_ids = _ids_after(User, last_user)
+
+        category, _ = Category.objects.get_or_create(name=PREFIX)
+        last_contest = _last_id(Contest)
+        start = Contest.objects.filter(slug__startswith=PREFIX).count()
+        _bulk_create(Contest, (
+            Contest(name="%s %d" % (PREFIX, i), slug="%s-%d" % (PREFIX, i),
+                    description="Synthetic contest.")
+            for i in range(start, start + contests)))
+        contest_ids = _ids_after(Contest, last_contest)
+
+        difficulties = [value for value, name in Question.DIFFICULTY_CHOICES
+                        if value < Question.FWP]
+        last_question = _last_id(Question)
+        _bulk_create(Question, (
+            Question(title="%s %d-%d" % (PREFIX, contest_id, i),
+                     slug="%s-%d-%d" % (PREFIX, contest_id, i),
+                     description="Print the input.",
+                     template="print(input())",
+                     difficulty=rng.choice(difficulties),
+                     contest_id=contest_id, category=category,
+                     published_date=now - timedelta(days=1))
+            for contest_id in contest_ids for i in range(questions)))
+        question_ids = _ids_after(Question, last_question)
+
+        case_objects = []
+        for question_id in question_ids:
+            for i in range(cases):
+                content = ("%d " % i * case_size)[:case_size]
+                case = Case(question_id=question_id, stdin=content,
+                            stdout=content, sample_case=i == 0)
+                case.prepare()
+                case_objects.append(case)
+        _bulk_create(Case, case_objects)
+
+        sources = [Blob.store("print(input())%s" % ("\n" * i))
+                   for i in range(10)]
+        solved_pairs = set()
+        last_attempt = _last_id(Attempt)
+        attempt_objects = []
+        for i in range(attempts):
+            user_id = rng.choice(user_ids)
+            question_id = rng.choice(question_ids)
+            accepted = rng.random() < accept_rate
+            first_solve = accepted and (user_id, question_id) not in \
+                solved_pairs
+            if first_solve:
+                solved_pairs.add((user_id, question_id))
+            attempt_objects.append(Attempt(
+                user_id=user_id, question_id=question_id,
+                source_blob=rng.choice(sources),
+                status=Attempt.ACCEPTED if accepted
+                else Attempt.WRONG_ANSWER,
+                first_solve=first_solve,
+                attempt_date=now - timedelta(seconds=(attempts - i) * 10)))
+        # auto_now_add stamps every row with now: set the dates afterwards.
+        dates = [attempt.attempt_date for attempt in attempt_objects]
+        _bulk_create(Attempt, attempt_objects)
+        _set_dates(_ids_after(Attempt, last_attempt), dates)
+
+        _rebuild()
+    return {
+        'users': len(user_ids),
+        'contests': len(contest_ids),
+        'questions': len(question_ids),
+        'cases': len(case_objects),
+        'attempts': len(attempt_objects),
+    }
+
+
+def _bulk_create(model, objects):
+    objects = list(objects)
+    # SQLite limits the number of parameters of a statement.
+    size = connection.ops.bulk_batch_size(model._meta.concrete_fields,
+                                          objects)
+    model.objects.bulk_create(objects,
+                              batch_size=max(min(size, BATCH_SIZE), 1))
+
+
+def _last_id(model):
+    return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def _ids_after(model, last_id):
+    # bulk_create() does not set the ids of the rows it creates on SQLite.
+    return list(model.objects
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True))
+
+
+def _set_dates(attempt_ids, dates):
+    rows = list(zip(attempt_ids, dates))
+    # Every row binds three parameters: its id twice and its date.
+    size = connection.ops.bulk_batch_size(['id', 'id', 'attempt_date'], rows)
+    size = max(min(size, BATCH_SIZE), 1)
+    for i in range(0, len(rows), size):
+        batch = rows[i:i + size]
+        Attempt.objects \
+            .filter(id__in=[attempt_id for attempt_id, date in batch]) \
+            .update(attempt_date=models.Case(
+                *[models.When(id=attempt_id, then=models.Value(
+                    date, output_field=models.DateTimeField()))
+                  for attempt_id, date in batch],
+                output_field=models.DateTimeField()))
+
+
+def _rebuild():
+    counters.recount(fix=True)
+    leaderboard.rebuild(fix=True)
+    scoreboard.invalidate()
+    solved.invalidate_contests()
+    feed.invalidate()
+    pagecache.invalidate('contests', 'questions', 'solves')
@@ -0,0 +1,124 @@
+"""
+Activity feed of the latest first solves.
+
+Older pages are read with keyset pagination on (attempt_date, id), so they
+cost one indexed query however deep they are. The first page is served from
+a process-local ring of the most recent solves. A version counter in the
+SOLVED_CACHE cache tells each process when another one (usually a judge
+worker) recorded a solve, in which case the ring is reloaded with one query.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .models import Attempt
+
+VERSION_KEY = 'activity-version'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_lock = threading.Lock()
+_ring = []
+_ring_version = None
+
+
+def _cache():
+    return caches[settings.SOLVED_CACHE]
+
+
+def _solves():
+    return Attempt.latest_solves() \
+        .select_related('user', 'question') \
+        .order_by('-attempt_date', '-id')
+
+
+def _sort_key(attempt):
+    return (attempt.attempt_date, attempt.id)
+
+
+def _loaded(attempt):
+    return all(hasattr(attempt, Attempt._meta.get_field(name).get_cache_name())
+               for name in ('user', 'question'))
+
+
+def cursor(attempt):
+    """Opaque position of `attempt` in the feed."""
+    microseconds = (attempt.attempt_date - EPOCH) // timedelta(microseconds=1)
+    return "%d_%d" % (microseconds, attempt.id)
+
+
+def _parse_cursor(value):
+    microseconds, attempt_id = (int(part) for part in value.split("_"))
+    return EPOCH + timedelta(microseconds=microseconds), attempt_id
+
+
+def latest(before=None):
+    """
+    A page of the feed.
+
+    Parameters
+    ----------
+    before : string
+        Cursor of the last solve of the previous page, None for the first.
+    Returns
+    -------
+    (solves, next_cursor) : (list, string)
+        The solves, newest first, and the cursor of the next page or None.
+
+    """
+    size = settings.ACTIVITY_PAGE_SIZE
+    if before is None:
+        solves = _first_page()
+    else:
+        try:
+            date, attempt_id = _parse_cursor(before)
+        except (ValueError, OverflowError):
+            return latest()
+        solves = list(_solves().filter(
+            Q(attempt_date__lt=date) | Q(attempt_date=date, id__lt=attempt_id)
+        )[:size])
+    next_cursor = cursor(solves[-1]) if len(solves) == size else None
+    return solves, next_cursor
+
+
+def _first_page():
+    global _ring, _ring_version
+    version = get_version(_cache(), VERSION_KEY)
+    with _lock:
+        if version == _ring_version:
+            return list(_ring)
+    ring = list(_solves()[:settings.ACTIVITY_PAGE_SIZE])
+    with _lock:
+        _ring, _ring_version = ring, version
+    return list(ring)
+
+
+def record_solve(attempt):
+    """Call when `attempt` became a first solve."""
+    global _ring, _ring_version
+    version = bump_version(_cache(), VERSION_KEY)
+    with _lock:
+        if (_ring_version is None or version != _ring_version + 1
+                or not _loaded(attempt)):
+            # Another process changed the feed too, or adding the attempt
+            # would make the page load its relations: reload on next read.
+            return
+        ring = sorted(_ring + [attempt], key=_sort_key, reverse=True)
+        _ring = ring[:settings.ACTIVITY_PAGE_SIZE]
+        _ring_version = version
+
+
+def invalidate():
+    """Call when a first solve is taken back or deleted."""
+    bump_version(_cache(), VERSION_KEY)
+
+
+def reset():
+    """Forget this process' ring."""
+    global _ring, _ring_version
+    with _lock:
+        _ring, _ring_version = [], None
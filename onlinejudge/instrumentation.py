@@ -0,0 +1,106 @@
+"""
+Per-request database instrumentation.
+
+QueryInstrumentationMiddleware records every statement a request runs and
+logs how many there were and how long they took, to the
+`onlinejudge.instrumentation` logger. Statements slower than QUERY_SLOW_MS
+are logged with their query plan. Staff also get the numbers in response
+headers:
+
+- X-Query-Count: statements run,
+- X-Query-Time: milliseconds spent in the database,
+- X-Query-Slow: statements over QUERY_SLOW_MS.
+
+Recording every statement has a cost, so the middleware is only installed
+when QUERY_INSTRUMENTATION is set.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+
+def explain(sql):
+    """
+    The query plan of the SELECT statement `sql`, as text.
+
+    `sql` must have its parameters filled in, like the statements recorded
+    in `connection.queries`.
+    """
+    if connection.vendor == 'sqlite':
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        rows = cursor.fetchall()
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def summarize(queries, slow_ms, slowest=3):
+    """
+    Sum up the statements a request ran.
+
+    Parameters
+    ----------
+    queries : list
+        Statements as recorded in `connection.queries`.
+    slow_ms : float
+        Statements taking longer (milliseconds) are slow.
+    slowest : int
+        Number of statements reported in `slowest`.
+    Returns
+    -------
+    summary : dict
+        count, time_ms, the slowest statements as (ms, sql) pairs, and
+        the slow ones.
+
+    """
+    timed = sorted(((float(query['time']) * 1000, query['sql'])
+                    for query in queries), reverse=True)
+    return {
+        'count': len(timed),
+        'time_ms': sum(ms for ms, sql in timed),
+        'slowest': timed[:slowest],
+        'slow': [(ms, sql) for ms, sql in timed if ms > slow_ms],
+    }
+
+
+class QueryInstrumentationMiddleware(MiddlewareMixin):
+    """Record and report the statements every request runs."""
+
+    def process_request(self, request):
+        request._query_debug_cursor = connection.force_debug_cursor
+        request._query_start = len(connection.queries_log)
+        connection.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_query_start'):
+            return response
+        queries = list(connection.queries_log)[request._query_start:]
+        connection.force_debug_cursor = request._query_debug_cursor
+        summary = summarize(queries, settings.QUERY_SLOW_MS)
+
+        logger.info("%s %s: %d queries in %.1f ms", request.method,
+                    request.path, summary['count'], summary['time_ms'])
+        for ms, sql in summary['slowest']:
+            logger.debug("%.1f ms: %s", ms, sql)
+        for ms, sql in summary['slow']:
+            plan = ""
+            if sql.lstrip().upper().startswith("SELECT"):
+                try:
+                    plan = explain(sql)
+                except Exception:
+                    logger.exception("Explaining a slow query failed")
+            logger.warning("Slow query on %s (%.1f ms): %s\n%s",
+                           request.path, ms, sql, plan)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['X-Query-Count'] = str(summary['count'])
+            response['X-Query-Time'] = "%.1f" % summary['time_ms']
+            response['X-Query-Slow'] = str(len(summary['slow']))
+        return response
@@ -1,9 +1,12 @@
-import json
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from django.conf import settings
 
-from .models import Attempt
+from .cache import verdict_cache
+from .metrics import STAGE_SECONDS, VERDICT_CACHE
+from .models import Attempt, Case
+from .router import get_client
 
 STATUS = {
     'OK': Attempt.ACCEPTED,
@@ -13,7 +16,7 @@ STATUS = {
 }
 
 
-def judge(source, question):
+def judge(source, question, cases=None):
     """
     Judge runs the source submit by user and gets the verdict
     Parameters
@@ -22,31 +25,202 @@ def judge(source, question):
         The source code submitted by the user
     question : Question
         The question that the user is attempting to solve.
+    cases : tuple
+        The question's cases as returned by load_cases(), to judge many
+        submissions without loading them every time.
     Returns
     -------
     result : dict
         A dictionary containing the test cases and verdict.
 
     """
-    cases = question.case_set.all()
-    stdin = [case.stdin.replace("\r", "") + "\n" for case in cases]
-    expected_output = [case.stdout.replace("\r", "") + "\n" for case in cases]
-    data = {'source': source, 'stdin': stdin, 'timeout': 2000}
-    r = requests.post(settings.JUDGER_URL + "python3", json=data)
-    response = json.loads(r.text)
-    cases, verdict = match(expected_output, response)
+    result = verdict_cache.get(source, question)
+    if result is not None:
+        VERDICT_CACHE.inc(result='hit')
+        return result
+    VERDICT_CACHE.inc(result='miss')
+    if cases is None:
+        with STAGE_SECONDS.time(stage='load_cases'):
+            cases = load_cases(question)
+    stdin, expected_output = cases
+    if question.shard_size and len(stdin) > question.shard_size:
+        cases, verdict, complete = judge_sharded(
+            source, stdin, expected_output, question.shard_size)
+    else:
+        with STAGE_SECONDS.time(stage='judger'):
+            response = get_client().run(source, stdin,
+                                        settings.JUDGER_TIMEOUT)
+        with STAGE_SECONDS.time(stage='match'):
+            cases, verdict = match(expected_output, response)
+        complete = True
     result = {'cases': cases, 'verdict': verdict}
+    if complete:
+        # Sharded judging that stopped early only has some of the cases.
+        verdict_cache.set(source, question, result)
     return result
 
 
+def judge_batch(submissions):
+    """
+    Judge several submissions with a single judger request.
+
+    Parameters
+    ----------
+    submissions : list
+        (source, question) pairs.
+    Returns
+    -------
+    results : list
+        The result of every submission, as returned by judge().
+
+    Raises ValueError if the judger does not reply to every run.
+    """
+    results = [None] * len(submissions)
+    misses = []
+    for i, (source, question) in enumerate(submissions):
+        if question.shard_size:
+            # Sharded questions get requests of their own.
+            results[i] = judge(source, question)
+        else:
+            results[i] = verdict_cache.get(source, question)
+            VERDICT_CACHE.inc(result='hit' if results[i] else 'miss')
+        if results[i] is None:
+            misses.append(i)
+    if not misses:
+        return results
+
+    loaded = {}
+    runs, expected_outputs = [], []
+    with STAGE_SECONDS.time(stage='load_cases'):
+        for i in misses:
+            source, question = submissions[i]
+            if question.id not in loaded:
+                loaded[question.id] = load_cases(question)
+            stdin, expected_output = loaded[question.id]
+            runs.append({'source': source, 'stdin': stdin,
+                         'timeout': settings.JUDGER_TIMEOUT})
+            expected_outputs.append(expected_output)
+    with STAGE_SECONDS.time(stage='judger'):
+        responses = get_client().run_batch(runs)
+    if len(responses) != len(runs):
+        raise ValueError("The judger replied to %d of %d runs." % (
+            len(responses), len(runs)))
+    for i, expected_output, response in zip(misses, expected_outputs,
+                                            responses):
+        with STAGE_SECONDS.time(stage='match'):
+            cases, verdict = match(expected_output, response)
+        results[i] = {'cases': cases, 'verdict': verdict}
+        verdict_cache.set(*submissions[i], results[i])
+    return results
+
+
+def judge_sharded(source, stdin, expected_output, shard_size):
+    """
+    Judge the cases in shards of `shard_size` concurrent requests.
+
+    Stops once a shard failed and every shard before it completed, since
+    the verdict can no longer be Accepted. Shards that have not started yet
+    are cancelled; requests already sent to the judger finish in the
+    background and are ignored.
+
+    Returns
+    -------
+    (cases, verdict, complete) : (list, int, bool)
+        The per-case results of the shards up to the first one that failed,
+        in case order, the verdict of that shard or Accepted, and whether
+        every case was judged.
+
+    The verdict and the cases do not depend on the order in which the
+    shards complete.
+    """
+    client = get_client()
+    executor = _shard_executor()
+    starts = list(range(0, len(stdin), shard_size))
+    futures = {
+        executor.submit(_run_shard, client, source,
+                        stdin[start:start + shard_size]): start
+        for start in starts
+    }
+    completed = {}
+    # Index in `starts` of the first shard not completed yet.
+    decided = 0
+    verdict = Attempt.ACCEPTED
+    try:
+        for future in as_completed(futures):
+            start = futures[future]
+            expected = expected_output[start:start + shard_size]
+            with STAGE_SECONDS.time(stage='match'):
+                completed[start] = match(expected, future.result())
+            while decided < len(starts) and starts[decided] in completed:
+                verdict = completed[starts[decided]][1]
+                decided += 1
+                if verdict != Attempt.ACCEPTED:
+                    break
+            if verdict != Attempt.ACCEPTED:
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+
+    cases = []
+    for start in starts[:decided]:
+        cases.extend(completed[start][0])
+    return cases, verdict, decided == len(starts)
+
+
+def _run_shard(client, source, stdin):
+    with STAGE_SECONDS.time(stage='judger'):
+        return client.run(source, stdin, settings.JUDGER_TIMEOUT)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _shard_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.JUDGER_SHARD_WORKERS)
+        return _executor
+
+
+def load_cases(question):
+    """
+    Returns the judger input and the expected output digest of every case.
+
+    Cases are normalized when saved and expected outputs are never loaded.
+    """
+    cases = question.case_set \
+        .select_related('stdin_blob') \
+        .only('stdin', 'stdin_blob', 'stdout_digest')
+    stdin, expected_output = [], []
+    for case in cases:
+        stdin.append(case.input + "\n")
+        expected_output.append(case.stdout_digest)
+    return stdin, expected_output
+
+
 def match(expected_output, response):
-    """Matches the output with expected output"""
+    """
+    Matches the output with expected output
+
+    Parameters
+    ----------
+    expected_output : list
+        Case.output_digest() of every case's expected output.
+    response : dict
+        The judger's reply.
+
+    Each case's output is hashed as it is split from the judger's stdout,
+    so no copy of the expected outputs is needed.
+    """
     result = []
-    response_output = parse_stdout(response['stdout'])
+    response_output = iter_stdout(response['stdout'])
     status = response['status']
     verdict = STATUS[status]
     for expected, got in zip(expected_output, response_output):
-        if expected.strip() == got.strip():
+        if expected == Case.output_digest(got):
             result.append(Attempt.ACCEPTED
                           if status == 'OK' else Attempt.RUNTIME_ERROR)
         else:
@@ -70,17 +244,44 @@ def parse_stdout(output):
         ["Hello\n", "World\n"]
 
     """
-    i = 1
-    stdouts, stdout = [], ""
+    return list(iter_stdout(output))
+
+
+def iter_stdout(output):
+    """
+    Yield the output of every case in the judger's stdout, one at a time.
+
+    Runs in linear time and only copies each case's output once. Case i + 1
+    starts at the first line after case i that is exactly "<i + 1>.in", so a
+    submission printing "2.in" after the real marker stays in case 2.
+    """
     # Compensate for new line at end of file.
+    end = max(len(output) - 1, 0)
     # Ignore first line: 1.in.
-    for line in output[:-1].split('\n')[1:]:
-        if line == "%d.in" % (i + 1):
-            stdouts.append(stdout[:-1])
-            i += 1
-            stdout = ""
-            continue
-        stdout += line + "\n"
-    stdouts.append(stdout[:-1])
-
-    return stdouts
+    first = output.find('\n', 0, end)
+    if first == -1:
+        yield ""
+        return
+    start = first + 1
+    i = 2
+    while True:
+        marker = "%d.in" % i
+        found = _find_line(output, marker, start, end)
+        if found == -1:
+            break
+        yield output[start:found - 1] if found > start else ""
+        start = found + len(marker) + 1
+        i += 1
+    yield output[start:end]
+
+
+def _find_line(output, line, start, end):
+    """Index of the first line in output[start:end] equal to `line`."""
+    index = output.find(line, start, end)
+    while index != -1:
+        after = index + len(line)
+        if ((index == start or output[index - 1] == '\n')
+                and (after == end or output[after] == '\n')):
+            return index
+        index = output.find(line, index + 1, end)
+    return -1
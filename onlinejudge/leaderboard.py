@@ -0,0 +1,143 @@
+"""
+Materialized global leaderboard.
+
+Every user with a first solve has a LeaderboardEntry holding their points,
+last solve date and rank. When a user's first solves change, only that
+user's score is recomputed and the ranks between their old and new position
+are shifted by one, so reading a page of the leaderboard is a range scan
+over `rank`.
+
+Rank updates of different users overlap, so they are serialized: by an
+advisory lock on PostgreSQL, which covers every process, and by a lock of
+the process elsewhere. A user's score is read after taking it.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Q, Sum
+
+from .models import Attempt, LeaderboardEntry
+
+# Identifies the advisory lock of the leaderboard.
+LOCK_KEY = 724533913
+_lock = threading.Lock()
+
+
+@contextmanager
+def _ranks_locked():
+    """A transaction in which no other rank update runs."""
+    with _lock, transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_KEY])
+        yield
+
+
+def _better_than(points, last_solve, user_id):
+    # Leaderboard is sorted by score, then earliest last solve, then user.
+    return Q(points__gt=points) \
+        | Q(points=points, last_solve__lt=last_solve) \
+        | Q(points=points, last_solve=last_solve, user__lt=user_id)
+
+
+def _shift(user_id, delta, **ranks):
+    LeaderboardEntry.objects \
+        .filter(**ranks) \
+        .exclude(user=user_id) \
+        .update(rank=F('rank') + delta)
+
+
+def update_user(user_id):
+    """Recompute a user's score and move them to their new rank."""
+    with _ranks_locked():
+        standing = Attempt.objects \
+            .filter(user=user_id, first_solve=True) \
+            .aggregate(points=Sum('question__difficulty'),
+                       last_solve=Max('attempt_date'))
+        entry = LeaderboardEntry.objects \
+            .filter(user=user_id) \
+            .first()
+        if standing['points'] is None:
+            if entry is not None:
+                _shift(user_id, -1, rank__gt=entry.rank)
+                entry.delete()
+            return
+
+        rank = LeaderboardEntry.objects \
+            .filter(_better_than(standing['points'], standing['last_solve'],
+                                 user_id)) \
+            .exclude(user=user_id) \
+            .count() + 1
+        if entry is None:
+            _shift(user_id, 1, rank__gte=rank)
+            entry = LeaderboardEntry(user_id=user_id)
+        elif rank < entry.rank:
+            _shift(user_id, 1, rank__gte=rank, rank__lt=entry.rank)
+        elif rank > entry.rank:
+            _shift(user_id, -1, rank__gt=entry.rank, rank__lte=rank)
+        entry.points = standing['points']
+        entry.last_solve = standing['last_solve']
+        entry.rank = rank
+        entry.save()
+
+
+def standings():
+    """
+    Compute the leaderboard from scratch.
+
+    Returns
+    -------
+    entries : list
+        Unsaved LeaderboardEntry objects, in rank order.
+
+    """
+    rows = Attempt.objects \
+        .filter(first_solve=True) \
+        .values('user') \
+        .annotate(points=Sum('question__difficulty'),
+                  last_solve=Max('attempt_date')) \
+        .order_by('-points', 'last_solve', 'user')
+    return [
+        LeaderboardEntry(user_id=row['user'], points=row['points'],
+                         last_solve=row['last_solve'], rank=rank)
+        for rank, row in enumerate(rows, 1)
+    ]
+
+
+def rebuild(fix=True):
+    """
+    Compare the stored leaderboard with one computed from scratch.
+
+    Parameters
+    ----------
+    fix : bool
+        Replace the stored leaderboard if they differ.
+
+    Returns
+    -------
+    drift : int
+        The number of users whose stored row is wrong or missing.
+
+    """
+    def key(entry):
+        return (entry.user_id, entry.points, entry.last_solve, entry.rank)
+
+    with _ranks_locked():
+        entries = standings()
+        expected = {key(entry) for entry in entries}
+        stored = {key(entry) for entry in LeaderboardEntry.objects.all()}
+        drift = len({row[0] for row in expected ^ stored})
+        if drift and fix:
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create(entries)
+    return drift
+
+
+def page(number, size):
+    """Entries of the 1-indexed page `number`, with their users."""
+    first = (number - 1) * size
+    return LeaderboardEntry.objects \
+        .filter(rank__gt=first, rank__lte=first + size) \
+        .select_related('user') \
+        .order_by('rank')
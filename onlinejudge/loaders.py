@@ -0,0 +1,46 @@
+"""
+Data loaders for pages that would otherwise query per item in templates.
+"""
+import itertools
+
+from django.utils import timezone
+
+from .models import Question
+from .pagecache import cached
+from .solved import solved_set
+
+
+def load_contest(contest, user):
+    """
+    Load everything the contest page shows in a constant number of queries.
+
+    Parameters
+    ----------
+    contest : Contest
+    user : User
+        The user viewing the page, possibly anonymous.
+    Returns
+    -------
+    categories : list
+        (category, questions) pairs of the published questions, ordered by
+        difficulty then publish date within each category.
+    solved : SolvedSet
+        The ids of the questions that `user` solved.
+
+    """
+    def build():
+        questions = Question.objects \
+            .filter(contest=contest, category__isnull=False,
+                    published_date__lte=timezone.now()) \
+            .select_related('category') \
+            .order_by('category_id', 'difficulty', 'published_date')
+        return [
+            (category, list(questions))
+            for category, questions in itertools.groupby(
+                questions, key=lambda question: question.category)
+        ]
+
+    # The questions are the same for everyone, only `solved` is per user.
+    categories = cached('contest-categories:%d' % contest.id,
+                        ['contests', 'questions', 'solves'], build, user)
+    return categories, solved_set(user)
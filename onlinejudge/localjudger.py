@@ -0,0 +1,149 @@
+"""
+The 'local' judge backend.
+
+LocalJudger runs submissions on the machine of the judge worker, in a pool
+of processes started once from multiprocessing's fork server, so they share
+nothing with the worker's threads and database connections. Each pool
+process runs the cases of a submission in processes forked from itself,
+with CPU time, memory and output limits (see `sandbox`).
+
+It needs no judger service, so it serves as a fallback while the service
+is down (JUDGE_FALLBACK = 'local') and lets the whole pipeline run offline.
+The pool is only started on the first run, so web processes configured
+with this backend do not start one.
+"""
+import collections
+import multiprocessing
+import threading
+import time
+
+import requests
+
+from . import sandbox
+from .backends import JudgeBackend
+from .client import _percentile
+from .metrics import JUDGER_ERRORS
+
+
+class LocalJudger(JudgeBackend):
+    """
+    Pool of processes running Python 3 submissions.
+
+    Parameters
+    ----------
+    workers : int
+        Processes in the pool, i.e. cases run at the same time.
+    memory_limit : int
+        Bytes of address space a case may use.
+    output_limit : int
+        Bytes a case may print.
+    read_timeout : float
+        Seconds to wait for a run, including the time it waits for a free
+        process.
+
+    """
+
+    def __init__(self, workers=4, memory_limit=256 * 1024 * 1024,
+                 output_limit=1024 * 1024, read_timeout=60):
+        self.workers = workers
+        self.memory_limit = memory_limit
+        self.output_limit = output_limit
+        self.read_timeout = read_timeout
+        self._pool = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.healthy = True
+        self._in_flight = 0
+        self._requests = 0
+        self._errors = 0
+        self._latencies = collections.deque(maxlen=1000)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._closed:
+                raise requests.ConnectionError("The local judger is closed.")
+            if self._pool is None:
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['onlinejudge.sandbox'])
+                self._pool = context.Pool(self.workers)
+            self._in_flight += 1
+            return self._pool
+
+    def _submit(self, pool, source, stdin, timeout):
+        return pool.apply_async(sandbox.run, (
+            source, stdin, timeout, self.memory_limit, self.output_limit))
+
+    def _wait(self, pending):
+        deadline = time.monotonic() + self.read_timeout
+        try:
+            return [result.get(max(deadline - time.monotonic(), 0))
+                    for result in pending]
+        except multiprocessing.TimeoutError:
+            JUDGER_ERRORS.inc(kind='timeout')
+            raise requests.Timeout("The local judger did not reply in %s "
+                                   "seconds." % self.read_timeout)
+
+    def _call(self, runs):
+        pool = self._get_pool()
+        start = time.perf_counter()
+        ok = False
+        try:
+            pending = [self._submit(pool, **run) for run in runs]
+            responses = self._wait(pending)
+            ok = True
+            return responses
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._requests += 1
+                self._errors += not ok
+                self._latencies.append(time.perf_counter() - start)
+
+    def run(self, source, stdin, timeout):
+        """See JudgeBackend.run."""
+        return self._call([{'source': source, 'stdin': stdin,
+                            'timeout': timeout}])[0]
+
+    def run_batch(self, runs):
+        """Run several submissions at the same time, see JudgeBackend."""
+        return self._call(runs)
+
+    @property
+    def available(self):
+        return self.healthy and not self._closed
+
+    def check(self):
+        """Run an empty submission."""
+        try:
+            self.run("", [], 1000)
+            self.healthy = True
+        except requests.RequestException:
+            self.healthy = False
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            requests_, errors = self._requests, self._errors
+            in_flight = self._in_flight
+        return [{
+            'url': 'local',
+            'healthy': self.available,
+            'circuit': 'closed',
+            'in_flight': in_flight,
+            'workers': self.workers,
+            'requests': requests_,
+            'errors': errors,
+            'latency_avg':
+            sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p50': _percentile(latencies, 50),
+            'latency_p99': _percentile(latencies, 99),
+            'latency_max': latencies[-1] if latencies else 0.0,
+        }]
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._closed = True
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from onlinejudge import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark scenario and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(benchmarks.SCENARIOS))
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=benchmarks.DEFAULT_SIZES,
+            help="Judger output sizes in bytes (parse).")
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help="Runs per measurement, the best one is reported (parse).")
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help="Requests per measurement (load scenarios).")
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Judge worker threads (submit_storm).")
+        parser.add_argument(
+            '--latency', type=float, default=0.05,
+            help="Seconds the stub judger takes per reply (submit_storm).")
+        parser.add_argument(
+            '--output-size', type=int,
+            help="Bytes the stub judger prints per case instead of echoing "
+                 "the input (submit_storm).")
+
+    def handle(self, *args, **options):
+        result = benchmarks.SCENARIOS[options['scenario']](options)
+        self.stdout.write(json.dumps(result, indent=2))
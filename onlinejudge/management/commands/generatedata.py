@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from onlinejudge import dataset
+
+
+class Command(BaseCommand):
+    help = "Create a synthetic dataset for the benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--contests', type=int, default=2)
+        parser.add_argument(
+            '--questions', type=int, default=20,
+            help="Questions per contest.")
+        parser.add_argument(
+            '--cases', type=int, default=5, help="Cases per question.")
+        parser.add_argument(
+            '--case-size', type=int, default=16,
+            help="Characters in every case's input and output.")
+        parser.add_argument('--attempts', type=int, default=1000)
+        parser.add_argument(
+            '--accept-rate', type=float, default=0.5,
+            help="Fraction of the attempts that are accepted.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        counts = dataset.generate(
+            users=options['users'],
+            contests=options['contests'],
+            questions=options['questions'],
+            cases=options['cases'],
+            case_size=options['case_size'],
+            attempts=options['attempts'],
+            accept_rate=options['accept_rate'],
+            seed=options['seed'])
+        self.stdout.write(json.dumps(counts, indent=2))
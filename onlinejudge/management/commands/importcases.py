@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from onlinejudge import caseimport
+from onlinejudge.models import Question
+
+
+class Command(BaseCommand):
+    help = "Import test cases from a zip or a directory of N.in/N.out files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('question', help="Slug of the question.")
+        parser.add_argument('path', help="Zip archive or directory.")
+        parser.add_argument(
+            '--sample', type=int, nargs='+', default=[],
+            help="Numbers of the cases shown as samples.")
+        parser.add_argument(
+            '--replace', action='store_true',
+            help="Delete the question's current cases first.")
+
+    def handle(self, *args, **options):
+        try:
+            question = Question.objects.get(slug=options['question'])
+        except Question.DoesNotExist:
+            raise CommandError("No question %s." % options['question'])
+        try:
+            count = caseimport.import_cases(
+                question, options['path'], samples=options['sample'],
+                replace=options['replace'])
+        except caseimport.InvalidArchive as e:
+            raise CommandError(e)
+        self.stdout.write(
+            "Imported %d cases into %s." % (count, question.title))
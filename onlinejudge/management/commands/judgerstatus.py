@@ -0,0 +1,22 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from onlinejudge.backends import STATS_KEY
+
+
+class Command(BaseCommand):
+    help = "Show the judger backends as last probed by the judge workers."
+
+    def handle(self, *args, **options):
+        backends = cache.get(STATS_KEY)
+        if backends is None:
+            raise CommandError("No judge worker reported recently.")
+        for backend in backends:
+            self.stdout.write(
+                "%(url)s %(state)s, circuit %(circuit)s, %(in_flight)d in "
+                "flight, %(requests)d requests, %(errors)d errors, "
+                "p50 %(p50).3fs, p99 %(p99).3fs" % dict(
+                    backend,
+                    state="up" if backend['healthy'] else "down",
+                    p50=backend['latency_p50'],
+                    p99=backend['latency_p99']))
@@ -0,0 +1,56 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from onlinejudge import worker
+from onlinejudge.router import get_client
+
+
+class Command(BaseCommand):
+    help = "Judge pending attempts with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Number of attempts judged concurrently.")
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to wait when the queue is empty.")
+        parser.add_argument(
+            '--stale-after', type=float, default=300,
+            help="Requeue attempts left in the judging state this long.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        get_client().start_probing(settings.JUDGER_PROBE_INTERVAL, stop)
+
+        def work():
+            try:
+                worker.run(
+                    poll_interval=options['poll_interval'],
+                    stale_after=options['stale_after'],
+                    stop=stop,
+                    once=options['once'])
+            finally:
+                # Every thread has its own database connection.
+                connection.close()
+
+        threads = [threading.Thread(target=work, daemon=True)
+                   for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        self.stdout.write("Started %d judge workers." % len(threads))
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Waiting for running attempts to finish...")
+            stop.set()
+            for thread in threads:
+                thread.join()
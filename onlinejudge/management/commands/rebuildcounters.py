@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from onlinejudge import counters
+
+
+class Command(BaseCommand):
+    help = "Recount the solve and attempt counters of every question."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report counters that drifted, do not fix them.")
+
+    def handle(self, *args, **options):
+        drift = counters.recount(fix=not options['check'])
+        for question, field, stored, actual in drift:
+            self.stdout.write("%s: %s is %d, should be %d" % (
+                question.title, field, stored, actual))
+        if not options['check']:
+            self.stdout.write("Fixed %d counters." % len(drift))
+        elif drift:
+            raise CommandError("%d counters drifted." % len(drift))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from onlinejudge import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Recompute the leaderboard from every first solve."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report users whose row drifted, do not fix them.")
+
+    def handle(self, *args, **options):
+        drift = leaderboard.rebuild(fix=not options['check'])
+        if not options['check']:
+            self.stdout.write("Fixed %d leaderboard rows." % drift)
+        elif drift:
+            raise CommandError("%d leaderboard rows drifted." % drift)
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from onlinejudge import rejudge
+from onlinejudge.models import Attempt, Contest, Question
+
+
+class Command(BaseCommand):
+    help = "Judge the attempts of a question or a contest again."
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--question', help="Slug of the question.")
+        target.add_argument('--contest', help="Slug of the contest.")
+        parser.add_argument(
+            '--status', type=int, nargs='+',
+            choices=[status for status, name in Attempt.STATUS_CHOICES],
+            help="Only rejudge attempts with these verdicts (%s)." %
+            ", ".join("%d: %s" % choice
+                      for choice in Attempt.STATUS_CHOICES))
+        parser.add_argument(
+            '--user', help="Only rejudge the attempts of this user.")
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help="Attempts judged concurrently.")
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help="Attempts saved together.")
+        parser.add_argument(
+            '--checkpoint',
+            help="Progress file, resumed if it exists. Defaults to "
+                 "rejudge-<slug>.json in the current directory.")
+
+    def handle(self, *args, **options):
+        if options['question']:
+            slug = options['question']
+            if not Question.objects.filter(slug=slug).exists():
+                raise CommandError("No question %s." % slug)
+            attempts = Attempt.objects.filter(question__slug=slug)
+        else:
+            slug = options['contest']
+            if not Contest.objects.filter(slug=slug).exists():
+                raise CommandError("No contest %s." % slug)
+            attempts = Attempt.objects.filter(question__contest__slug=slug)
+        scope = "question %s" % slug if options['question'] \
+            else "contest %s" % slug
+        if options['status']:
+            attempts = attempts.filter(status__in=options['status'])
+            scope += " with status %s" % sorted(options['status'])
+        if options['user']:
+            attempts = attempts.filter(user__username=options['user'])
+            scope += " of %s" % options['user']
+        checkpoint = options['checkpoint'] or "rejudge-%s.json" % slug
+
+        def progress(done, total, rate):
+            self.stdout.write("%d/%d attempts, %.1f attempts/s" % (
+                done, total, rate))
+
+        try:
+            summary = rejudge.rejudge(
+                attempts, scope, workers=options['workers'],
+                chunk_size=options['chunk_size'], checkpoint=checkpoint,
+                progress=progress)
+        except rejudge.CheckpointMismatch as e:
+            raise CommandError(e)
+        except (Exception, KeyboardInterrupt):
+            self.stderr.write("Interrupted, run the same command again to "
+                              "resume from %s." % checkpoint)
+            raise
+        self.stdout.write(
+            "Rejudged %(attempts)d attempts, %(changed)d changed verdict, "
+            "at %(attempts_per_second).1f attempts/s." % summary)
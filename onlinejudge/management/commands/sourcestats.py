@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from onlinejudge.models import Blob
+
+
+class Command(BaseCommand):
+    help = "Report the space saved by storing attempt sources as blobs."
+
+    def handle(self, *args, **options):
+        usage = Blob.usage()
+        raw, stored = usage['raw_bytes'], usage['stored_bytes']
+        self.stdout.write("%d attempts share %d sources." % (
+            usage['attempts'], usage['blobs']))
+        self.stdout.write("Inline: %d bytes, stored: %d bytes." % (
+            raw, stored))
+        if raw:
+            self.stdout.write("Saved %d bytes (%.1f%%)." % (
+                raw - stored, 100 * (raw - stored) / raw))
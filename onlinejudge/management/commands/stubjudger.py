@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from onlinejudge.stubjudger import StubJudger, echo, fixed_output
+
+
+class Command(BaseCommand):
+    help = "Serve a local stub of the judger, e.g. for load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument(
+            '--latency', type=float, default=0,
+            help="Seconds to wait before every reply.")
+        parser.add_argument(
+            '--output-size', type=int,
+            help="Bytes printed by every case, instead of echoing its input.")
+        parser.add_argument(
+            '--batch', action='store_true',
+            help="Also serve the batch endpoint.")
+
+    def handle(self, *args, **options):
+        size = options['output_size']
+        stub = StubJudger(
+            run=echo if size is None else fixed_output(size),
+            batch=options['batch'], latency=options['latency'],
+            host=options['host'], port=options['port'])
+        self.stdout.write("Serving the judger protocol at %s" % stub.url)
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
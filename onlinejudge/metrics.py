@@ -0,0 +1,238 @@
+"""
+Counters and histograms of the judging pipeline, in Prometheus format.
+
+Recording a value only updates a dictionary in the current process. Each
+process writes its values to a file of its own in METRICS_DIR at most every
+METRICS_FLUSH_INTERVAL seconds, and `render` adds up the files of every
+process, so the `/metrics` endpoint reports the totals of all gunicorn
+workers and judge workers whichever process serves it. Files are named
+after the process id and a random id drawn when the process starts, so
+processes that get the same pid on other machines or after a restart do
+not overwrite each other. Empty METRICS_DIR at deploy time: files of
+processes that exited are still counted, which keeps the counters from
+going backwards when a worker is restarted.
+
+METRICS_DIR must be storage shared by every process, e.g. a volume mounted
+on every machine. Heroku dynos do not share their filesystem, so there
+`/metrics` only adds up the processes of the dyno serving the request.
+
+Without METRICS_DIR, every process only reports its own values.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                 16777216)
+
+
+class Registry:
+    """The values of every metric recorded by the current process."""
+
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._id = "%d-%s" % (self._pid, uuid.uuid4().hex)
+        # {(metric name, label pairs): value}, histograms hold a list of
+        # per-bucket counts followed by the sum and the count.
+        self._values = {}
+        self._next_flush = 0
+
+    def record(self, metric, labels, value):
+        key = (metric.name, tuple(sorted(labels.items())))
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked: the values belong to the parent.
+                self._reset()
+            metric.update(self._values, key, value)
+            now = time.monotonic()
+            flush = settings.METRICS_DIR and now >= self._next_flush
+            if flush:
+                self._next_flush = now + settings.METRICS_FLUSH_INTERVAL
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reset()
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self._values.items()}
+
+    def _path(self):
+        return os.path.join(settings.METRICS_DIR,
+                            "metrics-%s.json" % self._id)
+
+    def flush(self):
+        """Write this process' values to METRICS_DIR."""
+        if not settings.METRICS_DIR:
+            return
+        data = [[name, labels, value]
+                for (name, labels), value in self.snapshot().items()]
+        path = self._path()
+        temporary = "%s.%d.tmp" % (path, threading.get_ident())
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """The values of every process, added up."""
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush()
+        totals = {}
+        pattern = os.path.join(settings.METRICS_DIR, "metrics-*.json")
+        for path in glob.glob(pattern):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Removed or being replaced, it is read next time.
+                continue
+            for name, labels, value in data:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if key not in totals:
+                    totals[key] = value
+                elif isinstance(value, list):
+                    totals[key] = [a + b for a, b in zip(totals[key], value)]
+                else:
+                    totals[key] += value
+        return totals
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+class Counter:
+    """A count that only goes up, e.g. verdicts given."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        registry.metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        registry.record(self, labels, amount)
+
+    def update(self, values, key, amount):
+        values[key] = values.get(key, 0) + amount
+
+    def samples(self, labels, value):
+        yield self.name, labels, value
+
+
+class Histogram:
+    """Observed values, e.g. durations, counted in buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        registry.metrics.append(self)
+
+    def observe(self, value, **labels):
+        registry.record(self, labels, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds the block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def update(self, values, key, value):
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        counts[-2] += value
+        counts[-1] += 1
+
+    def samples(self, labels, counts):
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield (self.name + '_bucket', labels + (('le', repr(bound)),),
+                   cumulative)
+        yield self.name + '_bucket', labels + (('le', '+Inf'),), counts[-1]
+        yield self.name + '_sum', labels, counts[-2]
+        yield self.name + '_count', labels, counts[-1]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                     .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels)
+
+
+def render():
+    """Every metric of every process, in the Prometheus text format."""
+    values = registry.collect()
+    lines = []
+    for metric in registry.metrics:
+        lines.append("# HELP %s %s" % (metric.name, metric.documentation))
+        lines.append("# TYPE %s %s" % (metric.name, metric.type))
+        for (name, labels), value in sorted(values.items()):
+            if name != metric.name:
+                continue
+            for sample, sample_labels, sample_value in \
+                    metric.samples(labels, value):
+                lines.append("%s%s %s" % (sample,
+                                          _format_labels(sample_labels),
+                                          repr(float(sample_value))))
+    return "\n".join(lines) + "\n"
+
+
+# The judging pipeline.
+STAGE_SECONDS = Histogram(
+    'onlinejudge_judge_stage_seconds',
+    "Seconds spent in each stage of judging a submission.")
+QUEUE_SECONDS = Histogram(
+    'onlinejudge_queue_wait_seconds',
+    "Seconds attempts waited in the queue before a worker claimed them.")
+VERDICTS = Counter(
+    'onlinejudge_verdicts_total', "Verdicts recorded by the judge workers.")
+VERDICT_CACHE = Counter(
+    'onlinejudge_verdict_cache_total',
+    "Verdict cache lookups by result (hit or miss).")
+PAGE_CACHE = Counter(
+    'onlinejudge_page_cache_total',
+    "Page cache lookups of anonymous requests by page and result (hit or "
+    "miss).")
+JUDGER_ERRORS = Counter(
+    'onlinejudge_judger_errors_total',
+    "Failed judger requests by kind (timeout, connection, http, invalid).")
+JUDGER_PAYLOAD_BYTES = Histogram(
+    'onlinejudge_judger_payload_bytes',
+    "Size of the judger requests and replies, in bytes.", BYTES_BUCKETS)
+SUBMIT_SECONDS = Histogram(
+    'onlinejudge_submit_seconds',
+    "Seconds the submit view took, by outcome (queued, coalesced, "
+    "throttled, offline).")
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0007_question_author'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='claimed_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='attempt',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'Wrong Answer'), (1, 'Accepted'), (2, 'Runtime Error'), (3, 'Server Error'), (4, 'Timed Out'), (5, 'Accepted (Testing)'), (6, 'Pending'), (7, 'Judging')]),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='difficulty',
+            field=models.IntegerField(choices=[(20, 'Mudah'), (40, 'Sedang'), (70, 'Sulit'), (200, 'Ganteng'), (100000, 'FWP')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:35
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0008_auto_20261018_1628'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='case_version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0009_question_case_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='shard_size',
+            field=models.PositiveIntegerField(default=0, help_text='Judge the cases concurrently in shards of this many cases and stop at the first failure. 0 disables sharding.'),
+        ),
+    ]
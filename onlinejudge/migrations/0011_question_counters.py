@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_users(apps, schema_editor):
+    Attempt = apps.get_model('onlinejudge', 'Attempt')
+    Question = apps.get_model('onlinejudge', 'Question')
+
+    def distinct_users(attempts):
+        rows = attempts.values('question') \
+            .annotate(users=Count('user', distinct=True)).order_by()
+        return {row['question']: row['users'] for row in rows}
+
+    attempts = distinct_users(Attempt.objects.all())
+    solves = distinct_users(Attempt.objects.filter(status=1))
+    for question_id, users in attempts.items():
+        Question.objects.filter(id=question_id).update(
+            attempt_count=users, solve_count=solves.get(question_id, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0010_question_shard_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='attempt_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='solve_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_users, migrations.RunPython.noop),
+    ]
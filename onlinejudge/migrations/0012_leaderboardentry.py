@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:39
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Sum
+import django.db.models.deletion
+
+
+def rank_users(apps, schema_editor):
+    Attempt = apps.get_model('onlinejudge', 'Attempt')
+    LeaderboardEntry = apps.get_model('onlinejudge', 'LeaderboardEntry')
+    rows = Attempt.objects \
+        .filter(first_solve=True) \
+        .values('user') \
+        .annotate(points=Sum('question__difficulty'),
+                  last_solve=Max('attempt_date')) \
+        .order_by('-points', 'last_solve')
+    LeaderboardEntry.objects.bulk_create(
+        LeaderboardEntry(user_id=row['user'], points=row['points'],
+                         last_solve=row['last_solve'], rank=rank)
+        for rank, row in enumerate(rows, 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0008_alter_user_username_max_length'),
+        ('onlinejudge', '0011_question_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('points', models.IntegerField()),
+                ('last_solve', models.DateTimeField()),
+                ('rank', models.PositiveIntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard entries',
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['-points', 'last_solve'], name='onlinejudge_points_485e6c_idx'),
+        ),
+        migrations.RunPython(rank_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:46
+from __future__ import unicode_literals
+
+import collections
+import hashlib
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 500
+
+
+def store_sources(apps, schema_editor):
+    """Move the sources to blobs, CHUNK_SIZE attempts at a time."""
+    Attempt = apps.get_model('onlinejudge', 'Attempt')
+    SourceBlob = apps.get_model('onlinejudge', 'SourceBlob')
+    last_id = 0
+    while True:
+        chunk = list(Attempt.objects
+                     .filter(id__gt=last_id)
+                     .order_by('id')
+                     .values_list('id', 'source')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        attempts = collections.defaultdict(list)
+        blobs = {}
+        for attempt_id, source in chunk:
+            raw = source.encode()
+            digest = hashlib.sha256(raw).hexdigest()
+            attempts[digest].append(attempt_id)
+            if digest not in blobs:
+                blobs[digest] = SourceBlob(
+                    digest=digest, data=zlib.compress(raw), size=len(raw))
+        existing = set(SourceBlob.objects
+                       .filter(digest__in=list(blobs))
+                       .values_list('digest', flat=True))
+        SourceBlob.objects.bulk_create(
+            blob for digest, blob in blobs.items() if digest not in existing)
+        for digest, attempt_ids in attempts.items():
+            Attempt.objects \
+                .filter(id__in=attempt_ids) \
+                .update(source_blob=digest)
+
+
+def restore_sources(apps, schema_editor):
+    Attempt = apps.get_model('onlinejudge', 'Attempt')
+    SourceBlob = apps.get_model('onlinejudge', 'SourceBlob')
+    for blob in SourceBlob.objects.iterator():
+        Attempt.objects \
+            .filter(source_blob=blob.digest) \
+            .update(source=zlib.decompress(blob.data).decode())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0013_attempt_history_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attempt',
+            name='source_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='onlinejudge.SourceBlob'),
+        ),
+        migrations.RunPython(store_sources, restore_sources),
+        migrations.RemoveField(
+            model_name='attempt',
+            name='source',
+        ),
+    ]
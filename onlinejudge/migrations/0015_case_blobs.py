@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 10:02
+from __future__ import unicode_literals
+
+import hashlib
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# CASE_INLINE_LIMIT when this migration was written; the setting may change
+# later without changing what this migration does.
+INLINE_LIMIT = 64 * 1024
+
+
+def store_cases(apps, schema_editor):
+    Case = apps.get_model('onlinejudge', 'Case')
+    Blob = apps.get_model('onlinejudge', 'Blob')
+
+    def store(text):
+        if len(text) <= INLINE_LIMIT:
+            return text, None
+        raw = text.encode()
+        blob, created = Blob.objects.get_or_create(
+            digest=hashlib.sha256(raw).hexdigest(),
+            defaults={'data': zlib.compress(raw), 'size': len(raw)})
+        return "", blob
+
+    for case in Case.objects.iterator():
+        stdin = case.stdin.replace("\r", "")
+        stdout = case.stdout.replace("\r", "")
+        case.stdout_digest = hashlib.sha256(stdout.strip().encode()).hexdigest()
+        case.stdin, case.stdin_blob = store(stdin)
+        case.stdout, case.stdout_blob = store(stdout)
+        case.save()
+
+
+def restore_cases(apps, schema_editor):
+    Case = apps.get_model('onlinejudge', 'Case')
+    for case in Case.objects.select_related('stdin_blob', 'stdout_blob') \
+            .iterator():
+        if case.stdin_blob:
+            case.stdin = zlib.decompress(case.stdin_blob.data).decode()
+        if case.stdout_blob:
+            case.stdout = zlib.decompress(case.stdout_blob.data).decode()
+        case.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0014_sourceblob'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='SourceBlob',
+            new_name='Blob',
+        ),
+        migrations.AlterField(
+            model_name='case',
+            name='stdin',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='case',
+            name='stdout',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='stdin_blob',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='onlinejudge.Blob'),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='stdout_blob',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='onlinejudge.Blob'),
+        ),
+        migrations.AddField(
+            model_name='case',
+            name='stdout_digest',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(store_cases, restore_cases),
+    ]
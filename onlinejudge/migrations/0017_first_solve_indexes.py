@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 10:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+UNIQUE_INDEX = 'onlinejudge_attempt_one_first_solve'
+
+
+def repair_first_solves(apps, schema_editor):
+    """Keep only the earliest first solve of every user and question."""
+    Attempt = apps.get_model('onlinejudge', 'Attempt')
+    duplicates = Attempt.objects \
+        .filter(first_solve=True) \
+        .values('user', 'question') \
+        .annotate(solves=Count('id'), first=Min('id')) \
+        .filter(solves__gt=1)
+    for duplicate in duplicates:
+        Attempt.objects \
+            .filter(user=duplicate['user'], question=duplicate['question'],
+                    first_solve=True) \
+            .exclude(id=duplicate['first']) \
+            .update(first_solve=False)
+
+
+def add_unique_index(apps, schema_editor):
+    # Partial indexes are only supported by these backends.
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(
+            "CREATE UNIQUE INDEX %s ON onlinejudge_attempt "
+            "(user_id, question_id) WHERE first_solve" % UNIQUE_INDEX)
+
+
+def remove_unique_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute("DROP INDEX %s" % UNIQUE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onlinejudge', '0016_attempt_status_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(repair_first_solves, migrations.RunPython.noop),
+        migrations.RunPython(add_unique_index, remove_unique_index),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['user', 'question', 'status'], name='onlinejudge_user_id_8966b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['first_solve', 'attempt_date'], name='onlinejudge_first_s_77534b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['user', 'first_solve'], name='onlinejudge_user_id_5d2091_idx'),
+        ),
+    ]
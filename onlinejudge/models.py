@@ -1,5 +1,11 @@
+import hashlib
+import zlib
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
 from django.db.models import permalink
 from django.utils import timezone
 
@@ -50,6 +56,19 @@ class Question(models.Model):
     published_date = models.DateTimeField(default=timezone.now)
     difficulty = models.IntegerField(choices=DIFFICULTY_CHOICES)
     template = models.TextField()
+    # Run the cases in parallel shards of this size, stopping at the first
+    # failed shard. Zero runs all cases in a single request.
+    shard_size = models.PositiveIntegerField(
+        default=0,
+        help_text="Judge the cases concurrently in shards of this many "
+        "cases and stop at the first failure. 0 disables sharding.")
+    # Bumped whenever a case is added, changed or deleted.
+    case_version = models.IntegerField(default=0, editable=False)
+
+    # Distinct users who solved and attempted the question, kept up to date
+    # by the Attempt signals. See the `rebuildcounters` command.
+    solve_count = models.PositiveIntegerField(default=0, editable=False)
+    attempt_count = models.PositiveIntegerField(default=0, editable=False)
 
     @property
     def cases(self):
@@ -61,12 +80,11 @@ class Question(models.Model):
 
     @property
     def solves(self):
-        return self.attempt_set.filter(
-            status=1).values("user").distinct().count()
+        return self.solve_count
 
     @property
     def total(self):
-        return self.attempt_set.values("user").distinct().count()
+        return self.attempt_count
 
     @property
     def success_rate(self):
@@ -84,7 +102,9 @@ class Question(models.Model):
 
     # Check whether the question has been answered by a user.
     def is_solved_by(self, user):
-        return bool(self.attempt_set.filter(status=1, user=user))
+        return self.attempt_set \
+            .filter(user=user, status=Attempt.ACCEPTED) \
+            .exists()
 
     def __str__(self):
         return "Title: {}\nSuccess Rate:{}%".format(self.title,
@@ -95,12 +115,124 @@ class Question(models.Model):
         return ('detail', None, {'slug': self.slug})
 
 
+class Blob(models.Model):
+    """
+    Compressed text, stored once however many rows refer to it.
+
+    Holds attempt sources and large test cases. Blobs are keyed by the
+    SHA-256 of the text, so identical resubmissions share a row.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    # Uncompressed size in bytes.
+    size = models.PositiveIntegerField()
+
+    @staticmethod
+    def digest_of(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @classmethod
+    def store(cls, text):
+        """Return the blob holding `text`, creating it if needed."""
+        raw = text.encode()
+        blob, created = cls.objects.get_or_create(
+            digest=cls.digest_of(text),
+            defaults={'data': zlib.compress(raw), 'size': len(raw)})
+        return blob
+
+    @staticmethod
+    def decompress(data):
+        return zlib.decompress(data).decode()
+
+    @property
+    def text(self):
+        return self.decompress(self.data)
+
+    @classmethod
+    def usage(cls):
+        """
+        How much space deduplication and compression save on sources.
+
+        Returns
+        -------
+        usage : dict
+            'attempts', 'blobs', 'raw_bytes' (what the attempts' sources
+            would take inline) and 'stored_bytes' (what the blobs take).
+
+        """
+        attempts = Attempt.objects.filter(source_blob__isnull=False)
+        blobs = cls.objects.filter(digest__in=attempts.values('source_blob'))
+        return {
+            'attempts': attempts.count(),
+            'blobs': blobs.count(),
+            'raw_bytes':
+            attempts.aggregate(size=Sum('source_blob__size'))['size'] or 0,
+            'stored_bytes':
+            blobs.aggregate(size=Sum(Length('data')))['size'] or 0,
+        }
+
+    def __str__(self):
+        return "{} ({} bytes)".format(self.digest[:12], self.size)
+
+
 class Case(models.Model):
+    """
+    A test case.
+
+    Cases longer than CASE_INLINE_LIMIT characters are moved to a Blob on
+    save, leaving `stdin` or `stdout` empty: read them through `input` and
+    `output`. The expected output is only needed in full by the admin, the
+    judge compares digests.
+    """
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    stdin = models.TextField()
-    stdout = models.TextField()
+    stdin = models.TextField(blank=True)
+    stdout = models.TextField(blank=True)
+    stdin_blob = models.ForeignKey(Blob, null=True, editable=False,
+                                   on_delete=models.PROTECT, related_name='+')
+    stdout_blob = models.ForeignKey(Blob, null=True, editable=False,
+                                    on_delete=models.PROTECT, related_name='+')
+    stdout_digest = models.CharField(max_length=64, editable=False)
     sample_case = models.BooleanField(default=False)
 
+    @staticmethod
+    def output_digest(output):
+        """Digest of an output, ignoring surrounding whitespace."""
+        return hashlib.sha256(output.strip().encode()).hexdigest()
+
+    @property
+    def input(self):
+        return self.stdin_blob.text if self.stdin_blob_id else self.stdin
+
+    @property
+    def output(self):
+        return self.stdout_blob.text if self.stdout_blob_id else self.stdout
+
+    def save(self, *args, **kwargs):
+        self.prepare()
+        super(Case, self).save(*args, **kwargs)
+
+    def prepare(self):
+        """
+        Normalize the content and move it to blobs if it is large.
+
+        Called by save(). Call it before bulk_create(), which skips save().
+        """
+        # An empty field next to a blob means the content was moved there.
+        if self.stdin or not self.stdin_blob_id:
+            self.stdin, self.stdin_blob = self._store(self.stdin)
+        if self.stdout or not self.stdout_blob_id:
+            self.stdout_digest = \
+                self.output_digest(self.stdout.replace("\r", ""))
+            self.stdout, self.stdout_blob = self._store(self.stdout)
+
+    @staticmethod
+    def _store(text):
+        # Normalize line endings once instead of on every judge.
+        text = text.replace("\r", "")
+        if len(text) > settings.CASE_INLINE_LIMIT:
+            return "", Blob.store(text)
+        return text, None
+
 
 class Attempt(models.Model):
     WRONG_ANSWER = 0
@@ -109,6 +241,8 @@ class Attempt(models.Model):
     SERVER_ERROR = 3
     TIMED_OUT = 4
     TESTING = 5
+    PENDING = 6
+    JUDGING = 7
     STATUS_CHOICES = (
         (WRONG_ANSWER, 'Wrong Answer'),
         (ACCEPTED, 'Accepted'),
@@ -116,8 +250,12 @@ class Attempt(models.Model):
         (SERVER_ERROR, 'Server Error'),
         (TIMED_OUT, 'Timed Out'),
         (TESTING, 'Accepted (Testing)'),
+        (PENDING, 'Pending'),
+        (JUDGING, 'Judging'),
     )
     _status_dict = dict(STATUS_CHOICES)
+    # Attempts in these states are still waiting for a verdict.
+    PENDING_STATUSES = (PENDING, JUDGING)
 
     # Attempt Information
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -126,13 +264,65 @@ class Attempt(models.Model):
     # Attempt Details
     attempt_date = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.IntegerField(choices=STATUS_CHOICES)
-    source = models.TextField(default="")
+    # Read and written through `source`.
+    source_blob = models.ForeignKey(Blob, null=True,
+                                    on_delete=models.PROTECT)
     first_solve = models.BooleanField(default=False)
+    # Set when a judge worker claims the attempt from the queue.
+    claimed_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # A user's history on a question, newest first.
+            models.Index(fields=['user', 'question', '-id']),
+            # The judge queue and admission control.
+            models.Index(fields=['status']),
+            # Question.is_solved_by.
+            models.Index(fields=['user', 'question', 'status']),
+            # The activity feed.
+            models.Index(fields=['first_solve', 'attempt_date']),
+            # A user's solved questions and points.
+            models.Index(fields=['user', 'first_solve']),
+        ]
+        # Migration 0017 also adds a unique index on (user, question) where
+        # first_solve is set: a question is first solved once per user.
+
+    _source = None
+    _source_changed = False
+
+    @property
+    def source(self):
+        if self._source is None:
+            self._source = \
+                self.source_blob.text if self.source_blob_id else ""
+        return self._source
+
+    @source.setter
+    def source(self, text):
+        self._source = text
+        self._source_changed = True
+
+    def save(self, *args, **kwargs):
+        if self._source_changed:
+            self.source_blob = Blob.store(self._source)
+            self._source_changed = False
+        with transaction.atomic():
+            # The signals update the question's counters: lock it before
+            # writing, so its attempts change one at a time (see counters).
+            list(Question.objects
+                 .select_for_update()
+                 .filter(id=self.question_id)
+                 .values_list('id'))
+            super(Attempt, self).save(*args, **kwargs)
 
     @property
     def status_str(self):
         return self._status_dict[self.status]
 
+    @property
+    def is_pending(self):
+        return self.status in self.PENDING_STATUSES
+
     @classmethod
     def latest_solves(cls, user=None):
         if not user:
@@ -146,3 +336,26 @@ class Attempt(models.Model):
     def __str__(self):
         return "{} -> {} (status: {})".format(self.user.username,
                                               self.question.title, self.status)
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A user's row on the global leaderboard.
+
+    Kept up to date by `onlinejudge.leaderboard` whenever a first solve is
+    recorded. Users are ranked by points, then by earliest last solve.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True)
+    points = models.IntegerField()
+    last_solve = models.DateTimeField()
+    rank = models.PositiveIntegerField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Leaderboard entries"
+        ordering = ['rank']
+        indexes = [models.Index(fields=['-points', 'last_solve'])]
+
+    def __str__(self):
+        return "#{} {} ({} points)".format(self.rank, self.user.username,
+                                           self.points)
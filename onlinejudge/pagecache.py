@@ -0,0 +1,160 @@
+"""
+Caching for the read-heavy public pages.
+
+Anonymous visitors all see the same home, contest, leaderboard and activity
+pages, so `cache_page` stores the rendered response and serves it to every
+anonymous request for the same URL. Signed-in users get their own rendering,
+but the views build its shared parts with `cached`, leaving only the
+per-user fragments (solved marks, own rank) to compute.
+
+Entries belong to groups ('contests', 'questions', 'solves'). The signals in
+`signals.py` bump a group's version whenever a model it depends on is saved
+or deleted, which retires every entry of the group at once. The versions
+are kept in the default cache, which the judge workers share, so entries
+can live in a cache of the host (PAGE_CACHE). A question whose
+publish date is still ahead changes the pages without any save, so entries
+never outlive the next publish date.
+
+Staff bypass the cache: they must always see the current state of
+unpublished questions.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache, caches
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .metrics import PAGE_CACHE, registry
+from .models import Question
+
+# Views wrapped by cache_page, for stats().
+_pages = []
+
+
+def _cache():
+    return caches[settings.PAGE_CACHE]
+
+
+def _versions(groups):
+    return ".".join(str(get_version(shared_cache, 'page-version:%s' % group))
+                    for group in groups)
+
+
+def invalidate(*groups):
+    """Retire every entry depending on `groups`."""
+    for group in groups:
+        bump_version(shared_cache, 'page-version:%s' % group)
+
+
+def _timeout(cache):
+    """Seconds an entry may live: until the next question is published."""
+    key = 'page-next-publish:%s' % _versions(['questions'])
+    now = time.time()
+    next_publish = cache.get(key)
+    if next_publish is None or 0 < next_publish <= now:
+        upcoming = Question.objects \
+            .filter(published_date__gt=timezone.now()) \
+            .order_by('published_date') \
+            .values_list('published_date', flat=True) \
+            .first()
+        next_publish = upcoming.timestamp() if upcoming else 0
+        cache.set(key, next_publish, settings.PAGE_CACHE_TIMEOUT)
+    if not next_publish:
+        return settings.PAGE_CACHE_TIMEOUT
+    return max(min(settings.PAGE_CACHE_TIMEOUT, next_publish - now), 1)
+
+
+def cached(name, groups, build, user=None):
+    """
+    The value `build()` returns, cached until one of `groups` changes.
+
+    Parameters
+    ----------
+    name : string
+        Identifies the value, e.g. "leaderboard:3".
+    groups : list
+        The groups the value depends on.
+    build : callable
+        Computes the value. It must be picklable.
+    user : User
+        The user asking. Staff always get a fresh value.
+
+    """
+    if user is not None and user.is_staff:
+        return build()
+    cache = _cache()
+    key = 'page-data:%s:%s' % (name, _versions(groups))
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, _timeout(cache))
+    return value
+
+
+def cache_page(name, *groups):
+    """
+    Decorator caching a view's response for anonymous GET requests.
+
+    The response carries an X-Page-Cache header (hit, miss or bypass).
+    """
+    _pages.append(name)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') \
+                    or request.user.is_authenticated:
+                response = view(request, *args, **kwargs)
+                response['X-Page-Cache'] = 'bypass'
+                return response
+
+            cache = _cache()
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = 'page:%s:%s:%s' % (name, _versions(groups), path)
+            content = cache.get(key)
+            if content is not None:
+                PAGE_CACHE.inc(page=name, result='hit')
+                response = HttpResponse(content)
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            PAGE_CACHE.inc(page=name, result='miss')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.content, _timeout(cache))
+            response['X-Page-Cache'] = 'miss'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """
+    Hits and misses of every cached page, from the page cache metric.
+
+    Hits are counted by each process rather than in the cache, so they do
+    not write to it. Without METRICS_DIR the counts only cover the current
+    process.
+    """
+    values = registry.collect()
+
+    def count(name, outcome):
+        labels = (('page', name), ('result', outcome))
+        return values.get((PAGE_CACHE.name, labels), 0)
+
+    result = {}
+    for name in _pages:
+        hits, misses = count(name, 'hit'), count(name, 'miss')
+        total = hits + misses
+        result[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+    return result
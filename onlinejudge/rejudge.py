@@ -0,0 +1,175 @@
+"""
+Rejudging of attempts, e.g. after a question's cases were fixed.
+
+`rejudge` runs the attempts through the judger concurrently, a chunk at a
+time, and saves each chunk's verdicts with one UPDATE per verdict. Those
+updates bypass the signals, so the same transaction recomputes the first
+solves of the users and questions of the chunk, and once every chunk is
+done the counters, the leaderboard and the caches are rebuilt.
+
+After each chunk the id of its last attempt is written to a checkpoint
+file. An interrupted run started again with the same checkpoint skips the
+attempts already rejudged.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.db.models import Min
+
+from . import counters, feed, leaderboard, pagecache, scoreboard, solved
+from .judger import judge, load_cases
+from .models import Attempt
+
+
+class CheckpointMismatch(ValueError):
+    """The checkpoint belongs to a run over other attempts."""
+
+
+def _load_checkpoint(path, scope):
+    if not path or not os.path.exists(path):
+        return {'scope': scope, 'last_id': 0, 'done': 0, 'changed': 0}
+    with open(path) as f:
+        state = json.load(f)
+    if state['scope'] != scope:
+        raise CheckpointMismatch(
+            "%s is the checkpoint of a rejudge of %s." % (path,
+                                                          state['scope']))
+    return state
+
+
+def _save_checkpoint(path, state):
+    if not path:
+        return
+    temporary = path + ".tmp"
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+
+def rejudge(attempts, scope, workers=8, chunk_size=100, checkpoint=None,
+            progress=None):
+    """
+    Judge `attempts` again and save the new verdicts.
+
+    Parameters
+    ----------
+    attempts : QuerySet
+        The attempts to rejudge. Attempts still waiting for a verdict are
+        left to the judge workers.
+    scope : string
+        Describes `attempts`, a checkpoint is only resumed for the same.
+    workers : int
+        Attempts judged concurrently.
+    chunk_size : int
+        Attempts saved together.
+    checkpoint : string
+        Path of the checkpoint file, removed once the run completes.
+    progress : callable
+        Called as progress(done, total, attempts_per_second) after every
+        chunk.
+    Returns
+    -------
+    summary : dict
+        The number of attempts rejudged and whose verdict changed, and the
+        rate of this run in attempts per second.
+
+    Judger errors are raised; the chunk being judged is not saved.
+    """
+    attempts = attempts.exclude(status__in=Attempt.PENDING_STATUSES)
+    state = _load_checkpoint(checkpoint, scope)
+    total = attempts.count()
+    question_ids = set(attempts.values_list('question', flat=True)
+                       .distinct())
+    cases = {}
+    start = time.perf_counter()
+    rejudged = 0
+
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            chunk = list(attempts
+                         .filter(id__gt=state['last_id'])
+                         .select_related('question', 'source_blob')
+                         .order_by('id')[:chunk_size])
+            if not chunk:
+                break
+            for attempt in chunk:
+                if attempt.question_id not in cases:
+                    cases[attempt.question_id] = load_cases(attempt.question)
+            results = executor.map(
+                lambda attempt: judge(attempt.source, attempt.question,
+                                      cases[attempt.question_id]),
+                chunk)
+            changed = {}
+            for attempt, result in zip(chunk, results):
+                status = result['verdict']
+                if status == Attempt.ACCEPTED \
+                        and not attempt.question.is_published:
+                    status = Attempt.TESTING
+                if status != attempt.status:
+                    changed.setdefault(status, []).append(attempt.id)
+            with transaction.atomic():
+                for status, ids in changed.items():
+                    Attempt.objects.filter(id__in=ids).update(status=status)
+                if changed:
+                    # An interrupted run leaves no stale first solve.
+                    _set_first_solves(Attempt.objects.filter(
+                        user__in={attempt.user_id for attempt in chunk},
+                        question__in={attempt.question_id
+                                      for attempt in chunk}))
+            rejudged += len(chunk)
+            state['last_id'] = chunk[-1].id
+            state['done'] += len(chunk)
+            state['changed'] += sum(len(ids) for ids in changed.values())
+            _save_checkpoint(checkpoint, state)
+            if progress is not None:
+                progress(state['done'], total,
+                         rejudged / (time.perf_counter() - start))
+
+    recompute_first_solves(question_ids)
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    seconds = time.perf_counter() - start
+    return {
+        'attempts': state['done'],
+        'changed': state['changed'],
+        'seconds': seconds,
+        'attempts_per_second': rejudged / seconds if seconds else 0.0,
+    }
+
+
+def recompute_first_solves(question_ids):
+    """
+    Make the earliest accepted attempt of every user the first solve of
+    each question in `question_ids`, then rebuild what depends on it.
+    """
+    attempts = Attempt.objects.filter(question__in=question_ids)
+    _set_first_solves(attempts)
+
+    counters.recount(fix=True)
+    leaderboard.rebuild(fix=True)
+    scoreboard.invalidate()
+    for user_id in attempts.values_list('user', flat=True).distinct():
+        solved.invalidate_user(user_id)
+    feed.invalidate()
+    pagecache.invalidate('solves')
+
+
+def _set_first_solves(attempts):
+    """Recompute the first solves of every user and question in `attempts`."""
+    first_ids = attempts \
+        .filter(status=Attempt.ACCEPTED) \
+        .values('user', 'question') \
+        .annotate(first=Min('id')) \
+        .values('first')
+    with transaction.atomic():
+        # Clear before setting, so no pair ever has two first solves.
+        attempts \
+            .filter(first_solve=True) \
+            .exclude(id__in=first_ids) \
+            .update(first_solve=False)
+        attempts \
+            .filter(id__in=first_ids, first_solve=False) \
+            .update(first_solve=True)
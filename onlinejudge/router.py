@@ -0,0 +1,275 @@
+"""
+Routing of judger requests over several judger backends.
+
+JudgerRouter is the 'http' judge backend (see `backends`). JUDGER_URLS
+lists the judger endpoints it routes to, called backends below. Every
+request goes to the available backend with the fewest requests in flight.
+A backend becomes unavailable when:
+
+- the health probe cannot reach it (see `JudgerRouter.start_probing`), or
+- its circuit breaker is open: after JUDGER_BREAKER_THRESHOLD consecutive
+  failures it gets no requests for JUDGER_BREAKER_RESET seconds, then a
+  single trial request decides whether it is closed again.
+
+Requests that could not connect are retried on another backend.
+
+The judge workers probe the backends and publish the result, along with
+every backend's latency and error counts, in the default cache. The
+`judgerstatus` command prints them and `judger_available` reads them, so
+the web processes can turn submissions away at once when no backend is up.
+Give the web processes and the workers a shared cache for this to work
+across processes.
+"""
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from .backends import HEALTH_KEY, FallbackBackend, JudgeBackend
+from .client import JudgerClient
+from .localjudger import LocalJudger
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailable(requests.ConnectionError):
+    """Every judger backend is down or has its circuit open."""
+
+
+class Backend:
+    """A judger endpoint and its health."""
+
+    def __init__(self, client):
+        self.client = client
+        self.url = client.url
+        self.in_flight = 0
+        # Whether the last probe reached the backend.
+        self.healthy = True
+        # Consecutive failed requests.
+        self.failures = 0
+        # When the circuit opened, None while it is closed.
+        self.opened_at = None
+
+    def circuit(self, now, reset_timeout):
+        if self.opened_at is None:
+            return 'closed'
+        if now - self.opened_at < reset_timeout:
+            return 'open'
+        return 'half-open'
+
+
+class JudgerRouter(JudgeBackend):
+    """
+    Least-loaded dispatch over several judger backends.
+
+    Parameters
+    ----------
+    urls : list
+        Base URLs of the judger backends.
+    failure_threshold : int
+        Consecutive failures opening a backend's circuit.
+    reset_timeout : float
+        Seconds an open circuit waits before a trial request.
+    probe_timeout : float
+        Seconds a health probe waits for the backend.
+    client_options
+        Passed on to every backend's JudgerClient.
+
+    """
+
+    def __init__(self, urls, failure_threshold=3, reset_timeout=30,
+                 probe_timeout=2, **client_options):
+        self.backends = [Backend(JudgerClient(url, **client_options))
+                         for url in urls]
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+
+    def _acquire(self, exclude=()):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                backend for backend in self.backends
+                if backend.healthy and backend not in exclude
+                and backend.circuit(now, self.reset_timeout) != 'open'
+            ]
+            if not candidates:
+                raise NoBackendAvailable("No judger backend is available.")
+            backend = min(candidates, key=lambda backend: backend.in_flight)
+            if backend.opened_at is not None:
+                # Half-open: this is the trial request, hold back others.
+                backend.opened_at = now
+            backend.in_flight += 1
+            return backend
+
+    def _release(self, backend, ok):
+        with self._lock:
+            backend.in_flight -= 1
+            if ok:
+                backend.failures = 0
+                backend.opened_at = None
+                return
+            backend.failures += 1
+            if backend.failures >= self.failure_threshold:
+                if backend.opened_at is None:
+                    logger.warning("Opening the circuit of judger %s",
+                                   backend.url)
+                backend.opened_at = time.monotonic()
+
+    def _call(self, method, *args):
+        tried = []
+        while True:
+            backend = self._acquire(exclude=tried)
+            ok = False
+            try:
+                result = getattr(backend.client, method)(*args)
+                ok = True
+                return result
+            except requests.HTTPError as e:
+                # The backend works, the request does not.
+                ok = e.response.status_code < 500
+                raise
+            except requests.ConnectionError:
+                # Nothing was judged, another backend may do it.
+                tried.append(backend)
+                if len(tried) == len(self.backends):
+                    raise
+            finally:
+                self._release(backend, ok)
+
+    def run(self, source, stdin, timeout):
+        """See JudgerClient.run."""
+        return self._call('run', source, stdin, timeout)
+
+    def run_batch(self, runs):
+        """See JudgerClient.run_batch."""
+        return self._call('run_batch', runs)
+
+    @property
+    def available(self):
+        """Whether any backend can take a request."""
+        now = time.monotonic()
+        return any(backend.healthy
+                   and backend.circuit(now, self.reset_timeout) != 'open'
+                   for backend in self.backends)
+
+    def check(self):
+        """Check every backend with an empty run."""
+        for backend in self.backends:
+            try:
+                response = backend.client.session.post(
+                    backend.url + "python3",
+                    json={'source': "", 'stdin': [], 'timeout': 1000},
+                    timeout=self.probe_timeout)
+                healthy = response.status_code < 500
+            except requests.RequestException:
+                healthy = False
+            with self._lock:
+                if healthy != backend.healthy:
+                    logger.warning("Judger %s is %s", backend.url,
+                                   "up" if healthy else "down")
+                backend.healthy = healthy
+
+    def stats(self):
+        """Health, load, latency and error counts of every backend."""
+        now = time.monotonic()
+        with self._lock:
+            states = [(backend, backend.healthy, backend.in_flight,
+                       backend.circuit(now, self.reset_timeout))
+                      for backend in self.backends]
+        return [
+            dict(backend.client.stats(), url=backend.url, healthy=healthy,
+                 in_flight=in_flight, circuit=circuit)
+            for backend, healthy, in_flight, circuit in states
+        ]
+
+    def close(self):
+        for backend in self.backends:
+            backend.client.close()
+
+
+def judger_available():
+    """
+    Whether the judge workers last saw a healthy backend.
+
+    True when no worker reported yet, so submissions are accepted until a
+    probe says otherwise.
+    """
+    return cache.get(HEALTH_KEY, True)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def _http_backend():
+    return JudgerRouter(
+        settings.JUDGER_URLS,
+        failure_threshold=settings.JUDGER_BREAKER_THRESHOLD,
+        reset_timeout=settings.JUDGER_BREAKER_RESET,
+        probe_timeout=settings.JUDGER_PROBE_TIMEOUT,
+        pool_size=settings.JUDGER_POOL_SIZE,
+        connect_timeout=settings.JUDGER_CONNECT_TIMEOUT,
+        read_timeout=settings.JUDGER_READ_TIMEOUT,
+        retries=settings.JUDGER_RETRIES,
+        backoff=settings.JUDGER_BACKOFF,
+        compress=settings.JUDGER_GZIP)
+
+
+def _local_backend():
+    return LocalJudger(
+        workers=settings.LOCAL_JUDGER_WORKERS,
+        memory_limit=settings.LOCAL_JUDGER_MEMORY_LIMIT,
+        output_limit=settings.LOCAL_JUDGER_OUTPUT_LIMIT,
+        read_timeout=settings.JUDGER_READ_TIMEOUT)
+
+
+BACKENDS = {
+    'http': _http_backend,
+    'local': _local_backend,
+}
+
+
+def create_backend(name, fallback=""):
+    """
+    The judge backend called `name` in BACKENDS, falling back to the one
+    called `fallback` if given.
+    """
+    for backend in filter(None, (name, fallback)):
+        if backend not in BACKENDS:
+            raise ImproperlyConfigured(
+                "Unknown judge backend %r, expected one of %s." % (
+                    backend, ", ".join(sorted(BACKENDS))))
+    if fallback:
+        return FallbackBackend(BACKENDS[name](), BACKENDS[fallback]())
+    return BACKENDS[name]()
+
+
+def get_client():
+    """
+    Return the process-wide judge backend, creating the one JUDGE_BACKEND
+    selects on first use.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = create_backend(settings.JUDGE_BACKEND,
+                                     settings.JUDGE_FALLBACK)
+        return _router
+
+
+def set_client(client):
+    """
+    Replace the process-wide judge backend, e.g. with a router to a stub.
+
+    Returns the previous one, which may be None if it was never created.
+    """
+    global _router
+    with _router_lock:
+        previous, _router = _router, client
+        return previous
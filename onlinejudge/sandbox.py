@@ -0,0 +1,205 @@
+"""
+Runs Python 3 submissions for the local judge backend.
+
+`run` is called in the processes of `localjudger.LocalJudger`'s pool, which
+already have an interpreter up. Every case is run in a process forked from
+it, so no case pays for starting an interpreter, and no case can change
+what the next one sees. Before running the submission the forked process
+limits itself with setrlimit:
+
+- CPU time to the run's timeout, rounded up to a second (the wall clock
+  is bounded by the parent),
+- address space to `memory_limit` bytes,
+- written files to 0 bytes, and child processes to none,
+
+and the parent stops reading after `output_limit` bytes of output.
+
+These limits keep a submission from starving the machine; they do not
+isolate it. It can still read files and use the network, so only run
+untrusted code with this backend inside a container or a VM.
+
+Nothing from Django is imported here, the pool processes do not need it.
+"""
+import builtins
+import math
+import os
+import resource
+import select
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+
+def run(source, stdin, timeout, memory_limit, output_limit):
+    """
+    Run `source` once for every input in `stdin`, like the judger does.
+
+    Parameters
+    ----------
+    source : string
+        A Python 3 program.
+    stdin : list
+        The input of every case.
+    timeout : int
+        Milliseconds each case may take.
+    memory_limit : int
+        Bytes of address space each case may use.
+    output_limit : int
+        Bytes each case may print.
+    Returns
+    -------
+    response : dict
+        The 'stdout' of the cases, joined as "1.in\\n<output>2.in\\n...",
+        and the 'status' of the first case that did not exit normally, or
+        'OK'. Cases after one that timed out are not run.
+
+    """
+    outputs, status = [], 'OK'
+    for stdin_ in stdin:
+        output, case_status = run_case(source, stdin_, timeout, memory_limit,
+                                       output_limit)
+        if not output.endswith("\n"):
+            # Keep the next case marker on a line of its own.
+            output += "\n"
+        outputs.append(output)
+        if status == 'OK':
+            status = case_status
+        if case_status == 'Timed Out':
+            break
+    stdout = "".join("%d.in\n%s" % (i, output)
+                     for i, output in enumerate(outputs, 1))
+    return {'stdout': stdout, 'status': status}
+
+
+def run_case(source, stdin, timeout, memory_limit, output_limit):
+    """
+    Run `source` on a single input in a limited child process.
+
+    Returns
+    -------
+    (output, status) : (string, string)
+        What the case printed and how it ended.
+
+    """
+    with tempfile.TemporaryFile() as stdin_file:
+        stdin_file.write(stdin.encode())
+        stdin_file.seek(0)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _child(source, stdin_file.fileno(), write_fd,
+                   max(math.ceil(timeout / 1000), 1), memory_limit)
+        os.close(write_fd)
+    deadline = time.monotonic() + timeout / 1000
+    output, timed_out, too_long = _read(read_fd, deadline, output_limit)
+    if timed_out or too_long:
+        os.kill(pid, signal.SIGKILL)
+    status = _wait(pid, deadline)
+    if status is None:
+        timed_out = True
+    output = output.decode(errors='replace')
+    if too_long:
+        return output, 'Runtime Error'
+    if timed_out or status in (-signal.SIGXCPU, -signal.SIGKILL):
+        return output, 'Timed Out'
+    if status != 0:
+        return output, 'Runtime Error'
+    return output, 'OK'
+
+
+def _read(fd, deadline, limit):
+    chunks, size = [], 0
+    timed_out = too_long = False
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                too_long = True
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b"".join(chunks), timed_out, too_long
+
+
+def _wait(pid, deadline):
+    """
+    The exit code of `pid`, or minus the signal that ended it. None if it
+    had to be killed at the deadline.
+    """
+    while True:
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            break
+        if time.monotonic() >= deadline:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            return None
+        time.sleep(0.001)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _close_fds():
+    """Close every file descriptor but stdin, stdout and stderr."""
+    try:
+        fds = [int(fd) for fd in os.listdir('/proc/self/fd')]
+    except OSError:
+        # No /proc: try every descriptor the process may have open.
+        os.closerange(3, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+        return
+    for fd in fds:
+        if fd > 2:
+            try:
+                os.close(fd)
+            except OSError:
+                # The descriptor listdir used, already closed.
+                pass
+
+
+def _child(source, stdin_fd, stdout_fd, cpu_seconds, memory_limit):
+    """Run `source` in the forked process. Never returns."""
+    code = 1
+    try:
+        os.dup2(stdin_fd, 0)
+        os.dup2(stdout_fd, 1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 2)
+        _close_fds()
+        os.chdir(tempfile.gettempdir())
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        sys.stdin = open(0, closefd=False)
+        sys.stdout = open(1, 'w', closefd=False)
+        sys.stderr = open(2, 'w', closefd=False)
+        sys.argv = ["<submission>"]
+        try:
+            exec(compile(source, "<submission>", 'exec'),
+                 {'__name__': '__main__', '__builtins__': builtins})
+            code = 0
+        except SystemExit as e:
+            code = 0 if e.code in (None, 0) else 1
+        except BaseException:
+            traceback.print_exc()
+        sys.stdout.flush()
+    except BaseException:
+        code = 1
+    finally:
+        os._exit(code)
@@ -0,0 +1,152 @@
+"""
+Live scoreboard of a contest.
+
+A contest's standings are computed with one aggregate query over the first
+solves of its questions: points are the sum of the questions' difficulty,
+ties go to the earliest last solve. They are cached in the default cache
+under a per-contest version, which the signals bump whenever a first solve
+of one of the contest's questions changes, and memoized per process.
+
+Browsers poll `changes` with the version they have every few seconds (see
+SCOREBOARD_POLL_INTERVAL). While the version does not move a poll only
+reads the cache; otherwise it gets the rows that changed, diffed against
+the standings of its version while those are still cached.
+"""
+import re
+import threading
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from .cache import bump_version, get_version
+from .models import Attempt, Question
+
+VERSION = re.compile(r'\d+\.\d+')
+
+_lock = threading.Lock()
+# {contest id: (version, rows)}
+_standings = {}
+
+
+def _version(contest_id):
+    return "%d.%d" % (get_version(cache, 'scoreboard-version'),
+                      get_version(cache, 'scoreboard-version:%d' % contest_id))
+
+
+def _key(contest_id, version):
+    return 'scoreboard:%d:%s' % (contest_id, version)
+
+
+def invalidate(contest_id=None):
+    """Retire the standings of a contest, or of every contest if None."""
+    if contest_id is None:
+        bump_version(cache, 'scoreboard-version')
+    else:
+        bump_version(cache, 'scoreboard-version:%d' % contest_id)
+
+
+def invalidate_question(question_id):
+    """Retire the standings of the contest `question_id` belongs to."""
+    contests = list(Question.objects
+                    .filter(id=question_id)
+                    .values_list('contest', flat=True)[:1])
+    if not contests:
+        # Already deleted along with its contest.
+        invalidate()
+    elif contests[0] is not None:
+        invalidate(contests[0])
+
+
+def compute(contest_id):
+    """
+    The standings of a contest, from the database.
+
+    Returns
+    -------
+    rows : list
+        A dict per user with a first solve in the contest, in rank order:
+        user (id), username, rank, points, solved (questions) and
+        last_solve (ISO 8601).
+
+    """
+    rows = Attempt.objects \
+        .filter(first_solve=True, question__contest=contest_id) \
+        .values('user', 'user__username') \
+        .annotate(points=Sum('question__difficulty'),
+                  solved=Count('id'),
+                  last_solve=Max('attempt_date')) \
+        .order_by('-points', 'last_solve', 'user')
+    return [
+        {'user': row['user'], 'username': row['user__username'],
+         'rank': rank, 'points': row['points'], 'solved': row['solved'],
+         'last_solve': row['last_solve'].isoformat()}
+        for rank, row in enumerate(rows, 1)
+    ]
+
+
+def standings(contest_id):
+    """
+    The current standings of a contest.
+
+    Returns
+    -------
+    (version, rows) : (string, list)
+        The version of the standings and their rows, see `compute`.
+
+    """
+    version = _version(contest_id)
+    with _lock:
+        memo = _standings.get(contest_id)
+    if memo is not None and memo[0] == version:
+        return memo
+    key = _key(contest_id, version)
+    rows = cache.get(key)
+    if rows is None:
+        rows = compute(contest_id)
+        cache.set(key, rows)
+    with _lock:
+        _standings[contest_id] = (version, rows)
+    return version, rows
+
+
+def diff(old, new):
+    """
+    The changes from the standings `old` to `new`.
+
+    Returns
+    -------
+    changes : dict
+        changed: the rows of `new` that are not in `old` as they are,
+        removed: the ids of the users no longer ranked.
+
+    """
+    before = {row['user']: row for row in old}
+    ranked = {row['user'] for row in new}
+    return {
+        'changed': [row for row in new if before.get(row['user']) != row],
+        'removed': [user for user in before if user not in ranked],
+    }
+
+
+def changes(contest_id, since=None):
+    """
+    What changed in a contest's standings since the version `since`.
+
+    Returns
+    -------
+    changes : dict
+        version: the current version. Then either changed and removed (see
+        `diff`) or, when the standings at `since` are no longer cached or
+        `since` is not a version, standings: every row.
+
+    """
+    version = _version(contest_id)
+    if since == version:
+        return {'version': version, 'changed': [], 'removed': []}
+    version, rows = standings(contest_id)
+    old = None
+    if since and VERSION.fullmatch(since):
+        old = cache.get(_key(contest_id, since))
+    if old is None:
+        return {'version': version, 'standings': rows}
+    return dict(diff(old, rows), version=version)
@@ -0,0 +1,119 @@
+"""
+Keeps the counters, the leaderboard and the caches in step with the models.
+
+Counters and the leaderboard are updated in the transaction of the change.
+Cached data is only invalidated once the change is committed: a page or
+standings rebuilt from the old rows in between would otherwise be cached
+under the new version.
+"""
+import functools
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed, leaderboard, pagecache, scoreboard, solved
+from .cache import verdict_cache
+from .models import Attempt, Case, Category, Contest, Question
+
+
+@receiver([post_save, post_delete], sender=Case)
+def bump_case_version(sender, instance, **kwargs):
+    """Any change to a question's cases invalidates its cached verdicts."""
+    Question.objects \
+        .filter(id=instance.question_id) \
+        .update(case_version=F('case_version') + 1)
+    verdict_cache.invalidate(instance.question_id)
+
+
+@receiver(pre_save, sender=Attempt)
+def remember_stored_attempt(sender, instance, **kwargs):
+    # What the attempt looked like before this save, None if it is new.
+    instance._stored = instance.id and Attempt.objects \
+        .filter(id=instance.id) \
+        .values('status', 'first_solve') \
+        .first()
+
+
+@receiver(post_save, sender=Attempt)
+def attempt_saved(sender, instance, created, **kwargs):
+    counters.record_attempt(instance, created, instance._stored)
+    stored = instance._stored
+    was_accepted = bool(stored) and stored['status'] == Attempt.ACCEPTED
+    if (instance.status == Attempt.ACCEPTED) != was_accepted \
+            or instance.first_solve != bool(stored and stored['first_solve']):
+        # Solve counts, the leaderboard or the feed changed.
+        transaction.on_commit(lambda: pagecache.invalidate('solves'))
+    if instance.first_solve != bool(stored and stored['first_solve']):
+        leaderboard.update_user(instance.user_id)
+        transaction.on_commit(functools.partial(
+            _first_solve_changed, instance, instance.first_solve))
+
+
+def _first_solve_changed(attempt, first_solve):
+    scoreboard.invalidate_question(attempt.question_id)
+    solved.invalidate_user(attempt.user_id)
+    if first_solve:
+        feed.record_solve(attempt)
+    else:
+        feed.invalidate()
+
+
+@receiver(post_delete, sender=Attempt)
+def attempt_deleted(sender, instance, **kwargs):
+    counters.forget_attempt(instance)
+    if instance.status == Attempt.ACCEPTED or instance.first_solve:
+        transaction.on_commit(lambda: pagecache.invalidate('solves'))
+    if instance.first_solve:
+        leaderboard.update_user(instance.user_id)
+        transaction.on_commit(functools.partial(
+            _first_solve_changed, instance, False))
+
+
+@receiver(pre_save, sender=Question)
+def remember_stored_question(sender, instance, **kwargs):
+    instance._stored = instance.id and Question.objects \
+        .filter(id=instance.id) \
+        .values('difficulty', 'contest') \
+        .first()
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    transaction.on_commit(_questions_changed)
+    stored = instance._stored
+    if not stored:
+        return
+    if instance.difficulty != stored['difficulty']:
+        # The question is worth a different number of points now.
+        solvers = Attempt.objects \
+            .filter(question=instance, first_solve=True) \
+            .values_list('user', flat=True)
+        for user_id in solvers:
+            leaderboard.update_user(user_id)
+    if instance.difficulty != stored['difficulty'] \
+            or instance.contest_id != stored['contest']:
+        for contest_id in {instance.contest_id, stored['contest']} - {None}:
+            transaction.on_commit(
+                functools.partial(scoreboard.invalidate, contest_id))
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    transaction.on_commit(_questions_changed)
+
+
+def _questions_changed():
+    solved.invalidate_contests()
+    pagecache.invalidate('questions')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: pagecache.invalidate('questions'))
+
+
+@receiver([post_save, post_delete], sender=Contest)
+def contest_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: pagecache.invalidate('contests'))
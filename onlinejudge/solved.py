@@ -0,0 +1,128 @@
+"""
+Per-user cache of solved questions.
+
+The `is_solved`, `completed` and `progress` filters run once per question or
+contest on every page view. They answer from a SolvedSet, a sorted array of
+the ids of the questions a user solved, kept in the SOLVED_CACHE cache.
+
+Entries are versioned: recording a first solve bumps the user's version, so
+every process sees the new set on its next lookup without having to delete
+entries from other processes' caches. The web processes and the judge
+workers must therefore share SOLVED_CACHE in production.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache import bump_version, get_version
+from .models import Attempt, Question
+
+
+class SolvedSet:
+    """An immutable set of question ids, stored as a sorted int array."""
+
+    def __init__(self, question_ids=()):
+        self.ids = array('l', sorted(question_ids))
+
+    @classmethod
+    def frombytes(cls, data):
+        solved = cls()
+        solved.ids.frombytes(data)
+        return solved
+
+    def tobytes(self):
+        return self.ids.tobytes()
+
+    def __contains__(self, question_id):
+        i = bisect_left(self.ids, question_id)
+        return i < len(self.ids) and self.ids[i] == question_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self, question_ids):
+        """How many of `question_ids` are in the set."""
+        return sum(1 for question_id in question_ids if question_id in self)
+
+
+def _cache():
+    return caches[settings.SOLVED_CACHE]
+
+
+def solved_set(user):
+    """
+    The questions `user` solved.
+
+    The set is memoized on the user object, so it is looked up at most once
+    per request.
+    """
+    if not user.is_authenticated:
+        return SolvedSet()
+    solved = getattr(user, '_solved_set', None)
+    if solved is not None:
+        return solved
+
+    cache = _cache()
+    version = get_version(cache, 'solved-version:%d' % user.id)
+    key = 'solved:%d:%d' % (user.id, version)
+    data = cache.get(key)
+    if data is None:
+        solved = SolvedSet(Attempt.objects
+                           .filter(user=user, first_solve=True)
+                           .values_list('question', flat=True))
+        cache.set(key, solved.tobytes())
+    else:
+        solved = SolvedSet.frombytes(data)
+    user._solved_set = solved
+    return solved
+
+
+def _contest_key(cache, contest_id):
+    return 'contest-questions:%d:%d' % (
+        contest_id, get_version(cache, 'contest-questions-version'))
+
+
+def contest_questions(contest):
+    """The ids of every question in `contest`."""
+    cache = _cache()
+    key = _contest_key(cache, contest.id)
+    question_ids = cache.get(key)
+    if question_ids is None:
+        question_ids = list(Question.objects
+                            .filter(contest=contest)
+                            .values_list('id', flat=True))
+        cache.set(key, question_ids)
+    return question_ids
+
+
+def load_contest_questions(contests):
+    """
+    Cache the question ids of every contest in `contests` in one query.
+
+    Call before `contest_questions` runs for each of many contests, e.g.
+    from the `progress` filter on the home page.
+    """
+    cache = _cache()
+    keys = {_contest_key(cache, contest.id): contest.id
+            for contest in contests}
+    missing = set(keys) - set(cache.get_many(list(keys)))
+    if not missing:
+        return
+    question_ids = {keys[key]: [] for key in missing}
+    for contest_id, question_id in Question.objects \
+            .filter(contest__in=question_ids) \
+            .values_list('contest', 'id'):
+        question_ids[contest_id].append(question_id)
+    cache.set_many({key: question_ids[keys[key]] for key in missing})
+
+
+def invalidate_user(user_id):
+    """Call when a user's first solves change."""
+    bump_version(_cache(), 'solved-version:%d' % user_id)
+
+
+def invalidate_contests():
+    """Call when questions are added, moved or deleted."""
+    bump_version(_cache(), 'contest-questions-version')
@@ -0,0 +1,165 @@
+"""
+A local stand-in for the judger service.
+
+StubJudger speaks the judger's `/python3` protocol over real HTTP, so the
+judger client, the workers and the benchmarks can run without the remote
+service. It does not execute the submitted source: `run` decides what every
+case prints. By default each case echoes its input.
+
+Pass batch=True to also serve `/python3/batch`, which takes
+{"batch": [run, ...]} and replies {"results": [response, ...]}, and
+latency=seconds to delay every reply like a busy judger would. The
+`stubjudger` management command serves one on a fixed port.
+"""
+import gzip
+import json
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+def echo(source, stdin):
+    """Default program: every case prints its own input."""
+    return list(stdin), 'OK'
+
+
+def fixed_output(size):
+    """
+    Program printing `size` bytes for every case, whatever its input.
+
+    Used to measure how the site copes with large outputs; the verdicts
+    are wrong answers unless the cases expect exactly that.
+    """
+    line = "x" * 79 + "\n"
+    output = (line * (size // len(line) + 1))[:size]
+
+    def run(source, stdin):
+        return [output] * len(stdin), 'OK'
+
+    return run
+
+
+def format_stdout(outputs):
+    """
+    Join case outputs the way the judger does.
+
+    Example
+    -------
+    Input:
+        ["Hello\\n", "World\\n"]
+    Output:
+        "1.in\\nHello\\n2.in\\nWorld\\n"
+
+    """
+    return "".join("%d.in\n%s" % (i, output)
+                   for i, output in enumerate(outputs, 1))
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on a slow reply (timeouts) are expected.
+        if not issubclass(sys.exc_info()[0], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real judger behind its reverse proxy.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return json.loads(body.decode())
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests.append(self.path)
+        data = self.read_json()
+        if stub.latency:
+            time.sleep(stub.latency)
+        if self.path == '/python3':
+            self.send_json(stub.execute(data))
+        elif self.path == '/python3/batch' and stub.batch:
+            runs = data['batch']
+            self.send_json({'results': [stub.execute(run) for run in runs]})
+        else:
+            self.send_json({'error': "Not found"}, status=404)
+
+
+class StubJudger:
+    """
+    Serve the judger protocol on a local port in a background thread.
+
+    Parameters
+    ----------
+    run : callable
+        Called as run(source, stdin) for every submission. Returns the list
+        of case outputs and the judger status ('OK', 'Runtime Error', ...).
+    batch : bool
+        Whether to serve the batch endpoint.
+    latency : float
+        Seconds to wait before every reply.
+
+    Example
+    -------
+        with StubJudger() as stub:
+            JudgerClient(stub.url).run("print(input())", ["1\\n"], 2000)
+
+    """
+
+    def __init__(self, run=echo, batch=False, latency=0, host='127.0.0.1',
+                 port=0):
+        self.run = run
+        self.batch = batch
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = []
+        self.server = _Server((host, port), _Handler)
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d/" % (host, port)
+
+    def execute(self, data):
+        outputs, status = self.run(data['source'], data['stdin'])
+        return {'stdout': format_stdout(outputs), 'status': status}
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+            daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -3,12 +3,14 @@ import math
 from django import template
 from django.utils import timezone
 
+from ..solved import contest_questions, solved_set
+
 register = template.Library()
 
 
 @register.filter(name='is_solved')
 def is_solved(question, user):
-    return question.is_solved_by(user)
+    return question.id in solved_set(user)
 
 
 @register.filter(name='latest_questions')
@@ -20,19 +22,17 @@ def latest_questions(category, contest):
 
 @register.filter(name='completed')
 def completed(contest, user):
-    questions = contest.question_set.count()
-    solves = contest.question_set.filter(
-        attempt__first_solve=True, attempt__user=user).count()
-    return questions == solves
+    question_ids = contest_questions(contest)
+    return solved_set(user).count(question_ids) == len(question_ids)
 
 
 @register.filter(name='progress')
 def progress(contest, user):
-    questions = contest.question_set.count()
+    question_ids = contest_questions(contest)
+    questions = len(question_ids)
     max_stars = math.ceil(questions / 5)
     if not user.is_authenticated:
         return [False] * max_stars
-    solves = contest.question_set.filter(
-        attempt__first_solve=True, attempt__user=user).count()
+    solves = solved_set(user).count(question_ids)
     green = int((solves / questions) * max_stars)
     return [True] * green + [False] * (max_stars - green)
@@ -1,12 +1,72 @@
-from django.test import TestCase, RequestFactory
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (IntegrityError, OperationalError, connection,
+                       transaction)
+from django.db.models import Count
+from django.test import (TestCase, TransactionTestCase, RequestFactory,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import AnonymousUser, User
+from django.utils import timezone
 
-from .models import Attempt, Question, Contest, Category
+from .models import (Attempt, Question, Contest, Category, Case,
+                     LeaderboardEntry, Blob)
 
 from . import views
+from . import benchmarks
+from . import dataset
 from . import judger
+from . import caseimport
+from . import counters
+from . import feed
+from . import instrumentation
+from . import leaderboard
+from . import loaders
+from . import metrics
+from . import pagecache
+from . import rejudge
+from . import scoreboard
+from . import worker
+from .admin import CaseForm
+from .backends import FallbackBackend, JudgeBackend
+from .cache import (VerdictCache, bump_version, check_shared_caches,
+                    get_version, normalize_source, verdict_cache)
+from .client import JudgerClient
+from .localjudger import LocalJudger
+from .router import (JudgerRouter, NoBackendAvailable, create_backend,
+                     get_client, judger_available, set_client)
+from .solved import SolvedSet, solved_set
+from .stubjudger import StubJudger, fixed_output
 from .templatetags import app_filters
 
+# TestCase never commits: run what the signals leave for the commit at once.
+run_on_commit = mock.patch('django.db.transaction.on_commit',
+                           lambda func, using=None: func())
+
+
+def setUpModule():
+    run_on_commit.start()
+
+
+def tearDownModule():
+    run_on_commit.stop()
+
 
 class JudgerTestCase(TestCase):
     def test_parse_response(self):
@@ -21,10 +81,23 @@ class JudgerTestCase(TestCase):
             judger.parse_stdout(output),
             ["Hello\nWorld", "World\n2.in\nWorld"])
 
+        # Parse empty cases and markers that are not whole lines.
+        output = "1.in\n2.in\n12.in\n3.in x\n3.in\n"
+        self.assertEqual(
+            judger.parse_stdout(output), ["", "12.in\n3.in x", ""])
+        self.assertEqual(judger.parse_stdout(""), [""])
+
+    def test_iter_stdout(self):
+        output = "".join("%d.in\n%d\n" % (i, i) for i in range(1, 1001))
+        cases = judger.iter_stdout(output)
+        self.assertEqual(next(cases), "1")
+        self.assertEqual(list(cases), [str(i) for i in range(2, 1001)])
+
     def test_match(self):
         # Correct output.
         correct = Attempt.ACCEPTED
-        expected_out = ['Hello\nWorld', 'World\nHello']
+        expected_out = [Case.output_digest(output)
+                        for output in ['Hello\nWorld', 'World\nHello']]
         response = {
             'stdout': '1.in\nHello\nWorld\n2.in\nWorld\nHello\n',
             'status': 'OK'
@@ -34,7 +107,6 @@ class JudgerTestCase(TestCase):
 
         # Wrong output.
         wrong = Attempt.WRONG_ANSWER
-        expected_out = ['Hello\nWorld', 'World\nHello']
         response = {
             'stdout': '1.in\nHello\nWorld\n2.in\nWorld\n2.in\nWorld\n',
             'status': 'OK'
@@ -43,6 +115,1157 @@ class JudgerTestCase(TestCase):
             judger.match(expected_out, response), ([correct, wrong], False))
 
 
+class JudgerClientTest(TestCase):
+    def test_keep_alive(self):
+        with StubJudger() as stub:
+            client = JudgerClient(stub.url, compress=True)
+            for _ in range(5):
+                response = client.run('print(input())', ['Hello\n'], 2000)
+            stats = client.stats()
+            client.close()
+        self.assertEqual(response, {'stdout': '1.in\nHello\n', 'status': 'OK'})
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused'], 4)
+        self.assertEqual(stats['errors'], 0)
+        self.assertGreater(stats['latency_max'], 0)
+
+    def test_read_timeout(self):
+        def hang(source, stdin):
+            time.sleep(0.5)
+            return stdin, 'OK'
+
+        with StubJudger(run=hang) as stub:
+            client = JudgerClient(stub.url, read_timeout=0.1, retries=0)
+            with self.assertRaises(requests.Timeout):
+                client.run('', ['\n'], 2000)
+        self.assertEqual(client.stats()['errors'], 1)
+
+    def test_judge(self):
+        verdict_cache.clear()
+        question = Question.objects.create(
+            title="Echo", description="Echo.", slug="echo", difficulty=20)
+        Case.objects.create(question=question, stdin="1\r\n2", stdout="1\n2")
+        Case.objects.create(question=question, stdin="3", stdout="4")
+        with StubJudger() as stub, \
+                mock.patch('onlinejudge.judger.get_client',
+                           return_value=JudgerClient(stub.url)):
+            result = judger.judge('print(input())', question)
+        self.assertEqual(result, {
+            'cases': [Attempt.ACCEPTED, Attempt.WRONG_ANSWER],
+            'verdict': Attempt.WRONG_ANSWER
+        })
+
+
+class JudgerRouterTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        # Nothing listens on the port of a stopped stub.
+        with StubJudger() as stub:
+            self.dead_url = stub.url
+
+    def test_least_in_flight(self):
+        release = threading.Event()
+
+        def run(source, stdin):
+            release.wait(5)
+            return stdin, 'OK'
+
+        with StubJudger(run=run) as first, StubJudger(run=run) as second:
+            router = JudgerRouter([first.url, second.url])
+            with ThreadPoolExecutor(4) as executor:
+                futures = [executor.submit(router.run, "", ["1\n"], 2000)
+                           for _ in range(4)]
+                while len(first.requests) + len(second.requests) < 4:
+                    time.sleep(0.01)
+                self.assertEqual(len(first.requests), 2)
+                self.assertEqual(len(second.requests), 2)
+                release.set()
+            for future in futures:
+                self.assertEqual(future.result()['status'], 'OK')
+
+    def test_failover_and_circuit_breaker(self):
+        with StubJudger() as stub:
+            router = JudgerRouter([self.dead_url, stub.url],
+                                  failure_threshold=2, retries=0)
+            with self.assertLogs('onlinejudge.router', 'WARNING'):
+                for _ in range(4):
+                    # The first backend is idle, so it is tried first.
+                    router.run("", ["1\n"], 2000)
+            dead, alive = router.stats()
+        self.assertEqual(len(stub.requests), 4)
+        self.assertEqual((dead['errors'], dead['circuit']), (2, 'open'))
+        self.assertEqual((alive['errors'], alive['circuit']), (0, 'closed'))
+
+    def test_no_backend_available(self):
+        router = JudgerRouter([self.dead_url], failure_threshold=1,
+                              retries=0)
+        with self.assertRaises(requests.ConnectionError), \
+                self.assertLogs('onlinejudge.router', 'WARNING'):
+            router.run("", [], 2000)
+        with self.assertRaises(NoBackendAvailable):
+            router.run("", [], 2000)
+        self.assertFalse(router.available)
+
+    def test_probe(self):
+        with StubJudger() as stub:
+            router = JudgerRouter([self.dead_url, stub.url])
+            with self.assertLogs('onlinejudge.router', 'WARNING'):
+                router.probe()
+        self.assertEqual([backend['healthy'] for backend in router.stats()],
+                         [False, True])
+        self.assertTrue(judger_available())
+        out = StringIO()
+        call_command('judgerstatus', stdout=out)
+        self.assertIn("%s down" % self.dead_url, out.getvalue())
+
+        with self.assertLogs('onlinejudge.router', 'WARNING'):
+            JudgerRouter([self.dead_url]).probe()
+        self.assertFalse(judger_available())
+        user = User.objects.create_user(username='test')
+        Question.objects.create(title="Q", slug="q", description="",
+                                difficulty=20)
+        request = RequestFactory().post('/question/q/submit',
+                                        {'source': "print(1)"})
+        request.user = user
+        response = views.submit(request, 'q')
+        self.assertEqual(response.url, '/question/q/judger-offline')
+        self.assertFalse(Attempt.objects.exists())
+
+
+class LocalJudgerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.local = LocalJudger(workers=2, memory_limit=128 * 1024 * 1024,
+                                output_limit=1000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.local.close()
+        super().tearDownClass()
+
+    def test_run(self):
+        response = self.local.run("print(int(input()) * 2)",
+                                  ["1\n", "x\n", "3\n"], 2000)
+        self.assertEqual(judger.parse_stdout(response['stdout']),
+                         ["2", "", "6"])
+        self.assertEqual(response['status'], 'Runtime Error')
+        # Output without a final newline keeps the next case apart.
+        response = self.local.run("print(input(), end='')", ["a", "b"], 2000)
+        self.assertEqual(response, {'stdout': '1.in\na\n2.in\nb\n',
+                                    'status': 'OK'})
+        self.assertEqual(self.local.stats()[0]['errors'], 0)
+        # Only stdin, stdout and stderr are left open.
+        response = self.local.run(
+            "import os\n"
+            "for fd in range(3, 256):\n"
+            "    try:\n"
+            "        os.fstat(fd)\n"
+            "        print(fd)\n"
+            "    except OSError:\n"
+            "        pass\n", [""], 2000)
+        self.assertEqual(response, {'stdout': '1.in\n\n', 'status': 'OK'})
+
+    def test_limits(self):
+        runs = [
+            ("while True: pass", 'Timed Out'),
+            ("import time\ntime.sleep(5)", 'Timed Out'),
+            ("x = 'x' * 10 ** 9", 'Runtime Error'),
+            ("while True: print('x' * 100)", 'Runtime Error'),
+        ]
+        start = time.monotonic()
+        responses = self.local.run_batch([
+            {'source': source, 'stdin': ["1\n", "2\n"], 'timeout': 500}
+            for source, status in runs])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([response['status'] for response in responses],
+                         [status for source, status in runs])
+        # The cases after a timeout are not run.
+        self.assertEqual(responses[0]['stdout'], "1.in\n\n")
+
+    def test_judge(self):
+        verdict_cache.clear()
+        question = Question.objects.create(
+            title="Double", description="", slug="double", difficulty=20)
+        Case.objects.create(question=question, stdin="1", stdout="2")
+        Case.objects.create(question=question, stdin="21", stdout="42")
+        with mock.patch('onlinejudge.judger.get_client',
+                        return_value=self.local):
+            self.assertEqual(
+                judger.judge("print(int(input()) * 2)", question)['verdict'],
+                Attempt.ACCEPTED)
+            self.assertEqual(
+                judger.judge("print(int(input()) + 1)", question)['cases'],
+                [Attempt.ACCEPTED, Attempt.WRONG_ANSWER])
+
+    def test_fallback(self):
+        caches['default'].clear()
+        with self.assertRaises(TypeError):
+            # Backends must implement run.
+            JudgeBackend()
+        with StubJudger() as stub:
+            dead_url = stub.url
+        router = JudgerRouter([dead_url], failure_threshold=1, retries=0)
+        backend = FallbackBackend(router, self.local)
+        with self.assertLogs('onlinejudge.router', 'WARNING'):
+            response = backend.run("print(input())", ["1\n"], 2000)
+        self.assertEqual(response['stdout'], "1.in\n1\n")
+        # Straight to the fallback while the circuit is open.
+        self.assertFalse(router.available)
+        self.assertEqual(backend.run_batch([
+            {'source': "print(2)", 'stdin': ["\n"], 'timeout': 2000}
+        ])[0]['stdout'], "1.in\n2\n")
+        self.assertTrue(backend.available)
+        with self.assertLogs('onlinejudge.router', 'WARNING'):
+            backend.probe()
+        self.assertTrue(judger_available())
+        out = StringIO()
+        call_command('judgerstatus', stdout=out)
+        self.assertIn("local up", out.getvalue())
+
+    def test_settings(self):
+        previous = set_client(None)
+        try:
+            with override_settings(JUDGE_BACKEND='local', JUDGE_FALLBACK=''):
+                backend = get_client()
+        finally:
+            set_client(previous)
+        self.assertIsInstance(backend, LocalJudger)
+        backend.close()
+        with self.assertRaises(requests.ConnectionError):
+            backend.run("", [], 1000)
+        self.assertIsInstance(create_backend('http', 'local'),
+                              FallbackBackend)
+        with self.assertRaises(ImproperlyConfigured):
+            create_backend('docker')
+
+
+class BatchJudgingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test', email='test@case.com', password='test_case')
+        self.question = Question.objects.create(
+            title="Echo", description="Echo.", slug="echo", difficulty=20)
+        Case.objects.create(question=self.question, stdin="1", stdout="1")
+        Case.objects.create(question=self.question, stdin="2", stdout="2")
+        verdict_cache.clear()
+
+    def wrong_on(self, marker):
+        # Stub program: sources containing `marker` print nothing.
+        def run(source, stdin):
+            if marker in source:
+                return ["\n" for _ in stdin], 'OK'
+            return list(stdin), 'OK'
+        return run
+
+    def test_judge_batch(self):
+        submissions = [('ok', self.question), ('wrong', self.question),
+                       ('ok again', self.question)]
+        with StubJudger(run=self.wrong_on('wrong'), batch=True) as stub, \
+                mock.patch('onlinejudge.judger.get_client',
+                           return_value=JudgerClient(stub.url)):
+            results = judger.judge_batch(submissions)
+        self.assertEqual(stub.requests, ['/python3/batch'])
+        self.assertEqual([result['verdict'] for result in results], [
+            Attempt.ACCEPTED, Attempt.WRONG_ANSWER, Attempt.ACCEPTED])
+
+    def test_single_shot_fallback(self):
+        submissions = [('ok', self.question), ('wrong', self.question)]
+        with StubJudger(run=self.wrong_on('wrong')) as stub:
+            client = JudgerClient(stub.url)
+            with mock.patch('onlinejudge.judger.get_client',
+                            return_value=client):
+                first = judger.judge_batch(submissions)
+                second = judger.judge_batch(
+                    [('ok 2', self.question), ('wrong 2', self.question)])
+        self.assertFalse(client.batch_supported)
+        self.assertEqual(stub.requests, ['/python3/batch'] + ['/python3'] * 4)
+        self.assertEqual(first, second)
+        self.assertEqual([result['verdict'] for result in first],
+                         [Attempt.ACCEPTED, Attempt.WRONG_ANSWER])
+
+    def test_worker_batches(self):
+        for source in ['ok', 'wrong', 'ok too']:
+            Attempt.objects.create(user=self.user, question=self.question,
+                                   source=source, status=Attempt.PENDING)
+        with StubJudger(run=self.wrong_on('wrong'), batch=True) as stub, \
+                mock.patch('onlinejudge.judger.get_client',
+                           return_value=JudgerClient(stub.url)):
+            self.assertEqual(worker.drain(batch_size=2, batch_window=0), 3)
+        self.assertEqual(stub.requests, ['/python3/batch', '/python3'])
+        self.assertEqual(
+            list(Attempt.objects.order_by('id').values_list(
+                'status', 'first_solve')),
+            [(Attempt.ACCEPTED, True), (Attempt.WRONG_ANSWER, False),
+             (Attempt.ACCEPTED, False)])
+
+
+    def test_missing_results(self):
+        for source in ['ok', 'wrong', 'ok too']:
+            Attempt.objects.create(user=self.user, question=self.question,
+                                   source=source, status=Attempt.PENDING)
+        with StubJudger(run=self.wrong_on('wrong')) as stub:
+            client = JudgerClient(stub.url)
+            # A judger losing runs: every attempt is judged on its own.
+            truncated = {'stdout': "1.in\n1\n2.in\n2\n", 'status': 'OK'}
+            with mock.patch('onlinejudge.judger.get_client',
+                            return_value=client), \
+                    mock.patch.object(client, 'run_batch',
+                                      return_value=[truncated]), \
+                    self.assertLogs('onlinejudge.worker', 'ERROR'):
+                self.assertEqual(
+                    worker.drain(batch_size=3, batch_window=0), 3)
+        self.assertEqual(stub.requests, ['/python3'] * 3)
+        self.assertEqual(
+            list(Attempt.objects.order_by('id').values_list(
+                'status', flat=True)),
+            [Attempt.ACCEPTED, Attempt.WRONG_ANSWER, Attempt.ACCEPTED])
+
+
+class VerdictCacheTest(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create(
+            title="Echo", description="Echo.", slug="echo", difficulty=20)
+        self.case = Case.objects.create(
+            question=self.question, stdin="1", stdout="1")
+        verdict_cache.clear()
+
+    def judge(self, stub, source):
+        question = Question.objects.get(id=self.question.id)
+        with mock.patch('onlinejudge.judger.get_client',
+                        return_value=JudgerClient(stub.url)):
+            return judger.judge(source, question)
+
+    def test_shared_caches_required(self):
+        local = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        caches_ = {
+            'default': local,
+            # Pages may be cached per process, their versions are shared.
+            'pages': local,
+        }
+        with override_settings(CACHES=caches_, DEBUG=False, TESTING=False):
+            with self.assertRaisesMessage(ImproperlyConfigured, "'default'"):
+                check_shared_caches()
+            caches_['default'] = {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'cache'}
+            check_shared_caches()
+
+    def test_bump_version_without_atomic_incr(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileBasedCache(directory, {})
+            versions = [get_version(cache, 'version')]
+            for _ in range(3):
+                versions.append(bump_version(cache, 'version'))
+                self.assertEqual(get_version(cache, 'version'), versions[-1])
+            self.assertEqual(len(set(versions)), 4)
+
+    def test_normalize_source(self):
+        self.assertEqual(
+            normalize_source("if x:\r\n    print(x)\r\n\n"),
+            "if x:\n    print(x)")
+        # Trailing spaces can change the output or the syntax.
+        for source in ['print("""a  \n""")', "x = 1 + \\  \n2"]:
+            self.assertNotEqual(normalize_source(source),
+                                normalize_source(source.replace("  ", "")))
+
+    def test_resubmit(self):
+        with StubJudger() as stub:
+            first = self.judge(stub, "print(input())\n")
+            second = self.judge(stub, "print(input())\r\n\n")
+        self.assertEqual(first, second)
+        self.assertEqual(stub.requests, ['/python3'])
+        self.assertEqual(verdict_cache.stats()['hits'], 1)
+        self.assertEqual(verdict_cache.stats()['misses'], 1)
+
+    def test_case_changes_invalidate(self):
+        with StubJudger() as stub:
+            self.judge(stub, "print(input())")
+            self.case.stdout = "2"
+            self.case.save()
+            self.assertEqual(self.judge(stub, "print(input())")['verdict'],
+                             Attempt.WRONG_ANSWER)
+            Case.objects.create(question=self.question, stdin="3", stdout="3")
+            self.judge(stub, "print(input())")
+            self.case.delete()
+            self.judge(stub, "print(input())")
+        self.assertEqual(len(stub.requests), 4)
+        self.assertEqual(verdict_cache.stats()['hits'], 0)
+
+    def test_server_errors_not_cached(self):
+        with StubJudger(run=lambda source, stdin: ([], 'Server Error')) \
+                as stub:
+            self.judge(stub, "print(input())")
+            self.judge(stub, "print(input())")
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_eviction(self):
+        cache = VerdictCache(max_entries=2)
+        result = {'cases': [], 'verdict': Attempt.ACCEPTED}
+        for source in ["a", "b", "c"]:
+            cache.set(source, self.question, result)
+        self.assertIsNone(cache.get("a", self.question))
+        self.assertEqual(cache.get("c", self.question), result)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class ShardedJudgingTest(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create(
+            title="Echo", description="Echo.", slug="echo", difficulty=20,
+            shard_size=2)
+        for i in range(1, 7):
+            Case.objects.create(question=self.question, stdin=str(i),
+                                stdout=str(i))
+        verdict_cache.clear()
+
+    def judge(self, run, workers=4):
+        with StubJudger(run=run) as stub, \
+                mock.patch('onlinejudge.judger.get_client',
+                           return_value=JudgerClient(stub.url)), \
+                mock.patch('onlinejudge.judger._shard_executor',
+                           return_value=ThreadPoolExecutor(workers)):
+            result = judger.judge('print(input())', self.question)
+        return result, stub.requests
+
+    def test_accepted(self):
+        result, requests = self.judge(run=lambda source, stdin: (stdin, 'OK'))
+        self.assertEqual(result, {'cases': [Attempt.ACCEPTED] * 6,
+                                  'verdict': Attempt.ACCEPTED})
+        self.assertEqual(requests, ['/python3'] * 3)
+
+    def test_fail_fast(self):
+        def run(source, stdin):
+            return ["wrong\n" if case == "1\n" else case
+                    for case in stdin], 'OK'
+
+        # With one worker the shards run in order. The worker may already
+        # have picked up the second shard, the third one is cancelled.
+        result, requests = self.judge(run=run, workers=1)
+        self.assertEqual(result, {
+            'cases': [Attempt.WRONG_ANSWER, Attempt.ACCEPTED],
+            'verdict': Attempt.WRONG_ANSWER
+        })
+        self.assertLess(len(requests), 3)
+
+    def test_runtime_error(self):
+        def run(source, stdin):
+            if "5\n" in stdin:
+                return stdin[:1], 'Runtime Error'
+            return stdin, 'OK'
+
+        result, _ = self.judge(run=run)
+        self.assertEqual(result['verdict'], Attempt.RUNTIME_ERROR)
+        self.assertIn(Attempt.RUNTIME_ERROR, result['cases'])
+
+    def test_earliest_failing_shard(self):
+        def run(source, stdin):
+            if "1\n" in stdin:
+                # The first shard fails last.
+                time.sleep(0.2)
+                return ["wrong\n"] * len(stdin), 'OK'
+            if "5\n" in stdin:
+                return stdin[:1], 'Runtime Error'
+            return stdin, 'OK'
+
+        result, _ = self.judge(run=run)
+        self.assertEqual(result, {
+            'cases': [Attempt.WRONG_ANSWER] * 2,
+            'verdict': Attempt.WRONG_ANSWER
+        })
+        # Not every case was judged, so the result is not cached.
+        self.assertIsNone(verdict_cache.get('print(input())', self.question))
+
+
+@override_settings(CASE_INLINE_LIMIT=10)
+class LargeCaseTest(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create(
+            title="Echo", description="Echo.", slug="echo", difficulty=20)
+        self.big = "\r\n".join(str(i) for i in range(100))
+        self.case = Case.objects.create(
+            question=self.question, stdin=self.big, stdout=self.big)
+        verdict_cache.clear()
+
+    def test_stored_in_blob(self):
+        normalized = self.big.replace("\r", "")
+        case = Case.objects.get(id=self.case.id)
+        self.assertEqual((case.stdin, case.stdout), ("", ""))
+        self.assertEqual(case.stdin_blob_id, case.stdout_blob_id)
+        self.assertEqual((case.input, case.output), (normalized, normalized))
+        # Saving again keeps the content.
+        case.sample_case = True
+        case.save()
+        self.assertEqual(Case.objects.get(id=case.id).input, normalized)
+        small = Case.objects.create(
+            question=self.question, stdin="1\r\n", stdout="1")
+        self.assertEqual((small.stdin, small.stdin_blob), ("1\n", None))
+
+    def test_judge(self):
+        with StubJudger() as stub, \
+                mock.patch('onlinejudge.judger.get_client',
+                           return_value=JudgerClient(stub.url)):
+            result = judger.judge('print(input())', self.question)
+        self.assertEqual(result, {'cases': [Attempt.ACCEPTED],
+                                  'verdict': Attempt.ACCEPTED})
+
+    def test_admin_form(self):
+        form = CaseForm(instance=self.case)
+        self.assertEqual(form.initial['stdin'], self.big.replace("\r", ""))
+        form = CaseForm({'stdin': "", 'stdout': "2"}, instance=self.case)
+        self.assertTrue(form.is_valid())
+        case = form.save()
+        self.assertEqual((case.input, case.output), ("", "2"))
+        self.assertEqual(case.stdout_digest, Case.output_digest("2"))
+
+
+class QuestionCountersTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username='user%d' % i) for i in range(3)
+        ]
+        self.question = Question.objects.create(
+            title="Test Question", description="This is a test.",
+            slug="test-question", difficulty=20)
+
+    def attempt(self, user, status=Attempt.PENDING):
+        return Attempt.objects.create(
+            user=user, question=self.question, status=status)
+
+    def assertCounters(self, solves, total):
+        question = Question.objects.get(id=self.question.id)
+        self.assertEqual((question.solves, question.total), (solves, total))
+        self.assertEqual(counters.recount(fix=False), [])
+
+    def test_counters(self):
+        first = self.attempt(self.users[0])
+        self.attempt(self.users[0])
+        self.attempt(self.users[1], Attempt.WRONG_ANSWER)
+        self.assertCounters(0, 2)
+        worker.record_verdict(first, Attempt.ACCEPTED)
+        self.assertCounters(1, 2)
+        # Solving again does not count twice.
+        worker.record_verdict(self.attempt(self.users[0]), Attempt.ACCEPTED)
+        self.assertCounters(1, 2)
+        self.assertEqual(
+            Question.objects.get(id=self.question.id).success_rate, "50.00")
+        # The second accepted attempt still counts.
+        first.delete()
+        self.assertCounters(1, 2)
+        Attempt.objects.filter(user=self.users[0]).delete()
+        self.assertCounters(0, 1)
+
+    def test_properties_do_not_query(self):
+        question = Question.objects.get(id=self.question.id)
+        with self.assertNumQueries(0):
+            question.solves, question.total, question.success_rate
+
+    def test_out_of_order_verdicts(self):
+        first = self.attempt(self.users[0])
+        second = self.attempt(self.users[0])
+        with CaptureQueriesContext(connection) as captured:
+            worker.record_verdict(second, Attempt.ACCEPTED)
+            worker.record_verdict(first, Attempt.ACCEPTED)
+        self.assertCounters(1, 1)
+        # Incremented, not recounted.
+        self.assertFalse([query for query in captured
+                          if 'DISTINCT' in query['sql']])
+        worker.record_verdict(second, Attempt.WRONG_ANSWER)
+        self.assertCounters(1, 1)
+        worker.record_verdict(first, Attempt.WRONG_ANSWER)
+        self.assertCounters(0, 1)
+
+    def test_rebuild(self):
+        self.attempt(self.users[2])
+        Question.objects.update(solve_count=5, attempt_count=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuildcounters', check=True, stdout=mock.Mock())
+        call_command('rebuildcounters', stdout=mock.Mock())
+        self.assertCounters(0, 1)
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.users = [
+            User.objects.create_user(username='user%d' % i) for i in range(3)
+        ]
+        self.questions = [
+            Question.objects.create(title="Q%d" % points, slug="q%d" % points,
+                                    description="", difficulty=points)
+            for points in [20, 40, 70]
+        ]
+
+    def solve(self, user, question):
+        attempt = Attempt.objects.create(
+            user=user, question=question, status=Attempt.PENDING)
+        worker.record_verdict(attempt, Attempt.ACCEPTED)
+        return attempt
+
+    def assertBoard(self, expected):
+        board = [(entry.user.username, entry.points, entry.rank)
+                 for entry in leaderboard.page(1, 10)]
+        self.assertEqual(board, expected)
+        self.assertEqual(leaderboard.rebuild(fix=False), 0)
+
+    def test_incremental_updates(self):
+        u0, u1, u2 = self.users
+        q20, q40, q70 = self.questions
+        self.solve(u0, q20)
+        self.assertBoard([('user0', 20, 1)])
+        self.solve(u1, q40)
+        self.assertBoard([('user1', 40, 1), ('user0', 20, 2)])
+        # Ties go to the earliest last solve.
+        self.solve(u2, q20)
+        self.assertBoard([('user1', 40, 1), ('user0', 20, 2),
+                          ('user2', 20, 3)])
+        hard = self.solve(u2, q70)
+        self.solve(u0, q40)
+        self.assertBoard([('user2', 90, 1), ('user0', 60, 2),
+                          ('user1', 40, 3)])
+        hard.delete()
+        self.assertBoard([('user0', 60, 1), ('user1', 40, 2),
+                          ('user2', 20, 3)])
+        q20.difficulty = 200
+        q20.save()
+        self.assertBoard([('user0', 240, 1), ('user2', 200, 2),
+                          ('user1', 40, 3)])
+
+    def test_exact_ties(self):
+        date = timezone.now()
+        for user in self.users:
+            Attempt.objects.create(user=user, question=self.questions[0],
+                                   status=Attempt.ACCEPTED, first_solve=True)
+            Attempt.objects.filter(user=user).update(attempt_date=date)
+            leaderboard.update_user(user.id)
+        # Same points and last solve: the lower user id ranks first.
+        self.assertBoard([('user0', 20, 1), ('user1', 20, 2),
+                          ('user2', 20, 3)])
+
+    def test_rebuild(self):
+        self.solve(self.users[0], self.questions[0])
+        self.solve(self.users[1], self.questions[1])
+        LeaderboardEntry.objects.update(rank=1)
+        self.assertEqual(leaderboard.rebuild(fix=False), 1)
+        with self.assertRaises(CommandError):
+            call_command('rebuildleaderboard', check=True, stdout=mock.Mock())
+        call_command('rebuildleaderboard', stdout=mock.Mock())
+        self.assertBoard([('user1', 40, 1), ('user0', 20, 2)])
+
+    @mock.patch('django.conf.settings.LEADERBOARD_PAGE_SIZE', 2)
+    def test_view(self):
+        caches['pages'].clear()
+        for user, question in zip(self.users, self.questions):
+            self.solve(user, question)
+        request = self.factory.get('/scoreboard', {'page': 2})
+        request.user = self.users[1]
+        # Count, next publish date, page and the user's entry.
+        with self.assertNumQueries(4):
+            response = views.leaderboard(request)
+        # Only the user's entry once the page is cached.
+        with self.assertNumQueries(1):
+            views.leaderboard(request)
+        self.assertContains(response, '2 / 2')
+        self.assertContains(response, 'user0')
+        self.assertNotContains(response, 'user2</a>')
+        # The user's own rank links to the page it is on.
+        self.assertContains(response, '<a href="?page=1">#2</a>')
+
+
+class ConcurrentLeaderboardTest(TransactionTestCase):
+    def test_interleaved_updates(self):
+        question = Question.objects.create(title="Q", slug="q",
+                                           description="", difficulty=20)
+        users = [User.objects.create_user(username='user%d' % i)
+                 for i in range(2)]
+        # Solved without signals, the leaderboard does not know yet.
+        Attempt.objects.bulk_create([
+            Attempt(user=user, question=question, status=Attempt.ACCEPTED,
+                    first_solve=True) for user in users])
+        shift = leaderboard._shift
+
+        def slow_shift(*args, **kwargs):
+            # Give the other update time to read the leaderboard.
+            time.sleep(0.1)
+            shift(*args, **kwargs)
+
+        def update(user):
+            try:
+                leaderboard.update_user(user.id)
+            finally:
+                connection.close()
+
+        with mock.patch('onlinejudge.leaderboard._shift', slow_shift):
+            threads = [threading.Thread(target=update, args=(user,))
+                       for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(
+            sorted(LeaderboardEntry.objects.values_list('rank', flat=True)),
+            [1, 2])
+        self.assertEqual(leaderboard.rebuild(fix=False), 0)
+
+
+class ContestScoreboardTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.users = [
+            User.objects.create_user(username='user%d' % i) for i in range(3)
+        ]
+        self.contest = Contest.objects.create(name="Live", slug="live",
+                                              description="")
+        self.questions = [
+            Question.objects.create(title="Q%d" % points, slug="q%d" % points,
+                                    description="", difficulty=points,
+                                    contest=self.contest)
+            for points in [20, 40]
+        ]
+        # Solves elsewhere do not count.
+        self.other = Question.objects.create(title="Other", slug="other",
+                                             description="", difficulty=70)
+
+    def solve(self, user, question):
+        attempt = Attempt.objects.create(
+            user=user, question=question, status=Attempt.PENDING)
+        worker.record_verdict(attempt, Attempt.ACCEPTED)
+        return attempt
+
+    def board(self):
+        version, rows = scoreboard.standings(self.contest.id)
+        return [(row['username'], row['rank'], row['points'], row['solved'])
+                for row in rows]
+
+    def test_standings(self):
+        u0, u1, u2 = self.users
+        q20, q40 = self.questions
+        self.solve(u0, q20)
+        self.solve(u1, q40)
+        self.solve(u2, self.other)
+        self.solve(u2, q20)
+        self.assertEqual(self.board(), [('user1', 1, 40, 1),
+                                        ('user0', 2, 20, 1),
+                                        ('user2', 3, 20, 1)])
+        # Cached until a first solve of the contest changes.
+        with self.assertNumQueries(0):
+            self.board()
+        self.solve(u0, q40)
+        self.assertEqual(self.board()[0], ('user0', 1, 60, 2))
+        q40.difficulty = 10
+        q40.save()
+        self.assertEqual(self.board(), [('user0', 1, 30, 2),
+                                        ('user2', 2, 20, 1),
+                                        ('user1', 3, 10, 1)])
+
+    def test_diff(self):
+        old = [{'user': 1, 'rank': 1}, {'user': 2, 'rank': 2},
+               {'user': 3, 'rank': 3}]
+        new = [{'user': 2, 'rank': 1}, {'user': 1, 'rank': 2},
+               {'user': 4, 'rank': 3}]
+        self.assertEqual(scoreboard.diff(old, new), {
+            'changed': new,
+            'removed': [3],
+        })
+        self.assertEqual(scoreboard.diff(new, new),
+                         {'changed': [], 'removed': []})
+
+    def test_changes(self):
+        u0, u1, u2 = self.users
+        q20, q40 = self.questions
+        self.solve(u0, q20)
+        self.solve(u1, q20)
+        first = scoreboard.changes(self.contest.id)
+        self.assertEqual([row['username'] for row in first['standings']],
+                         ['user0', 'user1'])
+        version = first['version']
+        # Polls without changes only read the cache.
+        with self.assertNumQueries(0):
+            self.assertEqual(scoreboard.changes(self.contest.id, version),
+                             {'version': version, 'changed': [],
+                              'removed': []})
+
+        # Only the rows that moved are sent.
+        self.solve(u1, q40)
+        self.solve(u2, q40)
+        update = scoreboard.changes(self.contest.id, version)
+        self.assertNotEqual(update['version'], version)
+        self.assertEqual(
+            [(row['username'], row['rank']) for row in update['changed']],
+            [('user1', 1), ('user2', 2), ('user0', 3)])
+        self.assertEqual(update['removed'], [])
+
+        # Unknown versions get every row.
+        for since in ["0.0", "nope"]:
+            self.assertEqual(
+                len(scoreboard.changes(self.contest.id, since)['standings']),
+                3)
+
+    def test_views(self):
+        self.solve(self.users[0], self.questions[0])
+        self.client.force_login(self.users[0])
+        response = self.client.get('/latihan/live/scoreboard')
+        self.assertContains(response, 'user0</a>')
+        self.assertContains(response, 'peringkat #1 dengan 20')
+        response = self.client.get('/latihan/live/scoreboard/changes')
+        self.assertEqual(response.json()['standings'][0]['username'],
+                         'user0')
+        version = response.json()['version']
+        # Anonymous polls without changes run no query.
+        self.client.logout()
+        with self.assertNumQueries(0):
+            response = self.client.get('/latihan/live/scoreboard/changes',
+                                       {'since': version})
+        self.assertEqual(response.json()['changed'], [])
+        self.assertEqual(
+            self.client.get('/latihan/none/scoreboard/changes').status_code,
+            404)
+
+
+class ContestPageTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='test')
+        self.contest = Contest.objects.create(
+            name="Test", slug="test", description="con test")
+        self.categories = [
+            Category.objects.create(name="Category %d" % i) for i in range(3)
+        ]
+        caches['default'].clear()
+
+    def populate(self, size):
+        for i in range(size):
+            question = Question.objects.create(
+                title="Q%d" % i, slug="q%d" % i, description="",
+                difficulty=20, contest=self.contest,
+                category=self.categories[i % 3])
+            status = Attempt.ACCEPTED if i % 2 else Attempt.WRONG_ANSWER
+            Attempt.objects.create(user=self.user, question=question,
+                                   status=status, first_solve=bool(i % 2))
+        # Unpublished questions are not listed.
+        Question.objects.create(
+            title="Soon", slug="soon", description="", difficulty=20,
+            contest=self.contest, category=self.categories[0],
+            published_date=timezone.now() + timedelta(days=1))
+
+    def render(self, user):
+        request = self.factory.get('/latihan/test/')
+        request.user = user
+        return views.contest(request, 'test')
+
+    def test_constant_queries(self):
+        for size in [1, 10, 40]:
+            Question.objects.all().delete()
+            self.populate(size)
+            caches['pages'].clear()
+            # Contest, next publish date, questions and the user's solved
+            # questions.
+            user = User.objects.get(id=self.user.id)
+            with self.assertNumQueries(4):
+                response = self.render(user)
+            # Everything is cached now.
+            user = User.objects.get(id=self.user.id)
+            with self.assertNumQueries(0):
+                self.render(user)
+            self.assertContains(response, 'class="questions"', count=size)
+            self.assertContains(response, '(Solves: 1)', count=size // 2)
+            self.assertContains(response, 'unsolved', count=size - size // 2)
+            self.assertNotContains(response, 'Soon')
+            # Anonymous visitors share the cached questions.
+            with self.assertNumQueries(0):
+                self.render(AnonymousUser())
+
+    def test_load_contest(self):
+        self.populate(6)
+        categories, solved = loaders.load_contest(self.contest, self.user)
+        self.assertEqual(
+            [(category.name, [question.title for question in questions])
+             for category, questions in categories],
+            [("Category 0", ["Q0", "Q3"]), ("Category 1", ["Q1", "Q4"]),
+             ("Category 2", ["Q2", "Q5"])])
+        self.assertEqual(
+            set(solved.ids), set(Question.objects.filter(
+                title__in=["Q1", "Q3", "Q5"]).values_list('id', flat=True)))
+
+
+class PageCacheCommitTest(TransactionTestCase):
+    def test_invalidated_on_commit(self):
+        caches['default'].clear()
+        user = User.objects.create_user(username='test')
+        question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20)
+        attempt = Attempt.objects.create(
+            user=user, question=question, status=Attempt.PENDING)
+        run_on_commit.stop()
+        self.addCleanup(run_on_commit.start)
+        version = pagecache._versions(['solves'])
+        with transaction.atomic():
+            worker.record_verdict(attempt, Attempt.ACCEPTED)
+            # Pages rendered before the commit show the old rows, they must
+            # not be cached under the new version.
+            self.assertEqual(pagecache._versions(['solves']), version)
+        self.assertNotEqual(pagecache._versions(['solves']), version)
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        caches['pages'].clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='test')
+        self.contest = Contest.objects.create(
+            name="Test", slug="test", description="con test")
+        self.question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20,
+            contest=self.contest, category=Category.objects.create(name="C"))
+
+    def render(self, user=None):
+        request = self.factory.get('/latihan/test/')
+        request.user = user or AnonymousUser()
+        return views.contest(request, 'test')
+
+    def test_anonymous_hits(self):
+        misses = pagecache.stats()['contest']['misses']
+        self.assertEqual(self.render()['X-Page-Cache'], 'miss')
+        pages = caches['pages']
+        # Hits only read the caches.
+        with self.assertNumQueries(0), \
+                mock.patch.object(pages, 'set') as set_, \
+                mock.patch.object(pages, 'add') as add, \
+                mock.patch.object(pages, 'incr') as incr:
+            response = self.render()
+        self.assertFalse(set_.called or add.called or incr.called)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, '(Solves: 0)')
+        self.assertEqual(pagecache.stats()['contest']['misses'], misses + 1)
+        self.assertGreater(pagecache.stats()['contest']['hit_rate'], 0)
+        self.assertEqual(self.render(self.user)['X-Page-Cache'], 'bypass')
+
+    def test_invalidation(self):
+        self.render()
+        attempt = Attempt.objects.create(
+            user=self.user, question=self.question, status=Attempt.PENDING)
+        # A pending attempt changes nothing on the page.
+        self.assertEqual(self.render()['X-Page-Cache'], 'hit')
+        worker.record_verdict(attempt, Attempt.ACCEPTED)
+        self.assertContains(self.render(), '(Solves: 1)')
+        self.contest.description = "changed"
+        self.contest.save()
+        self.assertContains(self.render(self.user), 'changed')
+
+    def test_staff_bypass(self):
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.render(self.user)
+        # Changes the cache does not hear about are seen by staff at once.
+        Question.objects.filter(id=self.question.id).update(title="Renamed")
+        self.assertContains(self.render(staff), 'Renamed')
+        self.assertNotContains(self.render(self.user), 'Renamed')
+
+    def test_expires_at_next_publish(self):
+        Question.objects.create(
+            title="Soon", slug="soon", description="", difficulty=20,
+            contest=self.contest,
+            published_date=timezone.now() + timedelta(seconds=30))
+        self.assertLessEqual(pagecache._timeout(caches['pages']), 30)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CACHES={
+                    'default': settings.CACHES['default'],
+                    'pages': {
+                        'BACKEND': 'django.core.cache.backends.filebased.'
+                                   'FileBasedCache',
+                        'LOCATION': directory,
+                    }}):
+            self.render()
+            self.assertEqual(self.render()['X-Page-Cache'], 'hit')
+
+
+class SolvedSetTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='test')
+        self.contest = Contest.objects.create(
+            name="Test", slug="test", description="con test")
+        self.questions = [
+            Question.objects.create(
+                title="Q%d" % i, slug="q%d" % i, description="",
+                difficulty=20, contest=self.contest)
+            for i in range(5)
+        ]
+
+    def solve(self, question):
+        attempt = Attempt.objects.create(
+            user=self.user, question=question, status=Attempt.PENDING)
+        worker.record_verdict(attempt, Attempt.ACCEPTED)
+
+    def fresh_user(self):
+        # The solved set is memoized on the user object.
+        return User.objects.get(id=self.user.id)
+
+    def test_solved_set(self):
+        solved = SolvedSet([9, 2, 5])
+        self.assertEqual(list(solved.ids), [2, 5, 9])
+        self.assertIn(5, solved)
+        self.assertNotIn(4, solved)
+        self.assertEqual(solved.count([1, 2, 3, 9]), 2)
+        self.assertEqual(
+            list(SolvedSet.frombytes(solved.tobytes()).ids), [2, 5, 9])
+
+    def test_filters_answer_from_cache(self):
+        self.solve(self.questions[0])
+        user = self.fresh_user()
+        app_filters.progress(self.contest, user)
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(app_filters.is_solved(self.questions[0], user))
+            self.assertFalse(app_filters.is_solved(self.questions[1], user))
+            self.assertFalse(app_filters.completed(self.contest, user))
+            self.assertEqual(app_filters.progress(self.contest, user), [False])
+        self.assertEqual(
+            app_filters.progress(self.contest, AnonymousUser()), [False])
+
+    def test_invalidation(self):
+        for question in self.questions[:4]:
+            self.solve(question)
+        self.assertEqual(len(solved_set(self.fresh_user())), 4)
+        self.solve(self.questions[4])
+        user = self.fresh_user()
+        self.assertEqual(len(solved_set(user)), 5)
+        self.assertTrue(app_filters.completed(self.contest, user))
+        self.assertEqual(app_filters.progress(self.contest, user), [True])
+        # A new question in the contest is picked up.
+        Question.objects.create(title="New", slug="new", description="",
+                                difficulty=20, contest=self.contest)
+        self.assertFalse(app_filters.completed(self.contest, user))
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'solved': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'solved',
+            },
+            'pages': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            },
+        },
+        SOLVED_CACHE='solved')
+    def test_pluggable_backend(self):
+        caches['solved'].clear()
+        self.solve(self.questions[0])
+        solved_set(self.fresh_user())
+        self.assertTrue(caches['solved'].get(
+            'solved-version:%d' % self.user.id))
+
+
+class ActivityFeedTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        feed.reset()
+        self.factory = RequestFactory()
+        self.users = [User.objects.create_user(username='user%d' % i)
+                      for i in range(3)]
+        self.question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20)
+
+    def solve(self, user):
+        attempt = Attempt.objects.create(
+            user=user, question=self.question, status=Attempt.PENDING)
+        worker.record_verdict(attempt, Attempt.ACCEPTED)
+        return attempt
+
+    def render(self, before=None):
+        request = self.factory.get(
+            '/activity', {'before': before} if before else {})
+        # Signed in, so the page itself is not cached.
+        request.user = self.users[2]
+        return views.activity(request)
+
+    def test_first_page_from_ring(self):
+        self.solve(self.users[0])
+        self.render()
+        with self.assertNumQueries(0):
+            response = self.render()
+        self.assertContains(response, "user0")
+        # A solve recorded by this process is added to the ring.
+        self.solve(self.users[1])
+        with self.assertNumQueries(0):
+            self.assertContains(self.render(), "user1")
+        # A solve recorded by another process reloads it.
+        feed.reset()
+        feed.invalidate()
+        with self.assertNumQueries(1):
+            self.assertContains(self.render(), "user1")
+
+    def test_taken_back_solve(self):
+        attempt = self.solve(self.users[0])
+        self.assertEqual(feed.latest()[0], [attempt])
+        attempt.delete()
+        self.assertEqual(feed.latest()[0], [])
+
+    @override_settings(ACTIVITY_PAGE_SIZE=2)
+    def test_keyset_pages(self):
+        date = timezone.now()
+        attempts = [self.solve(user) for user in self.users]
+        # Solves at the same instant are ordered by id.
+        Attempt.objects.update(attempt_date=date)
+        feed.invalidate()
+
+        first, older = feed.latest()
+        self.assertEqual(first, attempts[:0:-1])
+        with self.assertNumQueries(1):
+            second, last = feed.latest(older)
+        self.assertEqual(second, attempts[:1])
+        self.assertIsNone(last)
+        self.assertContains(self.render(), "?before=%s" % older)
+        self.assertContains(self.render(older), "user0")
+        # Garbage cursors fall back to the first page.
+        self.assertEqual(feed.latest("nope")[0], first)
+        self.assertEqual(feed.latest("99999999999999999999_1")[0], first)
+        self.assertEqual(self.render("99999999999999999999_1").status_code,
+                         200)
+
+
+class SourceBlobTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test')
+        self.question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20)
+
+    def attempt(self, source):
+        return Attempt.objects.create(user=self.user, question=self.question,
+                                      status=Attempt.WRONG_ANSWER,
+                                      source=source)
+
+    def test_deduplicated(self):
+        source = "print(input())\n" * 100
+        first = self.attempt(source)
+        second = self.attempt(source)
+        self.attempt("print(1)")
+        self.assertEqual(first.source_blob_id, second.source_blob_id)
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(Attempt.objects.get(id=second.id).source, source)
+        self.assertEqual(Attempt.objects.create(
+            user=self.user, question=self.question,
+            status=Attempt.PENDING).source, "")
+
+    def test_space_saved(self):
+        for i in range(3):
+            self.attempt("print(input())\n" * 100)
+        usage = Blob.usage()
+        self.assertEqual(usage['attempts'], 3)
+        self.assertEqual(usage['blobs'], 1)
+        self.assertEqual(usage['raw_bytes'], 4500)
+        self.assertLess(usage['stored_bytes'], 100)
+        out = StringIO()
+        call_command('sourcestats', stdout=out)
+        self.assertIn("3 attempts share 1 sources.", out.getvalue())
+
+
 class PublicViewsTest(TestCase):
     """
     Test views that can be accessed by both
@@ -129,6 +1352,43 @@ class QuestionViewsTest(TestCase):
             response.url,
             "/login?next=/question/%s/submit" % self.question.slug)
 
+    @override_settings(SUBMISSIONS_PAGE_SIZE=2)
+    def test_submission_history(self):
+        for i in range(5):
+            Attempt.objects.create(user=self.user, question=self.question,
+                                   status=Attempt.WRONG_ANSWER,
+                                   source="print(%d)" % i)
+        request = self.factory.get('/question/%s' % self.question.slug,
+                                   {'submissions': 3})
+        request.user = self.user
+        # Question, latest source, sample cases, count and page.
+        with self.assertNumQueries(5):
+            response = views.detail(request, self.question.slug)
+        self.assertContains(response, "print(4)")
+        self.assertNotContains(response, "print(0)")
+        self.assertContains(response, "3 / 3")
+
+    def test_attempt_source(self):
+        attempt = Attempt.objects.create(
+            user=self.user, question=self.question,
+            status=Attempt.WRONG_ANSWER, source="print(1)")
+        other = User.objects.create_user(username='other')
+        for user, status in [(self.user, 200), (other, 401)]:
+            request = self.factory.get('/source')
+            request.user = user
+            response = views.attempt_source(
+                request, self.question.slug, attempt.id)
+            self.assertEqual(response.status_code, status)
+        self.assertEqual(json.loads(response.content.decode()),
+                         {'error': "Unauthorized"})
+        request.user = self.user
+        response = views.attempt_source(request, self.question.slug, 0)
+        self.assertEqual(response.status_code, 404)
+        response = views.attempt_source(
+            request, self.question.slug, attempt.id)
+        self.assertEqual(json.loads(response.content.decode()),
+                         {'source': "print(1)"})
+
 
 class LatestQuestionsTest(TestCase):
     def setUp(self):
@@ -139,3 +1399,590 @@ class LatestQuestionsTest(TestCase):
     def test_latest_questions(self):
         latest_questions = app_filters.latest_questions(
             self.category, self.contest)
+
+
+class JudgeQueueTest(TestCase):
+    def setUp(self):
+        # Submission rate limits are kept in the cache.
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='test', email='test@case.com', password='test_case')
+        self.question = Question.objects.create(
+            title="Test Question",
+            description="This is a test.",
+            slug="test-question",
+            difficulty=20,
+            template="# Hello")
+
+    def submit(self, source='print("Test!")'):
+        request = self.factory.post(
+            '/question/%s/submit' % self.question.slug,
+            data={'source': source})
+        request.user = self.user
+        return views.submit(request, self.question.slug)
+
+    def status(self, attempt):
+        request = self.factory.get('/status')
+        request.user = self.user
+        response = views.result_status(request, self.question.slug,
+                                       attempt.id)
+        return json.loads(response.content.decode())
+
+    def test_submit_does_not_judge(self):
+        with mock.patch('onlinejudge.worker.judge') as judge:
+            response = self.submit()
+        judge.assert_not_called()
+        attempt = Attempt.objects.get()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(attempt.status, Attempt.PENDING)
+        self.assertTrue(self.status(attempt)['pending'])
+
+    def test_worker_records_verdict(self):
+        self.submit()
+        self.submit('print("Test again!")')
+        verdict = {'cases': [Attempt.ACCEPTED], 'verdict': Attempt.ACCEPTED}
+        with mock.patch('onlinejudge.worker.judge', return_value=verdict):
+            self.assertEqual(worker.drain(), 2)
+        first, second = Attempt.objects.order_by('id')
+        self.assertEqual(first.status, Attempt.ACCEPTED)
+        self.assertTrue(first.first_solve)
+        self.assertFalse(second.first_solve)
+        self.assertEqual(self.status(first),
+                         {'status': 1, 'verdict': 'Accepted',
+                          'pending': False})
+
+    def test_unpublished_question(self):
+        self.question.published_date = timezone.now() + timedelta(days=1)
+        self.question.save()
+        self.submit()
+        verdict = {'cases': [Attempt.ACCEPTED], 'verdict': Attempt.ACCEPTED}
+        with mock.patch('onlinejudge.worker.judge', return_value=verdict):
+            worker.drain()
+        attempt = Attempt.objects.get()
+        self.assertEqual(attempt.status, Attempt.TESTING)
+        self.assertFalse(attempt.first_solve)
+
+    def test_judger_offline(self):
+        self.submit()
+        with mock.patch('onlinejudge.worker.judge',
+                        side_effect=requests.ConnectionError), \
+                self.assertLogs('onlinejudge.worker', 'ERROR'):
+            worker.drain()
+        self.assertEqual(Attempt.objects.get().status, Attempt.SERVER_ERROR)
+
+    def test_unknown_judger_status(self):
+        self.submit()
+        Case.objects.create(question=self.question, stdin="1", stdout="1")
+        with StubJudger(run=lambda source, stdin: (stdin, 'Memory Limit')) \
+                as stub, \
+                mock.patch('onlinejudge.judger.get_client',
+                           return_value=JudgerClient(stub.url)), \
+                self.assertLogs('onlinejudge.worker', 'ERROR'):
+            self.assertEqual(worker.drain(), 1)
+        self.assertEqual(Attempt.objects.get().status, Attempt.SERVER_ERROR)
+
+    def test_run_survives_database_errors(self):
+        self.submit()
+        claim_batch = worker.claim_batch
+        failures = [OperationalError("server closed the connection")]
+
+        def flaky(size, window):
+            if failures:
+                raise failures.pop()
+            return claim_batch(size, window)
+
+        verdict = {'cases': [], 'verdict': Attempt.WRONG_ANSWER}
+        # Closing the connection would end the test's transaction.
+        with mock.patch('onlinejudge.worker.claim_batch', flaky), \
+                mock.patch('onlinejudge.worker.close_old_connections'), \
+                mock.patch('onlinejudge.worker.judge', return_value=verdict), \
+                self.assertLogs('onlinejudge.worker', 'ERROR'):
+            worker.run(poll_interval=0, once=True)
+        self.assertEqual(Attempt.objects.get().status, Attempt.WRONG_ANSWER)
+
+    def test_requeue_stale(self):
+        self.submit()
+        attempt = worker.claim()
+        self.assertEqual(attempt.status, Attempt.JUDGING)
+        self.assertIsNone(worker.claim())
+        self.assertEqual(worker.requeue_stale(60), 0)
+        Attempt.objects.update(
+            claimed_date=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(worker.requeue_stale(60), 1)
+        self.assertEqual(worker.claim().id, attempt.id)
+
+
+@override_settings(SUBMIT_USER_IN_FLIGHT=2, SUBMIT_GLOBAL_IN_FLIGHT=3,
+                   SUBMIT_RATE=60, SUBMIT_BURST=3)
+class AdmissionTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='test')
+        self.question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20)
+
+    def submit(self, source, user=None):
+        request = self.factory.post('/question/q/submit', {'source': source})
+        request.user = user or self.user
+        return views.submit(request, 'q')
+
+    def test_coalesce_duplicate(self):
+        first = self.submit("print(1)")
+        self.assertEqual(self.submit("print(1)").url, first.url)
+        self.assertEqual(Attempt.objects.count(), 1)
+        # Once judged, the same source is a new attempt.
+        Attempt.objects.update(status=Attempt.WRONG_ANSWER)
+        self.assertNotEqual(self.submit("print(1)").url, first.url)
+
+    def test_in_flight_limits(self):
+        self.submit("print(1)")
+        self.submit("print(2)")
+        response = self.submit("print(3)")
+        self.assertContains(response, "2 jawaban yang sedang dicek",
+                            status_code=429)
+        self.assertEqual(response['Retry-After'], '5')
+        other = User.objects.create_user(username='other')
+        self.submit("print(1)", other)
+        self.assertContains(self.submit("print(2)", other), "sibuk banget",
+                            status_code=429)
+        self.assertEqual(Attempt.objects.count(), 3)
+
+    def test_token_bucket(self):
+        now = time.time()
+        with mock.patch('onlinejudge.admission.time.time',
+                        return_value=now):
+            for i in range(3):
+                self.submit("print(%d)" % i)
+                Attempt.objects.update(status=Attempt.WRONG_ANSWER)
+            response = self.submit("print(3)")
+            self.assertContains(response, "terlalu cepat", status_code=429)
+            self.assertEqual(response['Retry-After'], '1')
+        # One token a second.
+        with mock.patch('onlinejudge.admission.time.time',
+                        return_value=now + 1):
+            self.assertEqual(self.submit("print(3)").status_code, 302)
+
+
+class BenchmarkTest(TestCase):
+    options = {'requests': 3, 'workers': 1, 'latency': 0, 'output_size': None}
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['pages'].clear()
+
+    def test_generate(self):
+        with mock.patch.object(dataset, 'BATCH_SIZE', 16):
+            counts = dataset.generate(users=5, contests=2, questions=3,
+                                      cases=2, attempts=40, seed=1)
+        self.assertEqual(counts, {'users': 5, 'contests': 2, 'questions': 6,
+                                  'cases': 12, 'attempts': 40})
+        self.assertEqual(Attempt.objects.count(), 40)
+        # The attempts are spread over time, oldest first.
+        dates = list(Attempt.objects
+                     .order_by('id')
+                     .values_list('attempt_date', flat=True))
+        self.assertEqual(dates, sorted(set(dates)))
+        self.assertLess(dates[0], timezone.now() - timedelta(minutes=5))
+        self.assertEqual(leaderboard.rebuild(fix=False), 0)
+        self.assertEqual(counters.recount(fix=False), [])
+        # Running it again adds to the dataset.
+        counts = dataset.generate(users=2, contests=1, questions=1,
+                                  attempts=0)
+        self.assertEqual(counts['users'], 2)
+        self.assertEqual(User.objects.count(), 7)
+
+    def test_stub_output_size(self):
+        run = fixed_output(100)
+        outputs, status = run("", ["1\n", "2\n"])
+        self.assertEqual([len(output) for output in outputs], [100, 100])
+        with StubJudger(latency=0.1) as stub:
+            start = time.perf_counter()
+            JudgerClient(stub.url).run("", ["1\n"], 1000)
+            self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+
+    def test_scenarios(self):
+        with self.assertRaises(CommandError):
+            benchmarks.contest(self.options)
+        dataset.generate(users=4, contests=1, questions=3, cases=2,
+                         attempts=20)
+        result = benchmarks.contest(self.options)
+        self.assertEqual(result['questions'], 3)
+        self.assertEqual(result['cold']['statuses'], {'200': 3})
+        self.assertGreater(result['cold']['queries_avg'], 0)
+        self.assertEqual(result['warm']['queries_max'], 0)
+
+        accepted = Attempt.objects.filter(status=Attempt.ACCEPTED)
+        before = accepted.count()
+        result = benchmarks.submit_storm(self.options)
+        self.assertEqual(result['submit']['statuses'], {'302': 3})
+        self.assertEqual(result['judge']['attempts'], 3)
+        self.assertEqual(result['judge']['judger_requests'], 3)
+        self.assertEqual(accepted.count(), before + 3)
+        json.dumps(result)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Cold requests of the main pages, signed in, must stay within a fixed
+    number of queries however much data there is.
+    """
+    budgets = {
+        'home': 6,
+        'contest': 6,
+        'detail': 7,
+        'activity': 3,
+        'leaderboard': 6,
+        'profile': 4,
+        'contest-scoreboard': 4,
+    }
+
+    def urls(self):
+        question = Question.objects.order_by('id').first()
+        busiest = User.objects.annotate(attempts=Count('attempt')) \
+            .order_by('-attempts').first()
+        self.client.force_login(busiest)
+        return {
+            'home': '/',
+            'contest': question.contest.get_absolute_url(),
+            'detail': question.get_absolute_url(),
+            'activity': '/activity',
+            'leaderboard': '/scoreboard',
+            'profile': '/profile/%s/' % busiest.username,
+            'contest-scoreboard': '%sscoreboard' % (
+                question.contest.get_absolute_url()),
+        }
+
+    def assertQueryBudget(self, budget, url):
+        """Fail if a cold request of `url` runs more than `budget` queries."""
+        caches['default'].clear()
+        caches['pages'].clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(
+            len(captured), budget, "%s ran %d queries:\n%s" % (
+                url, len(captured),
+                "\n".join(query['sql'] for query in captured)))
+        return len(captured)
+
+    def test_budgets(self):
+        dataset.generate(users=3, contests=1, questions=2, cases=1,
+                         attempts=10)
+        for name, url in self.urls().items():
+            self.assertQueryBudget(self.budgets[name], url)
+        dataset.generate(users=30, contests=3, questions=15, cases=1,
+                         attempts=600, seed=1)
+        for name, url in self.urls().items():
+            self.assertQueryBudget(self.budgets[name], url)
+
+
+@override_settings(
+    MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES +
+    ('onlinejudge.instrumentation.QueryInstrumentationMiddleware', ),
+    QUERY_SLOW_MS=1000)
+class QueryInstrumentationTest(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.user = User.objects.create_user(username='test')
+
+    def test_staff_headers(self):
+        with self.assertLogs('onlinejudge.instrumentation', 'INFO') as logs:
+            response = self.client.get('/scoreboard')
+        self.assertNotIn('X-Query-Count', response)
+        self.assertIn("GET /scoreboard: ", logs.output[0])
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/scoreboard')
+        self.assertEqual(response['X-Query-Count'], str(len(captured)))
+        self.assertEqual(response['X-Query-Slow'], '0')
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_slow_queries_explained(self):
+        with override_settings(QUERY_SLOW_MS=-1), \
+                self.assertLogs('onlinejudge.instrumentation',
+                                'WARNING') as logs:
+            self.client.get('/')
+        self.assertIn("Slow query on /", logs.output[0])
+        plan = instrumentation.explain(
+            "SELECT * FROM onlinejudge_question WHERE slug = 'q'")
+        self.assertIn("onlinejudge_question", plan)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='test')
+
+    def value(self, metric, **labels):
+        key = (metric.name, tuple(sorted(labels.items())))
+        return metrics.registry.snapshot().get(key, 0)
+
+    def test_merge_processes(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            # Another process with the same pid, e.g. on another machine.
+            path = "%s/metrics-%d-other.json" % (directory, os.getpid())
+            with open(path, 'w') as f:
+                json.dump([
+                    [metrics.VERDICTS.name, [["verdict", "Tested"]], 2],
+                    [metrics.STAGE_SECONDS.name, [["stage", "tested"]],
+                     [1] + [0] * 12 + [0.001, 1]],
+                ], f)
+            metrics.VERDICTS.inc(verdict="Tested")
+            metrics.STAGE_SECONDS.observe(0.3, stage="tested")
+            text = metrics.render()
+        self.assertIn('onlinejudge_verdicts_total{verdict="Tested"} 3.0',
+                      text)
+        name = 'onlinejudge_judge_stage_seconds'
+        self.assertIn('%s_bucket{stage="tested",le="0.005"} 1' % name, text)
+        self.assertIn('%s_bucket{stage="tested",le="0.5"} 2' % name, text)
+        self.assertIn('%s_bucket{stage="tested",le="+Inf"} 2' % name, text)
+        self.assertIn('%s_count{stage="tested"} 2.0' % name, text)
+
+    def test_pipeline(self):
+        question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20)
+        Case.objects.create(question=question, stdin="1", stdout="1")
+        stages = ['admission', 'queue', 'load_cases', 'judger', 'match',
+                  'save']
+        before = {stage: self.value(metrics.STAGE_SECONDS, stage=stage)
+                  for stage in stages}
+        accepted = self.value(metrics.VERDICTS, verdict='Accepted')
+        self.client.force_login(self.user)
+        self.client.post('/question/q/submit', {'source': "print(1) #"})
+        with StubJudger() as stub:
+            previous = set_client(JudgerRouter([stub.url]))
+            try:
+                worker.drain()
+            finally:
+                set_client(previous).close()
+        for stage in stages:
+            # One more observation of every stage.
+            self.assertEqual(
+                self.value(metrics.STAGE_SECONDS, stage=stage)[-1],
+                (before[stage] or [0])[-1] + 1, stage)
+        self.assertEqual(self.value(metrics.VERDICTS, verdict='Accepted'),
+                         accepted + 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertContains(response, '# TYPE onlinejudge_verdicts_total '
+                                      'counter')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        response = self.client.get('/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+@override_settings(CASE_INLINE_LIMIT=10)
+class CaseImportTest(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create(
+            title="Echo", description="Echo.", slug="echo", difficulty=20)
+        Case.objects.create(question=self.question, stdin="0", stdout="0")
+        self.files = {
+            "cases/1.in": "1\r\n", "cases/1.out": "1\r\n",
+            "cases/2.in": "2\n" * 10, "cases/2.out": "2\n" * 10,
+            "cases/10.in": "10", "cases/10.out": "10",
+            "README": "Not a case.",
+        }
+
+    def archive(self, files):
+        data = BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        data.seek(0)
+        return data
+
+    def test_import_zip(self):
+        version = Question.objects.get(id=self.question.id).case_version
+        with tempfile.NamedTemporaryFile(suffix='.zip') as f:
+            f.write(self.archive(self.files).read())
+            f.flush()
+            call_command('importcases', 'echo', f.name, '--sample', '1',
+                         '--replace', stdout=StringIO())
+        cases = list(Case.objects.filter(question=self.question)
+                     .order_by('id'))
+        self.assertEqual([(case.input, case.sample_case) for case in cases],
+                         [("1\n", True), ("2\n" * 10, False),
+                          ("10", False)])
+        # Large cases went to blobs.
+        self.assertIsNotNone(cases[1].stdin_blob_id)
+        self.assertEqual(cases[1].stdout_digest,
+                         Case.output_digest("2\n" * 10))
+        # Once for the deleted case, once for the import.
+        self.assertEqual(
+            Question.objects.get(id=self.question.id).case_version,
+            version + 2)
+
+    def test_import_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ["1.in", "1.out"]:
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write("x")
+            self.assertEqual(
+                caseimport.import_cases(self.question, directory), 1)
+        self.assertEqual(self.question.case_set.count(), 2)
+
+    def test_invalid_archive(self):
+        del self.files["cases/2.out"]
+        with self.assertRaisesMessage(caseimport.InvalidArchive,
+                                      "2.out is missing."):
+            caseimport.import_cases(self.question, self.archive(self.files),
+                                    replace=True)
+        with self.assertRaises(caseimport.InvalidArchive):
+            caseimport.import_cases(self.question, BytesIO(b"not a zip"))
+        # Nothing changed.
+        self.assertEqual(self.question.case_set.get().input, "0")
+
+    def test_admin_action(self):
+        admin = User.objects.create_superuser('admin', 'a@b.c', 'admin')
+        self.client.force_login(admin)
+        url = '/admin/onlinejudge/question/'
+        data = {'action': 'import_cases', '_selected_action': [
+            self.question.id]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'name="archive"')
+        archive = self.archive(self.files)
+        archive.name = "cases.zip"
+        response = self.client.post(
+            url, dict(data, apply="Import", archive=archive, samples="2"),
+            follow=True)
+        self.assertContains(response, "Imported 3 cases into Echo.")
+        self.assertEqual(
+            self.question.case_set.filter(sample_case=True).get().input,
+            "2\n" * 10)
+
+
+class RejudgeTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        verdict_cache.clear()
+        self.user = User.objects.create_user(username='test')
+        self.question = Question.objects.create(
+            title="Two", description="", slug="two", difficulty=20)
+        self.case = Case.objects.create(
+            question=self.question, stdin="", stdout="1")
+        for source, status in [("print(2)", Attempt.WRONG_ANSWER),
+                               ("print(1)", Attempt.ACCEPTED),
+                               ("print(1) ", Attempt.ACCEPTED)]:
+            Attempt.objects.create(
+                user=self.user, question=self.question, source=source,
+                status=status, first_solve=source == "print(1)")
+        # The expected output was wrong.
+        self.case.stdout = "2"
+        self.case.save()
+        self.question.refresh_from_db()
+
+        def run(source, stdin):
+            return [source[6] + "\n"] * len(stdin), 'OK'
+
+        self.stub = StubJudger(run=run).start()
+        self.previous = set_client(JudgerRouter([self.stub.url]))
+
+    def tearDown(self):
+        set_client(self.previous).close()
+        self.stub.stop()
+
+    def test_rejudge(self):
+        attempts = Attempt.objects.filter(question=self.question)
+        summary = rejudge.rejudge(attempts, "question two", workers=2)
+        self.assertEqual((summary['attempts'], summary['changed']), (3, 3))
+        self.assertEqual(
+            list(attempts.order_by('id').values_list('status', 'first_solve')),
+            [(Attempt.ACCEPTED, True), (Attempt.WRONG_ANSWER, False),
+             (Attempt.WRONG_ANSWER, False)])
+        self.assertEqual(leaderboard.rebuild(fix=False), 0)
+        self.assertEqual(counters.recount(fix=False), [])
+
+    def test_resume(self):
+        attempts = Attempt.objects.filter(question=self.question)
+
+        def interrupt(done, total, rate):
+            raise KeyboardInterrupt
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, "rejudge.json")
+            with self.assertRaises(KeyboardInterrupt):
+                rejudge.rejudge(attempts, "question two", chunk_size=1,
+                                checkpoint=checkpoint, progress=interrupt)
+            # The first solves are already right for the saved chunk.
+            self.assertEqual(
+                list(attempts.order_by('id')
+                     .values_list('status', 'first_solve')),
+                [(Attempt.ACCEPTED, True), (Attempt.ACCEPTED, False),
+                 (Attempt.ACCEPTED, False)])
+            with open(checkpoint) as f:
+                self.assertEqual(json.load(f)['done'], 1)
+            with self.assertRaises(rejudge.CheckpointMismatch):
+                rejudge.rejudge(attempts, "contest x", checkpoint=checkpoint)
+
+            out = StringIO()
+            call_command('rejudge', '--question', 'two', '--chunk-size', '1',
+                         '--checkpoint', checkpoint, stdout=out)
+            self.assertIn("3/3 attempts", out.getvalue())
+            self.assertIn("Rejudged 3 attempts, 3 changed verdict",
+                          out.getvalue())
+            self.assertFalse(os.path.exists(checkpoint))
+
+
+class FirstSolveTest(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='test')
+        self.question = Question.objects.create(
+            title="Q", slug="q", description="", difficulty=20)
+
+    def attempt(self, **kwargs):
+        return Attempt.objects.create(user=self.user, question=self.question,
+                                      status=Attempt.JUDGING, **kwargs)
+
+    def index(self, fields):
+        return next(index.name for index in Attempt._meta.indexes
+                    if index.fields == fields)
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return " ".join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_unique(self):
+        self.attempt(first_solve=True)
+        self.attempt(first_solve=False)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.attempt(first_solve=True)
+
+    def test_concurrent_solves(self):
+        first, second = self.attempt(), self.attempt()
+        # Both workers checked before either saved.
+        with mock.patch.object(Question, 'is_solved_by', return_value=False):
+            worker.record_verdict(first, Attempt.ACCEPTED)
+            worker.record_verdict(second, Attempt.ACCEPTED)
+        self.assertEqual(
+            list(Attempt.objects.order_by('id')
+                 .values_list('status', 'first_solve')),
+            [(Attempt.ACCEPTED, True), (Attempt.ACCEPTED, False)])
+        self.assertEqual(LeaderboardEntry.objects.get().points, 20)
+
+    def test_query_plans(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN is SQLite's.")
+        solved_by = self.question.attempt_set.filter(
+            user=self.user, status=Attempt.ACCEPTED)
+        self.assertIn(self.index(['user', 'question', 'status']),
+                      self.plan(solved_by))
+        self.assertIn(self.index(['first_solve', 'attempt_date']),
+                      self.plan(Attempt.latest_solves()))
+        solved = Attempt.objects.filter(user=self.user, first_solve=True)
+        self.assertIn(self.index(['user', 'first_solve']),
+                      self.plan(solved.values_list('question', flat=True)))
@@ -7,7 +7,13 @@ urlpatterns = [
     url(r'^$', views.home, name='home'),
     url(r'^activity$', views.activity, name='activity'),
     url(r'^scoreboard$', views.leaderboard, name='leaderboard'),
+    url(r'^metrics$', views.metrics, name='metrics'),
     url(r'^latihan/(?P<slug>[^\.]+)/$', views.contest, name='contest'),
+    url(r'^latihan/(?P<slug>[^\.]+)/scoreboard$', views.contest_scoreboard,
+        name='contest-scoreboard'),
+    url(r'^latihan/(?P<slug>[^\.]+)/scoreboard/changes$',
+        views.contest_scoreboard_changes,
+        name='contest-scoreboard-changes'),
     url(r'^question/(?P<slug>[^\.]+)/$', views.detail, name='detail'),
     url(r'^question/(?P<slug>[^\.]+)/submit$', views.submit, name='submit'),
     url(r'^question/(?P<slug>[^\.]+)/judger-offline$',
@@ -16,6 +22,12 @@ urlpatterns = [
     url(r'^question/(?P<slug>[^\.]+)/result/(?P<attempt_id>[-0-9]+)$',
         views.result,
         name='result'),
+    url(r'^question/(?P<slug>[^\.]+)/result/(?P<attempt_id>[-0-9]+)/status$',
+        views.result_status,
+        name='result-status'),
+    url(r'^question/(?P<slug>[^\.]+)/source/(?P<attempt_id>[-0-9]+)$',
+        views.attempt_source,
+        name='attempt-source'),
     url(r'^profile/(?P<username>[a-zA-Z0-9._]+)/$',
         views.profile,
         name='profile'),
@@ -1,36 +1,93 @@
-from json import JSONDecodeError
+import hmac
+import math
+import time
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         JsonResponse)
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render, get_object_or_404
 
-from .models import Question, Attempt, User, Category, Contest
-from .judger import judge
+from . import admission, feed, scoreboard
+from .leaderboard import page as leaderboard_page
+from .loaders import load_contest
+from .metrics import STAGE_SECONDS, SUBMIT_SECONDS, render as render_metrics
+from .models import (Question, Attempt, User, Contest, LeaderboardEntry,
+                     Blob)
+from .pagecache import cache_page, cached
+from .router import judger_available
+from .solved import load_contest_questions
 
 
+@cache_page('home', 'contests', 'questions')
 def home(request):
-    contests = Contest.objects.order_by("-id")
+    contests = cached('contests', ['contests'],
+                      lambda: list(Contest.objects.order_by("-id")),
+                      request.user)
+    # Every contest's progress needs its question ids.
+    load_contest_questions(contests)
     context = {'contests': contests}
     return render(request, 'onlinejudge/index.html', context)
 
 
+@cache_page('contest', 'contests', 'questions', 'solves')
 def contest(request, slug):
-    contest = get_object_or_404(Contest, slug=slug)
-    categories = Category.objects.filter(
-        question__contest=contest,
-        question__published_date__lte=timezone.now()).distinct()
+    contest = cached('contest:%s' % slug, ['contests'],
+                     lambda: Contest.objects.filter(slug=slug).first(),
+                     request.user)
+    if contest is None:
+        raise Http404("No Contest matches the given query.")
+    categories, solved = load_contest(contest, request.user)
     context = {
         'contest': contest,
         'categories': categories,
+        'solved': solved,
     }
     return render(request, 'onlinejudge/contest.html', context)
 
 
+def contest_scoreboard(request, slug):
+    contest = get_object_or_404(Contest, slug=slug)
+    version, rows = scoreboard.standings(contest.id)
+    my_row = None
+    if request.user.is_authenticated:
+        my_row = next((row for row in rows if row['user'] == request.user.id),
+                      None)
+    context = {
+        'contest': contest,
+        'standings': rows,
+        'my_row': my_row,
+        'poll_interval': int(settings.SCOREBOARD_POLL_INTERVAL * 1000),
+    }
+    return render(request, 'onlinejudge/contest-scoreboard.html', context)
+
+
+def contest_scoreboard_changes(request, slug):
+    """Changes of a contest's scoreboard since ?since=<version>."""
+    contest = cached('contest:%s' % slug, ['contests'],
+                     lambda: Contest.objects.filter(slug=slug).first(),
+                     request.user)
+    if contest is None:
+        return JsonResponse({'error': "Not found"}, status=404)
+    response = JsonResponse(
+        scoreboard.changes(contest.id, request.GET.get('since')))
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@cache_page('activity', 'questions', 'solves')
 def activity(request):
-    # List of latest published Questions
-    latest_solves = Attempt.latest_solves()[:50]
-    context = {'latest_solves': latest_solves}
+    before = request.GET.get('before')
+    if before is None:
+        # The first page is kept in memory by the feed.
+        latest_solves, older = feed.latest()
+    else:
+        latest_solves, older = cached(
+            'activity:%s' % before, ['questions', 'solves'],
+            lambda: feed.latest(before), request.user)
+    context = {'latest_solves': latest_solves, 'older': older}
     return render(request, 'onlinejudge/activity.html', context)
 
 
@@ -44,20 +101,27 @@ def detail(request, slug):
             Question, slug=slug, published_date__lte=timezone.now())
 
     template = question.template
+    submissions = None
     if user.is_authenticated:
-        # Display the users latest attempt if user has already
-        # attempted the question. If not, display the template.
         attempts = Attempt.objects \
             .filter(user=user, question=question) \
             .order_by("-id")
-        if attempts:
-            template = attempts[0].source
+        # Display the users latest attempt if user has already
+        # attempted the question. If not, display the template.
+        latest_source = attempts \
+            .values_list('source_blob__data', flat=True) \
+            .first()
+        if latest_source is not None:
+            template = Blob.decompress(latest_source)
 
-        # Get the user's submissions
-        submissions = question.attempt_set.filter(user=user).order_by("-id")
-    else:
-        # Empty submissions for unauthenticated users
-        submissions = None
+        # Sources are fetched from `attempt_source` when opened.
+        paginator = Paginator(attempts, settings.SUBMISSIONS_PAGE_SIZE)
+        try:
+            submissions = paginator.page(request.GET.get('submissions', 1))
+        except PageNotAnInteger:
+            submissions = paginator.page(1)
+        except EmptyPage:
+            submissions = paginator.page(paginator.num_pages)
 
     context = {
         'question': question,
@@ -69,26 +133,37 @@ def detail(request, slug):
 
 @login_required
 def submit(request, slug):
+    start = time.perf_counter()
+    outcome, response = _submit(request, slug)
+    SUBMIT_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+    return response
+
+
+def _submit(request, slug):
     user = request.user
     question = get_object_or_404(Question, slug=slug)
+    if not judger_available():
+        return 'offline', redirect('judger-offline', slug=slug)
     source = request.POST.get("source", "")
-    attempt = Attempt(user=user, question=question)
     try:
-        result = judge(source, question)
-    except (ConnectionError, JSONDecodeError):
-        return redirect('judger-offline', slug=slug)
-    else:
-        status = result['verdict']
-        attempt.status = status
-        # If question is not published, replace AC with AC (Testing).
-        if status == 1 and not question.is_published:
-            attempt.status = 5
-        attempt.first_solve = \
-            attempt.status == 1 and not question.is_solved_by(user)
-        attempt.source = source
-        attempt.save()
-        attempt_id = attempt.id
-        return redirect('result', slug=slug, attempt_id=attempt_id)
+        with STAGE_SECONDS.time(stage='admission'):
+            attempt = admission.check(user, question, source)
+    except admission.Throttled as e:
+        context = {'question': question, 'reason': e.message,
+                   'retry_after': e.retry_after}
+        response = render(request, 'onlinejudge/slow-down.html', context,
+                          status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return 'throttled', response
+    outcome = 'coalesced'
+    if attempt is None:
+        # The attempt is judged in the background by the judge workers.
+        with STAGE_SECONDS.time(stage='queue'):
+            attempt = Attempt(user=user, question=question, source=source,
+                              status=Attempt.PENDING)
+            attempt.save()
+        outcome = 'queued'
+    return outcome, redirect('result', slug=slug, attempt_id=attempt.id)
 
 
 @login_required
@@ -101,48 +176,92 @@ def result(request, slug, attempt_id):
     return HttpResponse("Unauthorized Access :(", status=401)
 
 
+@login_required
+def attempt_source(request, slug, attempt_id):
+    attempt = Attempt.objects \
+        .filter(id=attempt_id) \
+        .values('user', 'source_blob__data') \
+        .first()
+    if attempt is None:
+        return JsonResponse({'error': "Not found"}, status=404)
+    if attempt['user'] != request.user.id:
+        return JsonResponse({'error': "Unauthorized"}, status=401)
+    data = attempt['source_blob__data']
+    source = Blob.decompress(data) if data is not None else ""
+    return JsonResponse({'source': source})
+
+
+@login_required
+def result_status(request, slug, attempt_id):
+    attempt = Attempt.objects \
+        .filter(id=attempt_id) \
+        .values('user', 'status') \
+        .first()
+    if attempt is None:
+        return JsonResponse({'error': "Not found"}, status=404)
+    if attempt['user'] != request.user.id:
+        return JsonResponse({'error': "Unauthorized"}, status=401)
+    status = attempt['status']
+    return JsonResponse({
+        'status': status,
+        'verdict': Attempt._status_dict[status],
+        'pending': status in Attempt.PENDING_STATUSES,
+    })
+
+
 @login_required
 def profile(request, username):
     user = User.objects.get(username=username)
-    latest_solves = Attempt.latest_solves(user)
+    latest_solves = Attempt.latest_solves(user).select_related('question')
     context = {'account': user, 'solves': latest_solves}
     return render(request, 'onlinejudge/profile.html', context)
 
 
+@cache_page('leaderboard', 'questions', 'solves')
 def leaderboard(request):
-    leaderboard = {}
-
-    # Only select users who have solved a question.
-    solves = User.objects.filter(attempt__first_solve=True).values(
-        "username",
-        "attempt__attempt_date",
-        "attempt__question__difficulty",
-    )
-
-    # Calculate user's scores and latest solve date
-    for solve in solves:
-        username = solve['username']
-        points = solve['attempt__question__difficulty']
-        attempt = solve['attempt__attempt_date']
-        if username in leaderboard.keys():
-            user_stat = leaderboard[username]
-            user_stat[0] += points
-            if attempt > user_stat[1]:
-                user_stat[1] = attempt
-        else:
-            leaderboard[username] = [points, attempt]
-
-    # Leaderboard is sorted by score, then earliest last solve.
-    users_latest_solve = sorted(leaderboard.items(), key=lambda x: x[1][1])
-    sorted_leaderboard = sorted(
-        [(username, stat[0]) for username, stat in users_latest_solve],
-        key=lambda x: x[1],
-        reverse=True,
-    )
-
-    context = {'leaderboard': sorted_leaderboard}
+    size = settings.LEADERBOARD_PAGE_SIZE
+    pages = cached(
+        'leaderboard-pages', ['questions', 'solves'],
+        lambda: max(math.ceil(LeaderboardEntry.objects.count() / size), 1),
+        request.user)
+    try:
+        number = min(max(int(request.GET.get('page', 1)), 1), pages)
+    except ValueError:
+        number = 1
+    entries = cached('leaderboard:%d' % number, ['questions', 'solves'],
+                     lambda: list(leaderboard_page(number, size)),
+                     request.user)
+
+    # The user's own rank, wherever it is on the leaderboard.
+    my_entry, my_page = None, None
+    if request.user.is_authenticated:
+        my_entry = LeaderboardEntry.objects \
+            .filter(user=request.user) \
+            .first()
+        if my_entry is not None:
+            my_page = math.ceil(my_entry.rank / size)
+
+    context = {
+        'leaderboard': entries,
+        'page': number,
+        'pages': pages,
+        'my_entry': my_entry,
+        'my_page': my_page,
+    }
     return render(request, 'onlinejudge/leaderboard.html', context)
 
 
 def judger_offline(request, slug):
     return render(request, 'onlinejudge/judger-offline.html')
+
+
+def metrics(request):
+    """Metrics of every process, for Prometheus. Staff or METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (request.user.is_staff or token and hmac.compare_digest(
+            authorization, "Bearer " + token)):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
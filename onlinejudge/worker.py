@@ -0,0 +1,206 @@
+"""
+Background judging of queued attempts.
+
+`views.submit` only saves an Attempt with the PENDING status. Judge workers
+(see the `judgeworker` management command) take pending attempts off the
+table, run them against the judger and fill in the verdict. An attempt is
+claimed with a conditional UPDATE, so any number of worker threads or
+processes can share the queue without judging an attempt twice.
+
+With JUDGER_BATCH_SIZE above 1, a worker collects the attempts that arrive
+within JUDGER_BATCH_WINDOW seconds and judges them with a single request.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .judger import judge, judge_batch
+from .metrics import QUEUE_SECONDS, STAGE_SECONDS, VERDICTS
+from .models import Attempt
+
+logger = logging.getLogger(__name__)
+
+# Shortest and longest wait (seconds) before trying again after the loop
+# failed.
+MIN_BACKOFF = 0.1
+MAX_BACKOFF = 30
+
+
+def claim():
+    """
+    Claim the oldest pending attempt.
+
+    Returns
+    -------
+    attempt : Attempt or None
+        The claimed attempt, now in the JUDGING state, or None if the
+        queue is empty.
+
+    """
+    pending = Attempt.objects \
+        .filter(status=Attempt.PENDING) \
+        .order_by('id') \
+        .values_list('id', flat=True)
+    for attempt_id in pending[:10]:
+        # Another worker may have claimed it since we looked.
+        claimed = Attempt.objects \
+            .filter(id=attempt_id, status=Attempt.PENDING) \
+            .update(status=Attempt.JUDGING, claimed_date=timezone.now())
+        if claimed:
+            attempt = Attempt.objects \
+                .select_related('question', 'user', 'source_blob') \
+                .get(id=attempt_id)
+            QUEUE_SECONDS.observe(
+                (attempt.claimed_date - attempt.attempt_date)
+                .total_seconds())
+            return attempt
+    return None
+
+
+def claim_batch(size, window):
+    """
+    Claim up to `size` pending attempts.
+
+    Waits at most `window` seconds after the first claim for more attempts
+    to arrive. Returns an empty list if the queue is empty.
+    """
+    attempt = claim()
+    if attempt is None:
+        return []
+    batch = [attempt]
+    deadline = time.monotonic() + window
+    while len(batch) < size:
+        attempt = claim()
+        if attempt is not None:
+            batch.append(attempt)
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(remaining, window / 5))
+    return batch
+
+
+def requeue_stale(timeout):
+    """Put back attempts whose worker died while judging them."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Attempt.objects \
+        .filter(status=Attempt.JUDGING, claimed_date__lt=cutoff) \
+        .update(status=Attempt.PENDING, claimed_date=None)
+
+
+def record_verdict(attempt, status):
+    """Save the verdict of a judged attempt."""
+    question = attempt.question
+    # If question is not published, replace AC with AC (Testing).
+    if status == Attempt.ACCEPTED and not question.is_published:
+        status = Attempt.TESTING
+    attempt.status = status
+    with STAGE_SECONDS.time(stage='save'):
+        attempt.first_solve = status == Attempt.ACCEPTED \
+            and not question.is_solved_by(attempt.user)
+        try:
+            with transaction.atomic():
+                attempt.save(update_fields=['status', 'first_solve'])
+        except IntegrityError:
+            if not attempt.first_solve:
+                raise
+            # Another worker recorded the user's first solve in between,
+            # the unique index on first solves turned this one down.
+            attempt.first_solve = False
+            attempt.save(update_fields=['status', 'first_solve'])
+    VERDICTS.inc(verdict=attempt.status_str)
+
+
+def process(attempt):
+    """Judge a claimed attempt and record its verdict."""
+    try:
+        result = judge(attempt.source, attempt.question)
+    except Exception:
+        # Unreachable judger, but also replies we cannot read (e.g. an
+        # unknown status): either way the attempt must not stay JUDGING.
+        logger.exception("Judging attempt %d failed", attempt.id)
+        status = Attempt.SERVER_ERROR
+    else:
+        status = result['verdict']
+    record_verdict(attempt, status)
+
+
+def process_batch(attempts):
+    """Judge claimed attempts with one judger request."""
+    if len(attempts) == 1:
+        process(attempts[0])
+        return
+    submissions = [(attempt.source, attempt.question) for attempt in attempts]
+    try:
+        results = judge_batch(submissions)
+    except Exception:
+        # Find out which attempts are to blame.
+        logger.exception("Judging a batch of %d attempts failed",
+                         len(attempts))
+        for attempt in attempts:
+            process(attempt)
+        return
+    for attempt, result in zip(attempts, results):
+        record_verdict(attempt, result['verdict'])
+
+
+def drain(batch_size=None, batch_window=None):
+    """Judge pending attempts until the queue is empty."""
+    batch_size = batch_size or settings.JUDGER_BATCH_SIZE
+    if batch_window is None:
+        batch_window = settings.JUDGER_BATCH_WINDOW
+    judged = 0
+    batch = claim_batch(batch_size, batch_window)
+    while batch:
+        process_batch(batch)
+        judged += len(batch)
+        batch = claim_batch(batch_size, batch_window)
+    return judged
+
+
+def run(poll_interval=1.0, stale_after=300, stop=None, once=False):
+    """
+    Judge pending attempts until `stop` is set.
+
+    Parameters
+    ----------
+    poll_interval : float
+        Seconds to sleep when the queue is empty.
+    stale_after : float
+        Seconds after which a JUDGING attempt is considered abandoned.
+    stop : threading.Event
+        Set it to make the worker exit after its current attempt.
+    once : bool
+        Exit as soon as the queue is empty.
+
+    """
+    stop = stop or threading.Event()
+    backoff = MIN_BACKOFF
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            batch = claim_batch(settings.JUDGER_BATCH_SIZE,
+                                settings.JUDGER_BATCH_WINDOW)
+            if batch:
+                process_batch(batch)
+                continue
+            if requeue_stale(stale_after):
+                continue
+        except Exception:
+            # E.g. the database went away: keep the thread alive, the
+            # attempts left JUDGING are requeued once stale.
+            logger.exception("Judge worker failed, retrying in %.1fs",
+                             backoff)
+            stop.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+            continue
+        backoff = MIN_BACKOFF
+        if once:
+            break
+        stop.wait(poll_interval)